@@ -0,0 +1,187 @@
+import io
+import sys
+from a2wsgi import WSGIMiddleware
+from flask import request, request_started
+from werkzeug.exceptions import HTTPException
+from werkzeug.utils import import_string
+from app import app
+from async_db import async_db, drivers_available
+from mailer import mail_queue
+from scheduler import scheduler
+import search
+
+# ASGI entry point:
+#
+#     uvicorn asgi:application --workers 2
+#
+# The hot read views (catalog, cart, /api/stats) run as coroutines on the async
+# database engine, so one worker serves many of them concurrently while they wait
+# on the database. Every other route goes to the regular Flask (WSGI) app on a
+# pool of ASGI_WSGI_THREADS threads (a2wsgi), so all routes keep working, and
+# `gunicorn app:app` keeps serving the same app in WSGI mode.
+#
+# Mail was already off the request path in both modes: handlers only write an
+# outbox row and the mail_queue sender threads talk to SMTP.
+
+DEFAULTS = {
+    'ASGI_NATIVE_VIEWS': True,    # False: serve every route through the WSGI app
+    'ASGI_WSGI_THREADS': 10,      # per worker, for the routes served by the WSGI app
+}
+
+# endpoint -> coroutine serving it in ASGI mode
+ASYNC_VIEWS = {
+    'catalog': 'views.async_store.catalog',
+    'cart': 'views.async_store.cart',
+    'api_stats': 'views.async_store.api_stats',
+}
+
+
+class AsgiApp:
+    def __init__(self, flask_app):
+        for key, value in DEFAULTS.items():
+            flask_app.config.setdefault(key, value)
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=flask_app.config['ASGI_WSGI_THREADS'])
+        self.views = {}
+        if flask_app.config['ASGI_NATIVE_VIEWS']:
+            async_db.init_app(flask_app)
+            self.views = {endpoint: import_string(name) for endpoint, name in ASYNC_VIEWS.items()}
+        self.urls = flask_app.url_map.bind('')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        view = self._match(scope) if scope['type'] == 'http' else None
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+        await self._dispatch(view, scope, receive, send)
+
+    def _match(self, scope):
+        if not self.views or scope['method'] not in ('GET', 'HEAD'):
+            return None
+        try:
+            endpoint, _ = self.urls.match(scope['path'], 'GET')
+        except HTTPException:
+            return None
+        return self.views.get(endpoint)
+
+    async def _dispatch(self, view, scope, receive, send):
+        """Flask's wsgi_app()/full_dispatch_request() for a coroutine view."""
+        app = self.flask_app
+        environ = build_environ(scope, await _read_body(receive))
+        ctx = app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                try:
+                    request_started.send(app)
+                    rv = app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = app.handle_user_exception(e)
+                response = app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = app.handle_exception(e)
+            await _send_response(send, response, environ)
+        finally:
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        if not self.views:
+            return
+        uri = self.flask_app.config['SQLALCHEMY_DATABASE_URI']
+        if not self.flask_app.config['ASYNC_DATABASE_URL'] and not drivers_available(uri):
+            raise RuntimeError('ASGI mode needs the async database driver: pip install -r requirements-asgi.txt')
+        with self.flask_app.app_context():
+            # Probe for the search index now rather than blocking the loop on the first search
+            search.index_available()
+        async with async_db.engine.connect():
+            pass
+
+    async def shutdown(self):
+        await async_db.dispose()
+        mail_queue.stop()
+        scheduler.stop()
+
+
+def build_environ(scope, body):
+    """A WSGI environ for an ASGI http `scope` and its request `body`."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    root_path = scope.get('root_path', '')
+    path = scope['path'][len(root_path):] if scope['path'].startswith(root_path) else scope['path']
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf8').decode('latin1'),
+        'PATH_INFO': path.encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _send_response(send, response, environ):
+    app_iter, status, headers = response.get_wsgi_response(environ)
+    try:
+        body = b''.join(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+application = AsgiApp(app)
@@ -0,0 +1,85 @@
+import importlib.util
+from sqlalchemy.engine import make_url
+import db_config
+
+# Async database access for the ASGI handlers (see asgi.py).
+# The engine talks to the same database as `db`, through the asyncio driver for
+# its backend, so a request waiting on the database does not hold a worker: the
+# event loop serves other requests meanwhile. It is created on first use, inside
+# the server's event loop, and only ASGI mode needs the drivers:
+#
+#     pip install -r requirements-asgi.txt
+
+DEFAULTS = {
+    'ASYNC_DATABASE_URL': None,   # default: DATABASE_URL with its backend's async driver
+}
+
+# backend -> async driver
+ASYNC_DRIVERS = {
+    'sqlite': 'aiosqlite',
+    'mysql': 'aiomysql',
+}
+
+
+def async_url(uri):
+    """`uri` with its driver replaced by the backend's asyncio driver."""
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'no async driver known for {backend} databases')
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+def drivers_available(uri) -> bool:
+    return importlib.util.find_spec(ASYNC_DRIVERS.get(make_url(uri).get_backend_name(), '')) is not None
+
+
+class AsyncDatabase:
+    def __init__(self, app=None):
+        self.app = None
+        self._engine = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.app = app
+        app.extensions['async_db'] = self
+
+    @property
+    def url(self):
+        return self.app.config['ASYNC_DATABASE_URL'] or async_url(self.app.config['SQLALCHEMY_DATABASE_URI'])
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            from sqlalchemy.pool import AsyncAdaptedQueuePool
+            config = self.app.config
+            url = make_url(self.url)
+            options = {}
+            if url.get_backend_name() != 'sqlite':
+                # Same pool bounds as the sync engine
+                options = db_config.engine_options(config['SQLALCHEMY_DATABASE_URI'], config)
+            elif url.database not in (None, '', ':memory:'):
+                # aiosqlite defaults to a new connection (and thread) per session
+                options = {'poolclass': AsyncAdaptedQueuePool, 'pool_size': config['SQLITE_POOL_SIZE'],
+                           'max_overflow': config['SQLITE_POOL_SIZE']}
+            self._engine = create_async_engine(url, **options)
+            db_config.install_pragmas(self._engine.sync_engine, config)
+        return self._engine
+
+    def session(self):
+        """A new AsyncSession; use as `async with async_db.session() as session:`."""
+        from sqlalchemy.ext.asyncio import AsyncSession
+        # Objects stay readable after the session closes, e.g. while rendering templates
+        return AsyncSession(self.engine, expire_on_commit=False)
+
+    async def dispose(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+
+
+async_db = AsyncDatabase()
@@ -0,0 +1,118 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from cache import TTLCache
+
+# Login hot path helpers.
+# bcrypt checks run on a bounded thread pool so a burst of logins cannot use more
+# than AUTH_HASH_WORKERS cores (bcrypt releases the GIL while hashing), and an
+# attempt limiter refuses further password checks for an account or client IP
+# after repeated failures, before any hashing is done.
+
+DEFAULTS = {
+    'AUTH_HASH_WORKERS': 4,
+    'AUTH_HASH_QUEUE': 32,          # checks allowed to wait for a free hashing thread
+    'AUTH_HASH_TIMEOUT': 10.0,
+    'LOGIN_MAX_FAILURES_PER_ACCOUNT': 5,
+    'LOGIN_MAX_FAILURES_PER_IP': 20,
+    'LOGIN_FAILURE_WINDOW': 900,    # seconds
+}
+
+
+class HashPoolBusy(Exception):
+    """Too many password checks are already running or queued."""
+
+
+class AttemptLimiter:
+    """Fixed-window failure counters keyed by account and by client IP."""
+
+    def __init__(self, max_per_account=5, max_per_ip=20, window=900, clock=time.monotonic):
+        self.max_per_account = max_per_account
+        self.max_per_ip = max_per_ip
+        self.window = window
+        self.clock = clock
+        self._counts = TTLCache(maxsize=100000, ttl=window, clock=clock)
+
+    def _count(self, key):
+        entry = self._counts.get(key)
+        return entry[0] if entry else 0
+
+    def is_blocked(self, account, ip) -> bool:
+        return (self._count(('account', account)) >= self.max_per_account or
+                self._count(('ip', ip)) >= self.max_per_ip)
+
+    def record_failure(self, account, ip):
+        now = self.clock()
+        for key in (('account', account), ('ip', ip)):
+            count, window_end = self._counts.get(key) or (0, now + self.window)
+            self._counts.set(key, (count + 1, window_end), ttl=max(window_end - now, 0))
+
+    def reset(self, account):
+        self._counts.delete(('account', account))
+
+
+class PasswordChecker:
+    def __init__(self, app=None):
+        self.limiter = AttemptLimiter()
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.app = app
+        self.limiter = AttemptLimiter(app.config['LOGIN_MAX_FAILURES_PER_ACCOUNT'],
+                                      app.config['LOGIN_MAX_FAILURES_PER_IP'],
+                                      app.config['LOGIN_FAILURE_WINDOW'])
+        app.extensions['password_checker'] = self
+
+    def _pool(self):
+        # Created lazily so gunicorn workers do not inherit threads from the master
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    workers = self.app.config['AUTH_HASH_WORKERS']
+                    self._slots = threading.BoundedSemaphore(workers + self.app.config['AUTH_HASH_QUEUE'])
+                    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        return self._executor
+
+    def check(self, user, password) -> bool:
+        """Verify `password` for `user` on the hashing pool.
+
+        Raises HashPoolBusy when the pool is saturated or the check times out."""
+        pool = self._pool()
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolBusy()
+        try:
+            future = pool.submit(user.check_password, password)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot stays taken until the hash finishes, even if we stop waiting for
+        # it, so the queue bound counts every job the pool still has to run
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.app.config['AUTH_HASH_TIMEOUT'])
+        except FutureTimeout:
+            raise HashPoolBusy()
+
+    def authenticate(self, user, email, password, ip) -> bool:
+        """Check credentials with rate limiting; upgrades outdated hashes on success.
+
+        Raises HashPoolBusy when the hashing pool is saturated or too slow.
+        """
+        if user is None or not self.check(user, password):
+            self.limiter.record_failure(email, ip)
+            return False
+        self.limiter.reset(email)
+        if user.needs_rehash():
+            user.set_password(password)
+            logging.info(f'Rehashed password for {user.email} with the current work factor')
+        return True
+
+
+password_checker = PasswordChecker()
@@ -0,0 +1,266 @@
+"""Concurrency at fixed memory: WSGI (gunicorn sync workers) vs ASGI (uvicorn workers).
+
+Seeds a database, then serves it once per mode under gunicorn: `app:app` with sync
+workers and `asgi:application` with uvicorn workers. Each mode gets as many worker
+processes as fit in --memory-mb, sized from the resident memory of one warmed-up
+worker (or exactly --workers each). For every --concurrency level it runs that many
+client threads, each with its own keep-alive connection. The clients send a mix of
+catalog, search, cart and /api/stats requests for --seconds. It reports throughput,
+latency percentiles and the server's total RSS. Linux only (RSS is read from /proc).
+
+The ASGI mode needs `pip install -r requirements-asgi.txt`. On a local SQLite file
+the database answers in microseconds, so there is little waiting to overlap; point
+--database-url at a networked MySQL (seeded separately) to measure the case ASGI
+mode is for.
+
+    python benchmarks/bench_asgi.py --memory-mb 300 --concurrency 1 16 64 --output asgi.json
+"""
+import argparse
+import http.client
+import os
+import random
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from common import ROOT, summarize, write_results, STUDENT_PASSWORD, ADMIN_EMAIL, ADMIN_PASSWORD
+import seed as seeding
+
+MODES = {
+    'wsgi': ['app:app'],
+    'asgi': ['-k', 'uvicorn.workers.UvicornWorker', 'asgi:application'],
+}
+
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+# operation -> relative weight
+MIX = {
+    'catalog': 55,
+    'catalog_search': 20,
+    'cart': 20,
+    'api_stats': 5,
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            kids = [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+    return kids + [k for kid in kids for k in _children(kid)]
+
+
+def _rss_mb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+class Server:
+    def __init__(self, mode, workers, env, workdir):
+        self.port = _free_port()
+        self.proc = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{self.port}',
+             '--log-level', 'warning', *MODES[mode]],
+            cwd=workdir, env=env)
+        self._wait_ready()
+
+    def _wait_ready(self, timeout=60):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f'server exited with status {self.proc.returncode}')
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=2)
+                conn.request('GET', '/login')
+                conn.getresponse().read()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError('server did not start')
+
+    def worker_rss_mb(self):
+        return [_rss_mb(pid) for pid in _children(self.proc.pid)]
+
+    def total_rss_mb(self):
+        return _rss_mb(self.proc.pid) + sum(self.worker_rss_mb())
+
+    def stop(self):
+        self.proc.send_signal(signal.SIGTERM)
+        try:
+            self.proc.wait(30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+def _cookie(response):
+    return (response.getheader('Set-Cookie') or '').split(';', 1)[0]
+
+
+def login(port, email, password):
+    """Session cookie for `email`, logged in through the form (with its CSRF token)."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.request('GET', '/login')
+    response = conn.getresponse()
+    token = CSRF_RE.search(response.read().decode('utf-8', 'replace'))
+    conn.request('POST', '/login', urlencode({'email': email, 'password': password,
+                                              'csrf_token': token.group(1) if token else ''}),
+                 {'Content-Type': 'application/x-www-form-urlencoded', 'Cookie': _cookie(response)})
+    response = conn.getresponse()
+    response.read()
+    cookie = _cookie(response)
+    if response.status != 302 or not cookie:
+        raise RuntimeError(f'login as {email} failed with HTTP {response.status}')
+    return cookie
+
+
+def _path(name, rng):
+    if name == 'catalog':
+        return '/catalog'
+    if name == 'catalog_search':
+        return '/catalog?' + urlencode({'q': rng.choice(seeding.WORDS)})
+    if name == 'cart':
+        return '/cart'
+    return '/api/stats'
+
+
+def _client(port, student, admin, seconds, seed, start_at, out):
+    rng = random.Random(seed)
+    names = list(MIX)
+    weights = [MIX[n] for n in names]
+    samples = {n: [] for n in names}
+    errors = 0
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        cookie = admin if name == 'api_stats' else student
+        start = time.perf_counter()
+        try:
+            conn.request('GET', _path(name, rng), headers={'Cookie': cookie})
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            ok = False
+        samples[name].append(time.perf_counter() - start)
+        errors += not ok
+    conn.close()
+    out.append((samples, errors))
+
+
+def run_level(server, concurrency, seconds, students, admin, seed):
+    out = []
+    start_at = time.time() + 0.5
+    threads = [threading.Thread(target=_client, args=(server.port, students[i % len(students)], admin,
+                                                      seconds, seed * 1000 + i, start_at, out))
+               for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    samples = [s for c in out for n in MIX for s in c[0][n]]
+    result = summarize(samples, seconds)
+    result.update(concurrency=concurrency, errors=sum(c[1] for c in out), rss_mb=round(server.total_rss_mb(), 1))
+    return result
+
+
+def workers_for(mode, budget, env, workdir):
+    """How many workers of `mode` fit in `budget` MB, from one warmed-up worker."""
+    server = Server(mode, 1, env, workdir)
+    try:
+        cookie = login(server.port, seeding.student_email(2), STUDENT_PASSWORD)
+        conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=30)
+        for path in ('/catalog', '/cart', '/catalog?q=the') * 5:
+            conn.request('GET', path, headers={'Cookie': cookie})
+            conn.getresponse().read()
+        per_worker = max(server.worker_rss_mb() or [1.0])
+        master = _rss_mb(server.proc.pid)
+    finally:
+        server.stop()
+    return max(1, int((budget - master) // per_worker)), round(per_worker, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.add_argument('--database-url', help='benchmark against this (already seeded) database instead')
+    parser.add_argument('--memory-mb', type=float, help='memory budget per mode; sets the worker counts')
+    parser.add_argument('--workers', type=int, default=2, help='workers per mode without --memory-mb')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--logins', type=int, default=8, help='distinct logged-in students among the clients')
+    parser.add_argument('--template-folder', help='templates directory, if not the default ./templates')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    database_url = args.database_url
+    if not database_url:
+        from common import load_app
+        db_path = os.path.join(workdir, 'bench.db')
+        app = load_app(db_path, args.template_folder)
+        counts = seeding.counts_from_args(args)
+        print(f'Seeding {db_path}: ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+        seeding.seed(app, counts, args.seed, args.stock)
+        with app.app_context():
+            from models import db
+            db.engine.dispose()
+        database_url = 'sqlite:///' + db_path
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+               DATABASE_URL=database_url, LOG_LEVEL='WARNING', MAIL_ASYNC='False')
+    if args.template_folder:
+        env['TEMPLATE_FOLDER'] = os.path.abspath(args.template_folder)
+
+    results = {}
+    print(f"{'mode':<5} {'workers':>7} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>6} {'RSS MB':>7}")
+    for mode in args.modes:
+        workers, per_worker = args.workers, None
+        if args.memory_mb:
+            workers, per_worker = workers_for(mode, args.memory_mb, env, workdir)
+        server = Server(mode, workers, env, workdir)
+        try:
+            students = [login(server.port, seeding.student_email(i + 2), STUDENT_PASSWORD) for i in range(args.logins)]
+            admin = login(server.port, ADMIN_EMAIL, ADMIN_PASSWORD)
+            levels = []
+            for concurrency in args.concurrency:
+                r = run_level(server, concurrency, args.seconds, students, admin, args.seed)
+                levels.append(r)
+                print(f"{mode:<5} {workers:>7} {concurrency:>7} {r['ops_per_sec']:>8.1f} {r['p50_ms']:>8.1f} "
+                      f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>6} {r['rss_mb']:>7.1f}")
+        finally:
+            server.stop()
+        results[mode] = {'workers': workers, 'worker_rss_mb': per_worker, 'levels': levels}
+
+    params = {'memory_mb': args.memory_mb, 'concurrency': args.concurrency, 'seconds': args.seconds,
+              'mix': MIX, 'database': 'external' if args.database_url else 'seeded sqlite'}
+    write_results(args.output, 'asgi', params, results)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Cart checkout benchmark: per-row loop vs the batched checkout pipeline.
+
+Fills a student's cart with 1, 50 and 500 lines and times checking it out with
+the old one-Order-and-one-DELETE-per-line loop and with inventory.checkout_cart,
+counting the SQL statements each issues.
+
+    python benchmarks/bench_checkout.py --sizes 1 50 500 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _setup():
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    sys.path.insert(0, ROOT)
+    from app import app
+    from commands import setup_database
+    with app.app_context():
+        setup_database()
+    return app
+
+
+def legacy_checkout(user_id, payment_method='mock'):
+    # cart_checkout() as it was before the batched pipeline
+    import stats
+    from models import db, Cart, Order
+    cart_items = Cart.query.filter_by(user_id=user_id).all()
+    for item in cart_items:
+        order = Order(user_id=user_id, book_id=item.book_id, quantity=item.quantity, status='pending', payment_method=payment_method)
+        db.session.add(order)
+        stats.record_sale(item.book_id, item.quantity)
+        db.session.delete(item)
+    db.session.commit()
+
+
+def batched_checkout(user_id, payment_method='mock'):
+    import inventory
+    inventory.run_in_transaction(inventory.checkout_cart, user_id, payment_method)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 50, 500])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = _setup()
+    from sqlalchemy import event
+    from models import db, User, Book, Cart
+
+    with app.app_context():
+        user = User(name='Bench', email='bench@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.bulk_insert_mappings(Book, [
+            {'title': f'Book {i}', 'author': 'Bench', 'total_copies': 10 ** 6, 'available_copies': 10 ** 6}
+            for i in range(max(args.sizes))
+        ])
+        db.session.commit()
+        user_id = user.id
+        book_ids = [b for (b,) in db.session.query(Book.id).order_by(Book.id)]
+
+        statements = [0]
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.__setitem__(0, statements[0] + 1))
+
+        print(f"{'lines':>6}  {'variant':<8}  {'median ms':>10}  {'statements':>10}")
+        for size in args.sizes:
+            for name, fn in (('legacy', legacy_checkout), ('batched', batched_checkout)):
+                timings = []
+                for _ in range(args.repeat):
+                    db.session.bulk_insert_mappings(Cart, [
+                        {'user_id': user_id, 'book_id': b, 'quantity': 1} for b in book_ids[:size]
+                    ])
+                    db.session.commit()
+                    db.session.expunge_all()
+                    statements[0] = 0
+                    start = time.perf_counter()
+                    fn(user_id)
+                    timings.append(time.perf_counter() - start)
+                    db.session.expunge_all()
+                print(f'{size:>6}  {name:<8}  {statistics.median(timings) * 1000:>10.2f}  {statements[0]:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Bulk book import/export throughput by file size.
+
+Generates CSV and JSONL supplier feeds of each size, imports them into an empty
+catalog (all inserts), imports them again (all ISBN upserts) and exports the
+catalog, reporting rows per second for each step.
+
+    python benchmarks/bench_import.py --sizes 1000 10000 100000 --chunk-size 500
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _setup():
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    sys.path.insert(0, ROOT)
+    from app import app
+    from commands import setup_database
+    with app.app_context():
+        setup_database()
+    return app
+
+
+def make_feed(path, size, fmt):
+    fields = ['isbn', 'title', 'author', 'genre', 'price', 'total_copies']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fields) if fmt == 'csv' else None
+        if writer:
+            writer.writeheader()
+        for i in range(size):
+            row = {'isbn': f'978{i:010d}', 'title': f'Supplier title {i}', 'author': f'Author {i % 997}',
+                   'genre': ('Fiction', 'Science', 'History')[i % 3], 'price': f'{5 + i % 40}.99', 'total_copies': 1 + i % 5}
+            writer.writerow(row) if writer else f.write(json.dumps(row) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--formats', nargs='+', default=['csv', 'jsonl'])
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+
+    app = _setup()
+    import book_io
+    from models import db, Book
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'rows':>8}  {'format':<6}  {'MB':>6}  {'insert rows/s':>14}  {'upsert rows/s':>14}  {'export rows/s':>14}")
+    with app.app_context():
+        for size in args.sizes:
+            for fmt in args.formats:
+                db.session.query(Book).delete()
+                db.session.commit()
+                path = os.path.join(workdir, f'feed-{size}.{fmt}')
+                make_feed(path, size, fmt)
+                rates = []
+                for expected in ('inserted', 'updated'):
+                    with open(path, 'rb') as f:
+                        start = time.perf_counter()
+                        report = book_io.import_books(f, fmt, args.chunk_size)
+                        rates.append(size / (time.perf_counter() - start))
+                    assert getattr(report, expected) == size, report.to_dict()
+                start = time.perf_counter()
+                for _ in book_io.export_rows('books', fmt):
+                    pass
+                rates.append(size / (time.perf_counter() - start))
+                mb = os.path.getsize(path) / 1e6
+                print(f'{size:>8}  {fmt:<6}  {mb:>6.1f}  ' + '  '.join(f'{r:>14,.0f}' for r in rates))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Microbenchmarks of the hot request handlers through the Flask test client.
+
+Seeds a scratch database (see seed.py), then times each scenario for --iterations
+requests after --warmup untimed ones, recording latency percentiles and SQL
+statements per request. Write --output JSON and compare two runs with compare.py.
+
+    python benchmarks/bench_routes.py --scale small --iterations 200 --output before.json
+    python benchmarks/bench_routes.py --only catalog_search place_order
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+
+from common import load_app, login, summarize, write_results, timed, QueryCounter, \
+    STUDENT_PASSWORD, ADMIN_EMAIL, ADMIN_PASSWORD
+import seed as seeding
+
+
+class Scenario:
+    def __init__(self, name, request, prepare=None, expect=(200, 302)):
+        self.name = name
+        self.request = request
+        self.prepare = prepare
+        self.expect = expect
+
+
+def _login_request(ctx, i):
+    client = ctx['app'].test_client()
+    return client.post('/login', data={'email': ctx['student_email'], 'password': STUDENT_PASSWORD})
+
+
+def _fill_cart(ctx, i):
+    for book_id in ctx['rng'].sample(ctx['book_ids'], 3):
+        ctx['clients']['student'].post(f'/add_to_cart/{book_id}', data={'qty': 1})
+
+
+SCENARIOS = [
+    Scenario('login', _login_request, expect=(302,)),
+    Scenario('catalog', lambda ctx, i: ctx['clients']['student'].get('/catalog'), expect=(200,)),
+    Scenario('catalog_search',
+             lambda ctx, i: ctx['clients']['student'].get('/catalog', query_string={'q': ctx['rng'].choice(seeding.WORDS)}),
+             expect=(200,)),
+    Scenario('place_order',
+             lambda ctx, i: ctx['clients']['student'].post(f'/order/{ctx["rng"].choice(ctx["book_ids"])}', data={'qty': 1})),
+    Scenario('cart_checkout',
+             lambda ctx, i: ctx['clients']['student'].post('/cart/checkout', data={'payment_method': 'mock'}),
+             prepare=_fill_cart),
+    Scenario('api_stats', lambda ctx, i: ctx['clients']['admin'].get('/api/stats'), expect=(200,)),
+    Scenario('admin_dashboard', lambda ctx, i: ctx['clients']['admin'].get('/admin'), expect=(200,)),
+]
+
+
+def run_scenario(ctx, scenario, iterations, warmup):
+    samples, errors, queries = [], 0, 0
+    for i in range(warmup + iterations):
+        if scenario.prepare:
+            scenario.prepare(ctx, i)
+        with QueryCounter() as counter:
+            elapsed, response = timed(scenario.request, ctx, i)
+        if i < warmup:
+            continue
+        samples.append(elapsed)
+        queries += counter.count
+        if response.status_code not in scenario.expect:
+            errors += 1
+    result = summarize(samples, sum(samples))
+    result['errors'] = errors
+    result['queries_per_request'] = round(queries / iterations, 2) if iterations else 0.0
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.add_argument('--db', help='reuse an already seeded database instead of a scratch one')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--only', nargs='+', choices=[s.name for s in SCENARIOS])
+    parser.add_argument('--no-catalog-cache', action='store_true', help='render the catalog grid on every request')
+    parser.add_argument('--template-folder', help='templates directory, if not the default ./templates')
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = load_app(db_path, args.template_folder)
+    counts = seeding.counts_from_args(args)
+    if not args.db:
+        print(f'Seeding {db_path}: ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+        user_ids, book_ids = seeding.seed(app, counts, args.seed, args.stock)
+    else:
+        from models import db, User, Book
+        with app.app_context():
+            user_ids = [u for (u,) in db.session.query(User.id).filter(User.email.like('%@bench.example.com')).order_by(User.id)]
+            book_ids = [b for (b,) in db.session.query(Book.id).order_by(Book.id)]
+    if args.no_catalog_cache:
+        import page_cache
+        page_cache.catalog_cache.backend = None
+
+    rng = random.Random(args.seed)
+    student_email = seeding.student_email(user_ids[0])
+    ctx = {
+        'app': app,
+        'rng': rng,
+        'book_ids': book_ids,
+        'student_email': student_email,
+        'clients': {
+            'student': login(app, student_email, STUDENT_PASSWORD),
+            'admin': login(app, ADMIN_EMAIL, ADMIN_PASSWORD),
+        },
+    }
+
+    results = {}
+    print(f"{'scenario':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'queries':>8} {'errors':>7}")
+    for scenario in SCENARIOS:
+        if args.only and scenario.name not in args.only:
+            continue
+        r = results[scenario.name] = run_scenario(ctx, scenario, args.iterations, args.warmup)
+        print(f"{scenario.name:<16} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['ops_per_sec']:>9.1f} {r['queries_per_request']:>8.1f} {r['errors']:>7}")
+
+    params = {'counts': counts, 'seed': args.seed, 'iterations': args.iterations, 'warmup': args.warmup,
+              'catalog_cache': not args.no_catalog_cache}
+    write_results(args.output, 'routes', params, results)
+    if not args.db:
+        shutil.rmtree(os.path.dirname(db_path))
+
+
+if __name__ == '__main__':
+    main()
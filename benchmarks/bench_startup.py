@@ -0,0 +1,94 @@
+"""Cold-start cost of a web worker.
+
+Each run starts a fresh interpreter that imports the app (module imports plus
+create_app()) and then serves its first requests through the test client, which
+is what every gunicorn worker pays on boot. Reports import and first-request
+latency percentiles over --runs, with lazily imported views and with every view
+module imported at startup (LAZY_VIEWS=False); --output writes them as JSON.
+
+    python benchmarks/bench_startup.py --runs 20 --output startup.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from common import ROOT, summarize, write_results
+
+SETUP = '''
+from app import app
+from commands import setup_database
+with app.app_context():
+    setup_database()
+'''
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+client = app.test_client()
+first = []
+for path in sys.argv[1:]:
+    t = time.perf_counter()
+    status = client.get(path).status_code
+    first.append((path, status, time.perf_counter() - t))
+print(json.dumps({'import': imported - start, 'requests': first, 'modules': len(sys.modules)}))
+'''
+
+
+def _run(code, env, cwd, args=()):
+    out = subprocess.run([sys.executable, '-c', code, *args], cwd=cwd, env=env,
+                         capture_output=True, text=True, check=True)
+    return out.stdout.strip().splitlines()[-1] if out.stdout.strip() else None
+
+
+def measure(env, workdir, runs, paths):
+    imports, modules = [], []
+    requests = {p: [] for p in paths}
+    for _ in range(runs):
+        sample = json.loads(_run(CHILD, env, workdir, paths))
+        imports.append(sample['import'])
+        modules.append(sample['modules'])
+        for path, status, elapsed in sample['requests']:
+            if status >= 500:
+                raise RuntimeError(f'GET {path} failed with HTTP {status}')
+            requests[path].append(elapsed)
+    return {
+        'import': summarize(imports),
+        'first_requests': {p: summarize(s) for p, s in requests.items()},
+        'modules_loaded': max(modules),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--paths', nargs='+', default=['/catalog', '/metrics'],
+                        help='requests served right after boot (unauthenticated)')
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args()
+
+    # Scratch working directory for the database and the app's log file
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=ROOT,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'startup.db'))
+    _run(SETUP, env, workdir)
+
+    results = {}
+    print(f"{'mode':<6} {'import p50':>11} {'import p95':>11} {'modules':>8}   first request p50 ms")
+    for mode, lazy in (('lazy', 'True'), ('eager', 'False')):
+        r = results[mode] = measure(dict(env, LAZY_VIEWS=lazy), workdir, args.runs, args.paths)
+        first = '  '.join(f"{p}={s['p50_ms']:.1f}" for p, s in r['first_requests'].items())
+        print(f"{mode:<6} {r['import']['p50_ms']:>9.1f}ms {r['import']['p95_ms']:>9.1f}ms "
+              f"{r['modules_loaded']:>8}   {first}")
+
+    write_results(args.output, 'startup', {'runs': args.runs, 'paths': args.paths}, results)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
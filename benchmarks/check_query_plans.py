@@ -0,0 +1,77 @@
+"""Check that the hot queries are served by indexes.
+
+Builds the schema from the models in a scratch SQLite database, runs
+EXPLAIN QUERY PLAN for each query the routes issue on large tables and fails
+if a query does not use its expected index or falls back to a full table scan.
+
+    python benchmarks/check_query_plans.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def hot_queries():
+    from datetime import datetime
+    from models import db, User, Order, Cart, BookRequest, wishlist_table
+    wl = wishlist_table.c
+    # (description, query, index expected in the plan)
+    return [
+        ('student dashboard orders',
+         Order.query.filter_by(user_id=1).order_by(Order.created_at.desc()), 'ix_order_user_created'),
+        ('admin recent orders page',
+         Order.query.order_by(Order.created_at.desc(), Order.id.desc()).limit(50), 'ix_order_created_at'),
+        ('pending orders',
+         Order.query.filter_by(status='pending').order_by(Order.created_at), 'ix_order_status_created'),
+        ('cart line lookup',
+         Cart.query.filter_by(user_id=1, book_id=2), 'uq_cart_user_book'),
+        ('cart contents',
+         Cart.query.filter_by(user_id=1), 'uq_cart_user_book'),
+        ('pending book requests count',
+         db.session.query(db.func.count(BookRequest.id)).filter(BookRequest.status == 'pending'), 'ix_book_request_status_created'),
+        ('book requests page',
+         BookRequest.query.order_by(BookRequest.created_at.desc(), BookRequest.id.desc()).limit(50), 'ix_book_request_created_at'),
+        ('student listing',
+         User.query.filter_by(role='student').order_by(User.id).limit(50), 'ix_user_role'),
+        ('wishlist membership',
+         db.session.query(wl.book_id).filter(wl.user_id == 1, wl.book_id == 2), 'uq_wishlist_user_book'),
+        ('wishlisted by',
+         db.session.query(wl.user_id).filter(wl.book_id == 2), 'ix_wishlist_book_id'),
+        ('expired cart holds',
+         Cart.query.filter(Cart.added_at < datetime(2026, 1, 1)).order_by(Cart.added_at, Cart.id).limit(500), 'ix_cart_added_at'),
+        ('overdue loans',
+         Order.query.filter(Order.status.in_(('approved',)), Order.due_date < datetime(2026, 1, 1),
+                            Order.due_date >= datetime(2025, 12, 31)), 'ix_order_status_due'),
+    ]
+
+
+def explain(query):
+    from models import db
+    sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in db.session.execute(db.text('EXPLAIN QUERY PLAN ' + sql))]
+
+
+def main():
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    sys.path.insert(0, ROOT)
+    from app import app
+    from commands import setup_database
+
+    failures = 0
+    with app.app_context():
+        setup_database()
+        for name, query, index in hot_queries():
+            plan = explain(query)
+            full_scan = any(step.startswith('SCAN') and 'INDEX' not in step for step in plan)
+            ok = any(index in step for step in plan) and not full_scan
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name:<30} {' | '.join(plan)}")
+    if failures:
+        print(f'{failures} hot quer{"y" if failures == 1 else "ies"} not using the expected index')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Check that read-only views use the replica and that writes stick to the primary.
+
+Sets up a primary and a replica as two SQLite files (the replica is a copy taken
+after setup and never updated, so stale reads are visible), then drives the JSON
+API as a student and counts the statements each engine receives:
+
+- a read-only view is served by the replica alone;
+- a write, and the user's reads for REPLICA_STICKY_SECONDS after it, go to the primary;
+- once that window has passed, reads go back to the replica.
+
+    python benchmarks/check_replica_routing.py
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from common import load_app, login, STUDENT_PASSWORD
+
+STICKY_SECONDS = 0.5
+STUDENT_EMAIL = 'replica-check@bench.example.com'
+
+
+class EngineCounter:
+    """Counts the statements sent to one engine while installed."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='replica-check-')
+    primary_path = os.path.join(workdir, 'primary.db')
+    replica_path = os.path.join(workdir, 'replica.db')
+    # DATABASE_URL and the replica settings are read once, when the app is imported
+    os.environ['DATABASE_REPLICA_URL'] = 'sqlite:///' + replica_path
+    os.environ['REPLICA_STICKY_SECONDS'] = str(STICKY_SECONDS)
+    try:
+        app = load_app(primary_path)
+        from models import db, User, Book
+        with app.app_context():
+            student = User(name='Replica Check', email=STUDENT_EMAIL, role='student')
+            student.set_password(STUDENT_PASSWORD)
+            db.session.add(student)
+            db.session.add(Book(title='Replica Check', author='Bench', total_copies=1, available_copies=1))
+            db.session.commit()
+            book_id = db.session.query(Book.id).scalar()
+            # The online backup API copies committed pages, including any still in the WAL
+            with sqlite3.connect(primary_path) as src, sqlite3.connect(replica_path) as dst:
+                src.backup(dst)
+            primary, replica = db.engine, db.engines['replica']
+
+        client = login(app, STUDENT_EMAIL, STUDENT_PASSWORD)
+        time.sleep(STICKY_SECONDS * 2)  # in case logging in wrote something
+        # The first request loads the user into user_cache before the view runs, so on the primary
+        client.get('/api/v1/wishlist')
+
+        def request(method, path, **kwargs):
+            with EngineCounter(primary) as on_primary, EngineCounter(replica) as on_replica:
+                response = client.open(path, method=method, **kwargs)
+            if response.status_code != 200:
+                raise RuntimeError(f'{method} {path} returned HTTP {response.status_code}')
+            return response.get_json(), on_primary.count, on_replica.count
+
+        failures = 0
+
+        def check(name, ok, detail):
+            nonlocal failures
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name:<40} {detail}")
+
+        body, p, r = request('GET', '/api/v1/wishlist')
+        check('read goes to the replica', r > 0 and p == 0, f'primary={p} replica={r}')
+
+        body, p, r = request('POST', '/api/v1/wishlist', json={'add': [book_id]})
+        check('write goes to the primary', p > 0 and r == 0, f'primary={p} replica={r}')
+
+        body, p, r = request('GET', '/api/v1/wishlist')
+        check('read after a write sticks to the primary', p > 0 and r == 0 and body['book_ids'] == [book_id],
+              f'primary={p} replica={r} book_ids={body["book_ids"]}')
+
+        time.sleep(STICKY_SECONDS * 2)
+        body, p, r = request('GET', '/api/v1/wishlist')
+        # The replica copy predates the write, so it must not see the new row
+        check('read after the sticky window uses the replica', r > 0 and p == 0 and body['book_ids'] == [],
+              f'primary={p} replica={r} book_ids={body["book_ids"]}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if failures:
+        print(f'{failures} replica routing check{"" if failures == 1 else "s"} failed')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Shared helpers for the benchmark scripts: app setup, timing summaries, JSON results."""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STUDENT_PASSWORD = 'bench-pass'
+ADMIN_EMAIL = 'admin@bookstore.com'
+ADMIN_PASSWORD = 'admin123'
+
+
+def load_app(db_path, template_folder=None):
+    """Import the app against the SQLite file `db_path` (DATABASE_URL is read once, at import) and set up its schema."""
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(db_path)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from app import app
+    from commands import setup_database
+    with app.app_context():
+        setup_database(ADMIN_EMAIL, ADMIN_PASSWORD)
+    app.config['WTF_CSRF_ENABLED'] = False
+    if template_folder:
+        app.template_folder = os.path.abspath(template_folder)
+    return app
+
+
+def login(app, email, password):
+    client = app.test_client()
+    response = client.post('/login', data={'email': email, 'password': password})
+    if response.status_code != 302:
+        raise RuntimeError(f'login as {email} failed with HTTP {response.status_code}')
+    return client
+
+
+class QueryCounter:
+    """Counts SQL statements sent to any engine while installed."""
+
+    def __init__(self):
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.remove(Engine, 'before_cursor_execute', self._on_execute)
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples, elapsed=None) -> dict:
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    summary = {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        'p50_ms': round(_percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(_percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(_percentile(ordered, 0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+    if elapsed:
+        summary['ops_per_sec'] = round(len(ordered) / elapsed, 1)
+    return summary
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        rev = out.stdout.strip() or None
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+        return f'{rev}-dirty' if rev and dirty else rev
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> dict:
+    return {
+        'revision': git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def write_results(path, benchmark, params, results):
+    payload = {'benchmark': benchmark, 'environment': environment(), 'params': params, 'results': results}
+    if path:
+        with open(path, 'w') as f:
+            json.dump(payload, f, indent=2, sort_keys=True)
+        print(f'Results written to {path}')
+    return payload
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
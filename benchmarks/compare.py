@@ -0,0 +1,62 @@
+"""Compare two benchmark result files (bench_routes.py or load_test.py --output).
+
+Prints the change of every latency percentile and throughput figure present in
+both files and exits with status 1 if any p50/p95 latency got slower, or any
+throughput lower, by more than --threshold percent.
+
+    python benchmarks/compare.py before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+LATENCY_KEYS = ('p50_ms', 'p95_ms')
+THROUGHPUT_KEYS = ('ops_per_sec', 'requests_per_sec')
+
+
+def _flatten(results, prefix=''):
+    """{name: {metric: value}} for every dict in `results` that carries latency or throughput figures."""
+    flat = {}
+    for name, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        metrics = {k: v for k, v in value.items() if k in LATENCY_KEYS + THROUGHPUT_KEYS}
+        if metrics:
+            flat[prefix + name] = metrics
+        flat.update(_flatten(value, f'{prefix}{name}.'))
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed regression in percent')
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    if before['params'] != after['params']:
+        print('warning: the two runs used different parameters, results may not be comparable')
+    print(f"before {before['environment'].get('revision')}  after {after['environment'].get('revision')}")
+
+    old, new = _flatten(before['results']), _flatten(after['results'])
+    regressions = []
+    for name in sorted(set(old) & set(new)):
+        for key in sorted(set(old[name]) & set(new[name])):
+            a, b = old[name][key], new[name][key]
+            change = ((b - a) / a * 100) if a else 0.0
+            worse = change > args.threshold if key in LATENCY_KEYS else -change > args.threshold
+            flag = '  REGRESSION' if worse else ''
+            print(f'{name:<40} {key:<17} {a:>10.2f} -> {b:>10.2f}  {change:>+7.1f}%{flag}')
+            if worse:
+                regressions.append((name, key))
+    if regressions:
+        print(f'{len(regressions)} regression(s) above {args.threshold:.0f}%')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Multi-process write load test for the SQLite engine settings.
+
+Runs N worker processes that each insert orders as fast as they can for a fixed
+duration, once with SQLITE_TUNING=False (stock pysqlite settings) and once with
+the tuned engine (WAL, busy_timeout, synchronous=NORMAL, pooled connections).
+Reports committed writes per second and how many commits failed with
+"database is locked".
+
+    python benchmarks/load_sqlite_writes.py --workers 4 8 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _worker(seconds, results):
+    sys.path.insert(0, ROOT)
+    from sqlalchemy.exc import OperationalError
+    from app import app
+    from models import db, Order
+    ok = locked = 0
+    with app.app_context():
+        db.engine.dispose()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            db.session.add(Order(user_id=1, book_id=1, quantity=1, status='pending'))
+            try:
+                db.session.commit()
+                ok += 1
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e.orig):
+                    raise
+                locked += 1
+    results.put((ok, locked))
+
+
+def run_mode(workers, seconds):
+    """Child entry point: DATABASE_URL and SQLITE_TUNING are already in the environment."""
+    sys.path.insert(0, ROOT)
+    from app import app
+    from models import db
+    from commands import setup_database
+    with app.app_context():
+        setup_database()
+        db.engine.dispose()
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_worker, args=(seconds, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    ok = sum(t[0] for t in totals)
+    locked = sum(t[1] for t in totals)
+    print(f'{ok} {locked}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--_child', nargs=2, type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._child:
+        run_mode(int(args._child[0]), args._child[1])
+        return
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'workers':>7}  {'tuning':<6}  {'writes/s':>9}  {'locked errors':>13}")
+    for workers in args.workers:
+        for tuned in (False, True):
+            # Fresh process and database per run: engine options are fixed at app import
+            env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(workdir, f'writes-{workers}-{tuned}.db'),
+                       SQLITE_TUNING=str(tuned))
+            out = subprocess.run([sys.executable, __file__, '--_child', str(workers), str(args.seconds)],
+                                 env=env, capture_output=True, text=True, check=True).stdout
+            ok, locked = map(int, out.strip().splitlines()[-1].split())
+            print(f"{workers:>7}  {'on' if tuned else 'off':<6}  {ok / args.seconds:>9.1f}  {locked:>13}")
+    shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
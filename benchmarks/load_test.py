@@ -0,0 +1,146 @@
+"""Concurrent mixed-workload load test.
+
+Seeds a database, then runs --workers processes for --seconds each. Every worker
+logs in as its own student and as the admin, and issues a weighted mix of catalog
+browsing, search, ordering, cart checkout, top-sellers and admin dashboard
+requests through its own Flask test client. Reports overall throughput
+and per-operation latency percentiles; --output writes them as JSON.
+
+    python benchmarks/load_test.py --workers 1 4 8 --seconds 10 --output load.json
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from common import load_app, login, summarize, write_results, STUDENT_PASSWORD, ADMIN_EMAIL, ADMIN_PASSWORD
+import seed as seeding
+
+# operation -> relative weight
+MIX = {
+    'catalog': 40,
+    'catalog_search': 20,
+    'place_order': 10,
+    'add_to_cart': 10,
+    'cart_checkout': 5,
+    'student_dashboard': 8,
+    'api_stats': 4,
+    'admin_dashboard': 3,
+}
+
+
+def _operation(name, student, admin, rng, book_ids):
+    if name == 'catalog':
+        return student.get('/catalog')
+    if name == 'catalog_search':
+        return student.get('/catalog', query_string={'q': rng.choice(seeding.WORDS)})
+    if name == 'place_order':
+        return student.post(f'/order/{rng.choice(book_ids)}', data={'qty': 1})
+    if name == 'add_to_cart':
+        return student.post(f'/add_to_cart/{rng.choice(book_ids)}', data={'qty': 1})
+    if name == 'cart_checkout':
+        return student.post('/cart/checkout', data={'payment_method': 'mock'})
+    if name == 'student_dashboard':
+        return student.get('/student')
+    if name == 'api_stats':
+        return admin.get('/api/stats')
+    if name == 'admin_dashboard':
+        return admin.get('/admin')
+    raise ValueError(name)
+
+
+def _worker(index, db_path, template_folder, email, book_ids, seconds, seed, start_at, results):
+    app = load_app(db_path, template_folder)
+    rng = random.Random(seed * 1000 + index)
+    student = login(app, email, STUDENT_PASSWORD)
+    admin = login(app, ADMIN_EMAIL, ADMIN_PASSWORD)
+    names = list(MIX)
+    weights = [MIX[n] for n in names]
+    samples = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+
+    # Start together so the measured window is fully concurrent
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = _operation(name, student, admin, rng, book_ids)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        samples[name].append(time.perf_counter() - start)
+        if not ok:
+            errors[name] += 1
+    results.put((samples, errors))
+
+
+def run(db_path, template_folder, workers, seconds, seed, user_ids, book_ids):
+    ctx = multiprocessing.get_context('spawn')   # fresh interpreter per worker, no inherited connections
+    results = ctx.Queue()
+    start_at = time.time() + 5 + workers * 0.5   # time for the workers to import the app and log in
+    procs = [
+        ctx.Process(target=_worker, args=(i, db_path, template_folder, seeding.student_email(user_ids[i % len(user_ids)]),
+                                          book_ids, seconds, seed, start_at, results))
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    per_op = {}
+    total = errors = 0
+    for name in MIX:
+        samples = [s for c in collected for s in c[0][name]]
+        failed = sum(c[1][name] for c in collected)
+        per_op[name] = dict(summarize(samples, seconds), errors=failed)
+        total += len(samples)
+        errors += failed
+    return {'workers': workers, 'requests': total, 'errors': errors,
+            'requests_per_sec': round(total / seconds, 1), 'operations': per_op}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    seeding.add_arguments(parser)
+    parser.add_argument('--db', help='reuse an already seeded database instead of a scratch one')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--template-folder', help='templates directory, if not the default ./templates')
+    parser.add_argument('--output', help='write JSON results here')
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = load_app(db_path, args.template_folder)
+    counts = seeding.counts_from_args(args)
+    from models import db, User, Book
+    if not args.db:
+        print(f'Seeding {db_path}: ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+        seeding.seed(app, counts, args.seed, args.stock)
+    with app.app_context():
+        user_ids = [u for (u,) in db.session.query(User.id).filter(User.email.like('%@bench.example.com')).order_by(User.id)]
+        book_ids = [b for (b,) in db.session.query(Book.id).order_by(Book.id)]
+        db.engine.dispose()
+
+    runs = []
+    print(f"{'workers':>7} {'req/s':>9} {'requests':>9} {'errors':>7}   p95 ms by operation")
+    for workers in args.workers:
+        r = run(db_path, args.template_folder, workers, args.seconds, args.seed, user_ids, book_ids)
+        runs.append(r)
+        p95 = '  '.join(f"{n}={o['p95_ms']:.1f}" for n, o in r['operations'].items() if o['count'])
+        print(f"{workers:>7} {r['requests_per_sec']:>9.1f} {r['requests']:>9} {r['errors']:>7}   {p95}")
+
+    params = {'counts': counts, 'seed': args.seed, 'seconds': args.seconds, 'mix': MIX}
+    write_results(args.output, 'load', params, {f'workers_{r["workers"]}': r for r in runs})
+    if not args.db:
+        shutil.rmtree(os.path.dirname(db_path))
+
+
+if __name__ == '__main__':
+    main()
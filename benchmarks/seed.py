@@ -0,0 +1,172 @@
+"""Seeded data generator for benchmarks and load tests.
+
+Fills a SQLite database with students, books, orders, cart lines, book requests
+and wishlist rows. The same --seed and scale always produce the same data, so
+results from different commits are comparable.
+
+    python benchmarks/seed.py bench.db --scale medium --seed 42
+    python benchmarks/seed.py bench.db --books 200000 --orders 1000000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from common import load_app, STUDENT_PASSWORD
+
+SCALES = {
+    'small': {'students': 100, 'books': 1000, 'orders': 5000, 'cart_lines': 200, 'requests': 200, 'wishlist': 1000},
+    'medium': {'students': 1000, 'books': 20000, 'orders': 100000, 'cart_lines': 2000, 'requests': 2000, 'wishlist': 20000},
+    'large': {'students': 10000, 'books': 200000, 'orders': 1000000, 'cart_lines': 20000, 'requests': 20000, 'wishlist': 200000},
+}
+
+WORDS = ('river night garden shadow empire silent winter code python data history ocean machine learning '
+         'dragon city light fire stone glass quantum economics design modern ancient lost secret journey '
+         'algorithms systems physics chemistry biology poetry war peace children tales star mountain').split()
+GENRES = ('Fiction', 'Science', 'History', 'Technology', 'Poetry', 'Children', 'Biography', 'General')
+FIRST = ('Ada', 'Alan', 'Grace', 'Linus', 'Maya', 'Omar', 'Priya', 'Chen', 'Sofia', 'Kofi', 'Lena', 'Ivan')
+LAST = ('Lovelace', 'Turing', 'Hopper', 'Okafor', 'Ng', 'Silva', 'Kumar', 'Haddad', 'Novak', 'Sato')
+
+ORDER_STATUSES = (('pending', 15), ('approved', 20), ('paid', 35), ('returned', 20), ('canceled', 10))
+REQUEST_STATUSES = (('pending', 50), ('approved', 30), ('rejected', 20))
+
+BATCH = 5000
+
+
+def student_email(i):
+    return f'student{i}@bench.example.com'
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def _insert(db, table, rows):
+    for i in range(0, len(rows), BATCH):
+        db.session.execute(table.insert(), rows[i:i + BATCH])
+
+
+def seed(app, counts, seed=42, stock=1000, now=None):
+    """Insert `counts` rows of each kind; returns the ids of the created students and books."""
+    from models import db, User, Book, Order, Cart, BookRequest, wishlist_table
+    from search import init_search_index
+    import stats
+
+    rng = random.Random(seed)
+    now = now or datetime(2026, 1, 1)
+    with app.app_context():
+        # One bcrypt hash at the configured cost, shared by every student
+        probe = User(name='x', email='x')
+        probe.set_password(STUDENT_PASSWORD)
+
+        first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+        _insert(db, User.__table__, [
+            {'name': f'{rng.choice(FIRST)} {rng.choice(LAST)}', 'email': student_email(first_user + i),
+             'password_hash': probe.password_hash, 'role': 'student',
+             'created_at': now - timedelta(days=rng.randint(0, 730))}
+            for i in range(counts['students'])
+        ])
+        user_ids = list(range(first_user, first_user + counts['students']))
+
+        first_book = (db.session.query(db.func.max(Book.id)).scalar() or 0) + 1
+        books = []
+        for i in range(counts['books']):
+            total = rng.randint(stock // 2, stock) if stock > 1 else stock
+            books.append({
+                'title': ' '.join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 5))),
+                'author': f'{rng.choice(FIRST)} {rng.choice(LAST)}',
+                'genre': rng.choice(GENRES),
+                'isbn': f'978{first_book + i:010d}',
+                'price': round(rng.uniform(3, 80), 2),
+                'total_copies': total,
+                'available_copies': total,
+                'created_at': now - timedelta(days=rng.randint(0, 1500)),
+            })
+        book_ids = list(range(first_book, first_book + counts['books']))
+
+        orders = []
+        for _ in range(counts['orders']):
+            book = rng.randrange(len(books))
+            status = _weighted(rng, ORDER_STATUSES)
+            qty = rng.randint(1, 3)
+            created = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            if status in ('pending', 'approved', 'paid'):
+                qty = min(qty, books[book]['available_copies'])
+                if not qty:
+                    status, qty = 'canceled', 1
+                else:
+                    books[book]['available_copies'] -= qty
+            orders.append({
+                'user_id': rng.choice(user_ids), 'book_id': book_ids[book], 'quantity': qty, 'status': status,
+                'created_at': created, 'payment_method': rng.choice(('stripe', 'paypal', 'mock')),
+                'payment_status': 'paid' if status in ('paid', 'returned') else 'unpaid',
+                'due_date': created + timedelta(days=14) if status != 'canceled' else None,
+                'returned_at': created + timedelta(days=rng.randint(1, 30)) if status == 'returned' else None,
+                'fine': 0.0,
+            })
+
+        cart, seen = [], set()
+        for _ in range(counts['cart_lines']):
+            user, book = rng.choice(user_ids), rng.randrange(len(books))
+            if (user, book) in seen or books[book]['available_copies'] < 1:
+                continue
+            seen.add((user, book))
+            books[book]['available_copies'] -= 1   # cart lines hold their copies
+            cart.append({'user_id': user, 'book_id': book_ids[book], 'quantity': 1,
+                         'added_at': now - timedelta(hours=rng.randint(0, 72))})
+
+        _insert(db, Book.__table__, books)
+        _insert(db, Order.__table__, orders)
+        _insert(db, Cart.__table__, cart)
+        _insert(db, BookRequest.__table__, [
+            {'user_id': rng.choice(user_ids), 'title': ' '.join(rng.choice(WORDS).capitalize() for _ in range(3)),
+             'author': f'{rng.choice(FIRST)} {rng.choice(LAST)}', 'genre': rng.choice(GENRES),
+             'status': _weighted(rng, REQUEST_STATUSES), 'created_at': now - timedelta(days=rng.randint(0, 365))}
+            for _ in range(counts['requests'])
+        ])
+        pairs = {(rng.choice(user_ids), rng.choice(book_ids)) for _ in range(counts['wishlist'])}
+        _insert(db, wishlist_table, [{'user_id': u, 'book_id': b} for u, b in sorted(pairs)])
+        db.session.commit()
+
+        # Derived data the app normally maintains on write
+        init_search_index(rebuild=True)
+        stats.rebuild_sales()
+    return user_ids, book_ids
+
+
+def add_arguments(parser):
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stock', type=int, default=1000, help='copies per book (upper bound)')
+    for name in SCALES['small']:
+        parser.add_argument(f'--{name.replace("_", "-")}', type=int, help=f'override the number of {name}')
+
+
+def counts_from_args(args) -> dict:
+    counts = dict(SCALES[args.scale])
+    for name in counts:
+        value = getattr(args, name)
+        if value is not None:
+            counts[name] = value
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('db', help='SQLite file to create (must not exist)')
+    add_arguments(parser)
+    args = parser.parse_args()
+    if os.path.exists(args.db):
+        parser.error(f'{args.db} already exists')
+
+    app = load_app(args.db)
+    counts = counts_from_args(args)
+    start = time.perf_counter()
+    seed(app, counts, args.seed, args.stock)
+    print(f'Seeded {args.db} in {time.perf_counter() - start:.1f}s: ' + ', '.join(f'{v} {k}' for k, v in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Concurrency stress test for inventory reservations.
+
+Forks N worker processes that all try to take copies of the same book until it
+is sold out, then checks that exactly `--copies` reservations succeeded and that
+stock never went negative. `--naive` runs the old read-check-write code path for
+comparison, which oversells under contention.
+
+    python benchmarks/stress_inventory.py --workers 1 2 4 8 --copies 500
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _setup(db_path):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    sys.path.insert(0, ROOT)
+    from app import app
+    return app
+
+
+def _worker(db_path, book_id, naive, results):
+    app = _setup(db_path)
+    import inventory
+    from models import db, Book
+    taken = 0
+    with app.app_context():
+        db.engine.dispose()
+        while True:
+            if naive:
+                book = db.session.get(Book, book_id)
+                if book.available_copies < 1:
+                    db.session.rollback()
+                    break
+                book.available_copies -= 1
+                db.session.commit()
+                ok = True
+            else:
+                ok = inventory.run_in_transaction(inventory.reserve, book_id, 1)
+            if not ok:
+                break
+            taken += 1
+    results.put(taken)
+
+
+def run(db_path, workers, copies, naive):
+    app = _setup(db_path)
+    from models import db, Book
+    from commands import setup_database
+    with app.app_context():
+        setup_database()
+        book = Book(title='Stress', author='Bench', total_copies=copies, available_copies=copies)
+        db.session.add(book)
+        db.session.commit()
+        book_id = book.id
+        db.engine.dispose()
+
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_worker, args=(db_path, book_id, naive, results)) for _ in range(workers)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    taken = sum(results.get() for _ in procs)
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        remaining = db.session.get(Book, book_id).available_copies
+        db.engine.dispose()
+    return {
+        'workers': workers,
+        'reserved': taken,
+        'remaining': remaining,
+        'oversold': taken - copies,
+        'seconds': round(elapsed, 3),
+        'reservations_per_sec': round(taken / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--copies', type=int, default=500)
+    parser.add_argument('--naive', action='store_true', help='use read-modify-write instead of conditional UPDATEs')
+    args = parser.parse_args()
+
+    # The app reads DATABASE_URL once at import, so every run shares one scratch file
+    db_path = os.path.join(tempfile.mkdtemp(), 'stress.db')
+    failed = False
+    for n in args.workers:
+        r = run(db_path, n, args.copies, args.naive)
+        print(f"workers={r['workers']:>2}  reserved={r['reserved']:>5}  remaining={r['remaining']:>4}  "
+              f"oversold={r['oversold']:>4}  {r['seconds']:>7.3f}s  {r['reservations_per_sec']:>8.1f}/s")
+        if r['oversold'] != 0 or r['remaining'] != 0:
+            failed = True
+    shutil.rmtree(os.path.dirname(db_path))
+    if failed and not args.naive:
+        print('FAIL: stock was oversold or left unsold')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
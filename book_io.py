@@ -0,0 +1,298 @@
+import codecs
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from sqlalchemy import func
+from models import db, Book, Order
+import inventory
+import page_cache
+import search
+
+# Bulk book import and streaming export.
+#
+# Imports read CSV or JSONL one row at a time and write in chunks of
+# IMPORT_CHUNK_SIZE rows: one SELECT to find which ISBNs already exist, a guarded
+# UPDATE per existing book and one executemany INSERT per chunk, each chunk
+# committed on its own. Rows with an ISBN that is already in the catalog update that book;
+# everything else is inserted. Rows that fail validation are skipped and listed
+# in the report with their line number; they never abort the import.
+#
+# Exports stream Book or Order rows straight from a server-side cursor, so
+# memory use does not depend on the size of the table.
+
+IMPORT_CHUNK_SIZE = 500
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ('csv', 'jsonl')
+EXPORT_FORMATS = FORMATS + ('json',)
+
+EXPORT_COLUMNS = {
+    'books': ('id', 'isbn', 'title', 'author', 'genre', 'price', 'total_copies', 'available_copies', 'created_at'),
+    'orders': ('id', 'user_id', 'book_id', 'quantity', 'status', 'created_at', 'due_date', 'returned_at',
+               'fine', 'payment_method', 'payment_status'),
+}
+
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'json': 'application/json'}
+
+_book = Book.__table__
+
+
+class RowError(ValueError):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []   # (line, message), the first MAX_REPORTED_ERRORS only
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def to_dict(self) -> dict:
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def detect_format(filename, default='csv') -> str:
+    ext = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+    if ext in ('jsonl', 'ndjson', 'json'):
+        return 'jsonl'
+    if ext == 'csv':
+        return 'csv'
+    return default
+
+
+# -- parsing ------------------------------------------------------------------
+
+def _text_stream(stream):
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    # utf-8-sig drops the BOM spreadsheet exports like to add
+    return codecs.getreader('utf-8-sig')(stream, errors='replace')
+
+
+def iter_rows(stream, fmt):
+    """Yield (line number, raw dict) pairs from a CSV or JSONL byte or text stream."""
+    text = _text_stream(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for raw in reader:
+            yield reader.line_num, raw
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except ValueError as e:
+                yield line_no, RowError(f'invalid JSON: {e}')
+                continue
+            yield line_no, raw if isinstance(raw, dict) else RowError('expected a JSON object')
+    else:
+        raise ValueError(f'unsupported format {fmt!r}')
+
+
+def _clean(value):
+    if value is None:
+        return ''
+    return str(value).strip()
+
+
+def normalize_isbn(value):
+    isbn = _clean(value).replace('-', '').replace(' ', '').upper()
+    if len(isbn) > _book.c.isbn.type.length:
+        raise RowError('isbn is too long')
+    return isbn or None
+
+
+def parse_book(raw) -> dict:
+    """Validate one input row and return the Book column values it sets."""
+    if isinstance(raw, Exception):
+        raise raw
+    row = {'isbn': normalize_isbn(raw.get('isbn'))}
+    for field in ('title', 'author'):
+        row[field] = _clean(raw.get(field))
+        if not row[field]:
+            raise RowError(f'{field} is required')
+        if len(row[field]) > _book.c[field].type.length:
+            raise RowError(f'{field} is too long')
+    # Optional fields left blank are None: defaults for new books, unchanged on update
+    row['genre'] = _clean(raw.get('genre')) or None
+    for field, cast in (('price', float), ('total_copies', int)):
+        value = _clean(raw.get(field))
+        try:
+            row[field] = cast(value) if value else None
+        except ValueError:
+            raise RowError(f'invalid {field} {raw.get(field)!r}')
+        if row[field] is not None and row[field] < 0:
+            raise RowError(f'{field} must not be negative')
+    return row
+
+
+# -- import -------------------------------------------------------------------
+
+def _write_chunk(chunk, report):
+    """Upsert one chunk of (line, row) pairs in one transaction, retried on lock contention."""
+    updated, inserted, errors = inventory.run_in_transaction(_upsert_chunk, chunk)
+    for line, message in errors:
+        report.error(line, message)
+    report.updated += updated
+    report.inserted += inserted
+
+
+def _upsert_chunk(chunk):
+    """Write one chunk; ISBNs within a chunk are unique. Returns (updated, inserted, errors)."""
+    session = db.session
+    by_isbn = {row['isbn']: (line, row) for line, row in chunk if row['isbn']}
+    existing = {}
+    if by_isbn:
+        found = session.execute(
+            db.select(_book.c.id, _book.c.isbn, _book.c.title, _book.c.author, _book.c.genre, _book.c.price)
+            .where(_book.c.isbn.in_(list(by_isbn)))
+            .order_by(_book.c.id)
+        )
+        for current in found:
+            existing.setdefault(current.isbn, current)
+
+    updates, inserts, errors = [], [], []
+    for line, row in chunk:
+        current = existing.get(row['isbn'])
+        if current is None:
+            row = dict(row, genre=row['genre'] or 'General', price=row['price'] or 0.0,
+                       total_copies=1 if row['total_copies'] is None else row['total_copies'])
+            inserts.append(dict(row, available_copies=row['total_copies']))
+            continue
+        updates.append((line, current.id, {field: current._mapping[field] if value is None else value
+                                           for field, value in row.items() if field != 'total_copies'},
+                        row['total_copies']))
+
+    changed = []
+    for line, book_id, values, total in updates:
+        # Stock moves by the change in total_copies, relative to what is committed
+        # now, so concurrent reservations and returns are never overwritten
+        statement = _book.update().where(_book.c.id == book_id)
+        if total is not None:
+            delta = total - _book.c.total_copies
+            statement = (statement.where(_book.c.available_copies + delta >= 0)
+                         # available_copies first: MySQL evaluates SET left to right
+                         .ordered_values((_book.c.available_copies, _book.c.available_copies + delta),
+                                         (_book.c.total_copies, total),
+                                         *((_book.c[f], v) for f, v in values.items())))
+        else:
+            statement = statement.values(values)
+        if session.execute(statement).rowcount:
+            changed.append(book_id)
+        else:
+            errors.append((line, f'total_copies {total} is below the copies on loan'))
+    new_ids = []
+    if inserts:
+        last_id = session.execute(db.select(func.max(_book.c.id))).scalar() or 0
+        session.execute(_book.insert(), inserts)
+        new_ids = list(session.execute(db.select(_book.c.id).where(_book.c.id > last_id)).scalars())
+
+    # Core statements skip the ORM events, so sync the search index and the
+    # catalog cache here
+    search.reindex(changed + new_ids)
+    page_cache.books_changed(changed, None, page_cache.SEARCH_TAG, *([page_cache.TAIL_TAG] if new_ids else []))
+    return len(changed), len(inserts), errors
+
+
+def import_books(stream, fmt='csv', chunk_size=IMPORT_CHUNK_SIZE) -> ImportReport:
+    """Import books from a CSV/JSONL stream, upserting on ISBN. Returns an ImportReport."""
+    report = ImportReport()
+    chunk, isbns = [], set()
+    for line, raw in iter_rows(stream, fmt):
+        report.rows += 1
+        try:
+            row = parse_book(raw)
+        except RowError as e:
+            report.error(line, str(e))
+            continue
+        # A repeated ISBN must see the earlier row's write, so flush first
+        if len(chunk) >= chunk_size or (row['isbn'] and row['isbn'] in isbns):
+            _write_chunk(chunk, report)
+            chunk, isbns = [], set()
+        chunk.append((line, row))
+        if row['isbn']:
+            isbns.add(row['isbn'])
+    if chunk:
+        _write_chunk(chunk, report)
+    logging.info(f'Book import: {report.rows} rows, {report.inserted} inserted, '
+                 f'{report.updated} updated, {report.failed} failed')
+    return report
+
+
+def write_error_report(report, out):
+    writer = csv.writer(out)
+    writer.writerow(['line', 'error'])
+    writer.writerows(report.errors)
+
+
+# -- export -------------------------------------------------------------------
+
+def _export_query(kind):
+    table = {'books': _book, 'orders': Order.__table__}[kind]
+    columns = [table.c[name] for name in EXPORT_COLUMNS[kind]]
+    return db.select(*columns).order_by(table.c.id)
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream_rows(statement, fmt='csv', batch_size=EXPORT_BATCH_SIZE):
+    """Yield the rows of `statement` as CSV, JSONL or a JSON array, one text chunk per batch.
+
+    Rows are fetched `batch_size` at a time from a server-side cursor where the
+    driver supports one, so memory use stays flat however many rows there are.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'unsupported format {fmt!r}')
+    result = db.session.execute(statement, execution_options={'yield_per': batch_size})
+    columns = list(result.keys())
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if fmt == 'csv':
+        writer.writerow(columns)
+    elif fmt == 'json':
+        buf.write('[')
+    separator = ''
+    for rows in result.partitions():
+        for row in rows:
+            if fmt == 'csv':
+                writer.writerow(row)
+                continue
+            record = json.dumps({c: _jsonable(v) for c, v in zip(columns, row)})
+            if fmt == 'json':
+                buf.write(separator)
+                separator = ',\n'
+            buf.write(record)
+            if fmt == 'jsonl':
+                buf.write('\n')
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if fmt == 'json':
+        buf.write(']\n')
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def export_rows(kind, fmt='csv', batch_size=EXPORT_BATCH_SIZE):
+    """Yield `kind` ('books' or 'orders') in `fmt`, a batch of rows at a time."""
+    return stream_rows(_export_query(kind), fmt, batch_size)
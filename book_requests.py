@@ -0,0 +1,24 @@
+from models import db, BookRequest
+from inventory import Conflict, outcomes_for
+
+# Admin review of students' book requests.
+
+REVIEWABLE = ('pending',)
+
+
+def review(request_ids, status):
+    """Set every still-pending request of `request_ids` to `status` with one UPDATE.
+
+    Returns an inventory.Outcome per id, in the given order; requests already
+    reviewed (or missing) are reported and left alone."""
+    request_ids = list(dict.fromkeys(request_ids))
+    statuses = dict(db.session.query(BookRequest.id, BookRequest.status).filter(BookRequest.id.in_(request_ids)))
+    pending = [i for i in request_ids if statuses.get(i) in REVIEWABLE]
+    if pending:
+        changed = (BookRequest.query
+                   .filter(BookRequest.id.in_(pending), BookRequest.status.in_(REVIEWABLE))
+                   .update({BookRequest.status: status}, synchronize_session=False))
+        if changed != len(pending):
+            raise Conflict('book requests changed during review')
+        db.session.expire_all()
+    return outcomes_for(request_ids, statuses, pending)
@@ -0,0 +1,165 @@
+import logging
+import os
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.exc import IntegrityError
+from models import db, User
+from search import init_search_index
+import book_io
+import recommendations
+import reports
+import stats
+from mailer import mail_queue
+from scheduler import scheduler
+
+# Flask CLI commands (`flask --app app <command>`).
+# Schema setup and seeding live here rather than at import so web workers boot
+# without touching the database; run `init-db` once per deploy, before the workers.
+
+DEFAULT_ADMIN_EMAIL = 'admin@bookstore.com'
+DEFAULT_ADMIN_PASSWORD = 'admin123'
+
+
+def setup_database(admin_email=None, admin_password=None):
+    """Create missing tables, the search index and sales counters, and the first admin.
+
+    Safe to run repeatedly and from several processes at once."""
+    db.create_all()
+    init_search_index()
+    stats.ensure_sales()
+    return ensure_admin(admin_email or os.getenv('ADMIN_EMAIL', DEFAULT_ADMIN_EMAIL),
+                        admin_password or os.getenv('ADMIN_PASSWORD', DEFAULT_ADMIN_PASSWORD))
+
+
+def ensure_admin(email, password):
+    """Create an admin account unless one exists; returns the new user or None."""
+    if db.session.query(User.id).filter_by(role='admin').first():
+        return None
+    admin = User(name='Admin', email=email, role='admin')
+    admin.set_password(password)
+    db.session.add(admin)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another process created it between our check and insert (email is unique)
+        db.session.rollback()
+        return None
+    logging.info(f'Created default admin {email}')
+    return admin
+
+
+@click.command('init-db')
+@with_appcontext
+@click.option('--admin-email', help=f'Defaults to $ADMIN_EMAIL or {DEFAULT_ADMIN_EMAIL}.')
+@click.option('--admin-password', help='Defaults to $ADMIN_PASSWORD.')
+def init_db_command(admin_email, admin_password):
+    admin = setup_database(admin_email, admin_password)
+    print('Database ready')
+    if admin is not None:
+        print(f'Created default admin -> {admin.email}')
+
+
+@click.command('reindex-books')
+@with_appcontext
+def reindex_books_command():
+    init_search_index(rebuild=True)
+    print('Book search index rebuilt')
+
+
+@click.command('send-mail')
+@with_appcontext
+def send_mail_command():
+    sent = mail_queue.drain()
+    print(f'Processed {sent} queued message(s)')
+
+
+@click.command('import-books')
+@with_appcontext
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(book_io.FORMATS), help='Defaults to the file extension.')
+@click.option('--chunk-size', default=book_io.IMPORT_CHUNK_SIZE, show_default=True)
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), help='Write rejected rows to this CSV file.')
+def import_books_command(path, fmt, chunk_size, errors_path):
+    with open(path, 'rb') as f:
+        report = book_io.import_books(f, fmt or book_io.detect_format(path), chunk_size)
+    print(f'{report.rows} rows: {report.inserted} inserted, {report.updated} updated, {report.failed} failed')
+    if errors_path and report.errors:
+        with open(errors_path, 'w', newline='') as out:
+            book_io.write_error_report(report, out)
+        print(f'Error report written to {errors_path}')
+
+
+@click.command('export-books')
+@with_appcontext
+@click.argument('path', type=click.Path(dir_okay=False))
+@click.option('--kind', type=click.Choice(tuple(book_io.EXPORT_COLUMNS)), default='books', show_default=True)
+@click.option('--format', 'fmt', type=click.Choice(book_io.EXPORT_FORMATS), help='Defaults to the file extension.')
+def export_books_command(path, kind, fmt):
+    with open(path, 'w', newline='') as out:
+        for chunk in book_io.export_rows(kind, fmt or book_io.detect_format(path)):
+            out.write(chunk)
+    print(f'Exported {kind} to {path}')
+
+
+@click.command('order-report')
+@with_appcontext
+@click.argument('path', type=click.Path(dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(book_io.EXPORT_FORMATS), default='csv', show_default=True)
+@click.option('--from', 'start', help='First day (ISO date or datetime).')
+@click.option('--to', 'end', help='Last day, inclusive (ISO date or datetime).')
+@click.option('--status', help='Comma-separated order statuses.')
+@click.option('--payment-status', help='Comma-separated payment statuses.')
+def order_report_command(path, fmt, start, end, status, payment_status):
+    try:
+        filters = reports.parse_filters({'from': start, 'to': end, 'status': status, 'payment_status': payment_status})
+    except reports.ReportError as e:
+        raise click.BadParameter(str(e))
+    with open(path, 'w', newline='') as out:
+        for chunk in reports.order_report(fmt, **filters):
+            out.write(chunk)
+    print(f'Order report written to {path}')
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    count = stats.rebuild_sales()
+    print(f'Sales counters rebuilt for {count} books')
+
+
+@click.command('rebuild-recommendations')
+@with_appcontext
+def rebuild_recommendations_command():
+    rows = recommendations.build()
+    print(f'Recommendations rebuilt ({rows} rows)')
+
+
+@click.command('run-jobs')
+@with_appcontext
+@click.option('--once', is_flag=True, help='Run every job once and exit, e.g. from cron.')
+@click.option('--job', 'names', multiple=True, help='Run only this job once (repeatable).')
+def run_jobs_command(once, names):
+    unknown = set(names) - set(scheduler.jobs)
+    if unknown:
+        raise click.BadParameter(f'unknown job(s): {", ".join(sorted(unknown))}; '
+                                 f'choose from {", ".join(scheduler.jobs)}', param_hint='--job')
+    if once or names:
+        for name in names or list(scheduler.jobs):
+            result = scheduler.run_job(name)
+            print(f'{name}: {"failed" if result is None else f"{result} row(s)"}')
+        return
+    print(f'Running {", ".join(scheduler.jobs)}; Ctrl+C to stop')
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+COMMANDS = [init_db_command, reindex_books_command, send_mail_command, import_books_command,
+            export_books_command, order_report_command, rebuild_stats_command,
+            rebuild_recommendations_command, run_jobs_command]
+
+
+def init_app(app):
+    for command in COMMANDS:
+        app.cli.add_command(command)
@@ -0,0 +1,85 @@
+from collections import namedtuple
+from models import db, User, Book, Order, BookRequest
+
+# Read model for the admin dashboard: summary figures come from SQL aggregates and
+# the listed rows are plain tuples, so rendering never lazy-loads relationships.
+# Only the newest RECENT_ROWS of each list are shown; the full listings are
+# /admin/students, /admin/requests, the exports and the JSON API.
+
+RECENT_ROWS = 10
+
+BookRow = namedtuple('BookRow', 'id title author available_copies')
+StudentRow = namedtuple('StudentRow', 'id name email created_at')
+UserRef = namedtuple('UserRef', 'id name')
+BookRef = namedtuple('BookRef', 'id title')
+# Same attribute shape the template uses on Order (o.user.name, o.book.title)
+OrderRow = namedtuple('OrderRow', 'id quantity status created_at user book')
+
+
+def summary() -> dict:
+    """All dashboard counters in a single round trip."""
+    students = db.session.query(db.func.count(User.id)).filter(User.role == 'student')
+    revenue = (db.session.query(db.func.coalesce(db.func.sum(Order.quantity * Book.price), 0.0))
+               .join(Book, Order.book_id == Book.id)
+               .filter(Order.status != 'canceled'))
+    pending = db.session.query(db.func.count(BookRequest.id)).filter(BookRequest.status == 'pending')
+    row = db.session.query(
+        db.session.query(db.func.count(Book.id)).scalar_subquery().label('books'),
+        db.session.query(db.func.coalesce(db.func.sum(Book.total_copies), 0)).scalar_subquery().label('total_copies'),
+        db.session.query(db.func.coalesce(db.func.sum(Book.available_copies), 0)).scalar_subquery().label('available_copies'),
+        students.scalar_subquery().label('students'),
+        db.session.query(db.func.count(Order.id)).scalar_subquery().label('orders'),
+        revenue.scalar_subquery().label('revenue'),
+        pending.scalar_subquery().label('pending_requests'),
+    ).one()
+    return {
+        'books': row.books,
+        'total_copies': int(row.total_copies),
+        'available_copies': int(row.available_copies),
+        'students': row.students,
+        'orders': row.orders,
+        'revenue': float(row.revenue),
+        'pending_requests': row.pending_requests,
+    }
+
+
+class Recent:
+    """The newest rows of a listing, with the listing's total as its len(): the
+    dashboard template shows its totals as `books|length`, `users|length` and
+    `orders|length`."""
+
+    def __init__(self, items, total):
+        self.items = items
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return self.total
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def recent_books(n=RECENT_ROWS) -> list:
+    rows = (db.session.query(Book.id, Book.title, Book.author, Book.available_copies)
+            .order_by(Book.id.desc()).limit(n))
+    return [BookRow(*r) for r in rows]
+
+
+def recent_students(n=RECENT_ROWS) -> list:
+    rows = (db.session.query(User.id, User.name, User.email, User.created_at)
+            .filter(User.role == 'student').order_by(User.id.desc()).limit(n))
+    return [StudentRow(*r) for r in rows]
+
+
+def recent_orders(n=RECENT_ROWS) -> list:
+    """Most recent orders first, with student name and book title joined in one query."""
+    rows = (db.session.query(Order.id, Order.quantity, Order.status, Order.created_at,
+                             User.id, User.name, Book.id, Book.title)
+            .outerjoin(User, Order.user_id == User.id)
+            .outerjoin(Book, Order.book_id == Book.id)
+            .order_by(Order.created_at.desc(), Order.id.desc()).limit(n))
+    return [OrderRow(oid, qty, status, created, UserRef(uid, uname), BookRef(bid, title))
+            for oid, qty, status, created, uid, uname, bid, title in rows]
@@ -1,6 +1,6 @@
 from app import app
-from models import db
+from commands import setup_database
 
 with app.app_context():
-    db.create_all()
+    setup_database()
     print('Database created successfully')
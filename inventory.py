@@ -0,0 +1,336 @@
+import logging
+import random
+import time
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError, OperationalError
+from models import db, Book, Order, Cart
+import stats
+import page_cache
+
+# All stock movements go through here. Each one is a single conditional UPDATE,
+# so concurrent workers can never take more copies than exist (no read-modify-write
+# in Python), and order status changes are guarded the same way so a stock return
+# cannot be applied twice.
+
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.02
+
+class Conflict(Exception):
+    """A concurrent request changed rows this transaction depends on; it is retried."""
+
+
+# Lock/deadlock errors worth retrying, as reported by SQLite and MySQL
+_RETRIABLE = ('database is locked', 'database table is locked', 'deadlock', 'lock wait timeout')
+
+
+def _expire(model, ident, *attrs):
+    obj = db.session.identity_map.get(db.session.identity_key(model, ident))
+    if obj is not None:
+        db.session.expire(obj, list(attrs) or None)
+
+
+def reserve(book_id, qty) -> bool:
+    """Take `qty` copies of a book; False if there are not enough left."""
+    if qty < 1:
+        return False
+    taken = (Book.query
+             .filter(Book.id == book_id, Book.available_copies >= qty)
+             .update({Book.available_copies: Book.available_copies - qty}, synchronize_session=False))
+    _expire(Book, book_id, 'available_copies')
+    if taken:
+        page_cache.books_changed([book_id])
+    return taken == 1
+
+
+def release(book_id, qty):
+    """Return `qty` copies of a book to stock."""
+    if qty < 1:
+        return
+    (Book.query
+     .filter(Book.id == book_id)
+     .update({Book.available_copies: Book.available_copies + qty}, synchronize_session=False))
+    _expire(Book, book_id, 'available_copies')
+    page_cache.books_changed([book_id])
+
+
+def release_many(quantities):
+    """Batched release() for a {book_id: qty} mapping, as one executemany UPDATE."""
+    quantities = {b: q for b, q in quantities.items() if q > 0}
+    if not quantities:
+        return
+    table = Book.__table__
+    db.session.execute(
+        table.update()
+        .where(table.c.id == db.bindparam('b_id'))
+        .values(available_copies=table.c.available_copies + db.bindparam('qty')),
+        [{'b_id': b, 'qty': q} for b, q in quantities.items()],
+    )
+    for book_id in quantities:
+        _expire(Book, book_id, 'available_copies')
+    page_cache.books_changed(list(quantities))
+
+
+def adjust(book_id, delta) -> bool:
+    """Move stock by `delta` copies held (positive takes, negative returns)."""
+    if delta > 0:
+        return reserve(book_id, delta)
+    release(book_id, -delta)
+    return True
+
+
+def transition_order(order_id, from_statuses, to_status, quantity=None) -> bool:
+    """Change an order's status only if it is still in one of `from_statuses`
+    (and, when given, still for `quantity` copies)."""
+    query = Order.query.filter(Order.id == order_id, Order.status.in_(from_statuses))
+    if quantity is not None:
+        query = query.filter(Order.quantity == quantity)
+    changed = (query
+               .update({Order.status: to_status}, synchronize_session=False))
+    _expire(Order, order_id, 'status')
+    return changed == 1
+
+
+# Statuses an admin may cancel from; canceled and returned orders hold no stock
+CANCELABLE_BY_ADMIN = ('pending', 'approved', 'paid')
+
+
+def approve_order(order_id, due_date) -> bool:
+    """Approve a pending order and start its loan period."""
+    changed = (Order.query
+               .filter(Order.id == order_id, Order.status == 'pending')
+               .update({Order.status: 'approved', Order.due_date: due_date}, synchronize_session=False))
+    _expire(Order, order_id, 'status', 'due_date')
+    return changed == 1
+
+
+Outcome = namedtuple('Outcome', 'id ok reason')
+
+
+def approve_orders(order_ids, due_date):
+    """Batched approve_order(): one SELECT and one UPDATE for all of `order_ids`.
+
+    Returns an Outcome per id, in the given order; ids that are missing or not
+    pending are reported and left alone."""
+    order_ids = list(dict.fromkeys(order_ids))
+    statuses = dict(db.session.query(Order.id, Order.status).filter(Order.id.in_(order_ids)))
+    pending = [i for i in order_ids if statuses.get(i) == 'pending']
+    if pending:
+        changed = (Order.query
+                   .filter(Order.id.in_(pending), Order.status == 'pending')
+                   .update({Order.status: 'approved', Order.due_date: due_date}, synchronize_session=False))
+        if changed != len(pending):
+            raise Conflict('orders changed during approval')
+        for order_id in pending:
+            _expire(Order, order_id, 'status', 'due_date')
+    return outcomes_for(order_ids, statuses, pending)
+
+
+def cancel_orders(order_ids, from_statuses=('pending',)):
+    """Batched cancel_order(): cancel every order of `order_ids` still in one of
+    `from_statuses` and put all their copies back, in the caller's transaction.
+
+    One SELECT, one UPDATE guarded on (id, quantity), one executemany stock return
+    and one sales counter batch, however many orders are selected. Returns an
+    Outcome per id, in the given order."""
+    order_ids = list(dict.fromkeys(order_ids))
+    rows = {i: (status, book_id, quantity) for i, status, book_id, quantity in
+            db.session.query(Order.id, Order.status, Order.book_id, Order.quantity).filter(Order.id.in_(order_ids))}
+    statuses = {i: row[0] for i, row in rows.items()}
+    cancelable = [i for i in order_ids if statuses.get(i) in from_statuses]
+    if cancelable:
+        changed = (Order.query
+                   .filter(tuple_(Order.id, Order.quantity).in_([(i, rows[i][2]) for i in cancelable]),
+                           Order.status.in_(from_statuses))
+                   .update({Order.status: 'canceled'}, synchronize_session=False))
+        if changed != len(cancelable):
+            raise Conflict('orders changed during cancellation')
+        returned = {}
+        for order_id in cancelable:
+            _, book_id, quantity = rows[order_id]
+            _expire(Order, order_id, 'status')
+            if book_id is not None and quantity:
+                returned[book_id] = returned.get(book_id, 0) + quantity
+        release_many(returned)
+        stats.record_sales({b: -q for b, q in returned.items()})
+    return outcomes_for(order_ids, statuses, cancelable)
+
+
+def outcomes_for(ids, statuses, changed):
+    """One Outcome per id: ok if it is in `changed`, else why not, from {id: status}."""
+    changed = set(changed)
+    outcomes = []
+    for ident in ids:
+        status = statuses.get(ident)
+        if ident in changed:
+            outcomes.append(Outcome(ident, True, None))
+        else:
+            outcomes.append(Outcome(ident, False, 'not found' if status is None else f'status is {status}'))
+    return outcomes
+
+
+def place_order(user_id, book_id, qty, status='pending', payment_method=None):
+    """Reserve stock and create the order; None if the book does not have `qty` copies."""
+    if not reserve(book_id, qty):
+        return None
+    order = Order(user_id=user_id, book_id=book_id, quantity=qty, status=status, payment_method=payment_method)
+    db.session.add(order)
+    stats.record_sale(book_id, qty)
+    return order
+
+
+def resize_order(order, new_qty) -> bool:
+    """Change a pending order's quantity, taking or returning the difference in stock.
+
+    Rolls back the session and returns False if stock ran out or the order changed
+    underneath us.
+    """
+    old_qty, book_id = order.quantity, order.book_id
+    if new_qty < 1 or not adjust(book_id, new_qty - old_qty):
+        db.session.rollback()
+        return False
+    changed = (Order.query
+               .filter(Order.id == order.id, Order.status == 'pending', Order.quantity == old_qty)
+               .update({Order.quantity: new_qty}, synchronize_session=False))
+    if changed != 1:
+        db.session.rollback()
+        return False
+    _expire(Order, order.id, 'quantity')
+    stats.record_sale(book_id, new_qty - old_qty)
+    return True
+
+
+def cancel_order(order, from_statuses=('pending',)) -> bool:
+    """Cancel `order` and put its copies back, exactly once."""
+    quantity, book_id = order.quantity, order.book_id
+    if not transition_order(order.id, from_statuses, 'canceled', quantity):
+        return False
+    release(book_id, quantity)
+    stats.record_sale(book_id, -quantity)
+    return True
+
+
+def add_to_cart(user_id, book_id, qty) -> bool:
+    """Hold `qty` copies in the user's cart; False if the book does not have them."""
+    if not reserve(book_id, qty):
+        return False
+    # Adding more copies restarts the line's hold (see expire_cart_lines)
+    updated = (Cart.query
+               .filter_by(user_id=user_id, book_id=book_id)
+               .update({Cart.quantity: Cart.quantity + qty, Cart.added_at: datetime.utcnow()},
+                       synchronize_session=False))
+    if not updated:
+        try:
+            db.session.execute(Cart.__table__.insert().values(user_id=user_id, book_id=book_id, quantity=qty,
+                                                              added_at=datetime.utcnow()))
+        except IntegrityError:
+            # A concurrent request created the line after our UPDATE missed it
+            raise Conflict('cart line created concurrently')
+    return True
+
+
+def remove_cart_item(item) -> bool:
+    """Delete a cart line and return its held copies to stock."""
+    quantity, book_id = item.quantity, item.book_id
+    removed = Cart.query.filter_by(id=item.id).delete(synchronize_session=False)
+    if removed != 1:
+        return False
+    db.session.expunge(item)
+    release(book_id, quantity)
+    return True
+
+
+def expire_cart_lines(cutoff, limit) -> int:
+    """Drop up to `limit` cart lines added before `cutoff` and return their copies to stock.
+
+    The DELETE only matches lines still holding the quantity that was read, so a
+    line checked out, removed or topped up meanwhile raises Conflict instead of
+    releasing the wrong number of copies. Returns the number of lines expired.
+    """
+    rows = (db.session.query(Cart.id, Cart.book_id, Cart.quantity)
+            .filter(Cart.added_at < cutoff)
+            .order_by(Cart.added_at, Cart.id)
+            .limit(limit).all())
+    if not rows:
+        return 0
+    removed = (Cart.query
+               .filter(tuple_(Cart.id, Cart.quantity).in_([(r.id, r.quantity) for r in rows]), Cart.added_at < cutoff)
+               .delete(synchronize_session=False))
+    if removed != len(rows):
+        raise Conflict('cart changed during expiry')
+    held = {}
+    for _, book_id, quantity in rows:
+        held[book_id] = held.get(book_id, 0) + (quantity or 0)
+    release_many(held)
+    return len(rows)
+
+
+CheckoutLine = namedtuple('CheckoutLine', 'cart_id book_id quantity ok reason')
+
+
+def checkout_cart(user_id, payment_method=None, status='pending'):
+    """Turn every line of a user's cart into an order using a fixed number of statements.
+
+    One SELECT validates all lines against `book`, one DELETE removes the cart rows,
+    one executemany INSERT creates the orders and the sales counters are bumped in
+    a single batch. Copies were already taken when the lines were added to the cart,
+    so valid lines need no further stock movement. Returns one CheckoutLine per cart row.
+    """
+    rows = (db.session.query(Cart.id, Cart.book_id, Cart.quantity, Book.id)
+            .outerjoin(Book, Book.id == Cart.book_id)
+            .filter(Cart.user_id == user_id)
+            .order_by(Cart.id).all())
+    if not rows:
+        return []
+    lines = []
+    for cart_id, book_id, quantity, found in rows:
+        if found is None:
+            lines.append(CheckoutLine(cart_id, book_id, quantity, False, 'book no longer available'))
+        elif not quantity or quantity < 1:
+            lines.append(CheckoutLine(cart_id, book_id, quantity, False, 'invalid quantity'))
+        else:
+            lines.append(CheckoutLine(cart_id, book_id, quantity, True, None))
+
+    removed = Cart.query.filter(Cart.id.in_([l.cart_id for l in lines])).delete(synchronize_session=False)
+    if removed != len(lines):
+        # A concurrent checkout or removal got here first; let run_in_transaction retry
+        raise Conflict('cart changed during checkout')
+    db.session.expire_all()
+
+    placed = [l for l in lines if l.ok]
+    if placed:
+        db.session.execute(Order.__table__.insert(), [
+            {'user_id': user_id, 'book_id': l.book_id, 'quantity': l.quantity,
+             'status': status, 'payment_method': payment_method}
+            for l in placed
+        ])
+        sold = {}
+        for l in placed:
+            sold[l.book_id] = sold.get(l.book_id, 0) + l.quantity
+        stats.record_sales(sold)
+    return lines
+
+
+def _retriable(exc) -> bool:
+    if isinstance(exc, Conflict):
+        return True
+    message = str(exc.orig).lower() if getattr(exc, 'orig', None) is not None else str(exc).lower()
+    return any(m in message for m in _RETRIABLE)
+
+
+def run_in_transaction(fn, *args, retries=MAX_RETRIES, **kwargs):
+    """Run `fn` and commit, retrying with backoff on lock contention or a Conflict."""
+    for attempt in range(retries + 1):
+        try:
+            result = fn(*args, **kwargs)
+            db.session.commit()
+            return result
+        except (OperationalError, Conflict) as e:
+            db.session.rollback()
+            if attempt == retries or not _retriable(e):
+                raise
+            delay = RETRY_BACKOFF * (2 ** attempt) * (1 + random.random())
+            reason = getattr(e, 'orig', None) or e
+            logging.warning(f'Inventory write conflict ({reason}), retry {attempt + 1} in {delay:.3f}s')
+            time.sleep(delay)
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import or_
+from models import db, Order
+from scheduler import scheduler
+import inventory
+
+# The scheduled maintenance jobs (see scheduler.py).
+# Each works through its rows in batches of JOB_BATCH_SIZE and commits per batch,
+# so no single transaction holds the write lock for long, and each only touches
+# rows that still need the change, so overlapping runs are harmless.
+
+DEFAULTS = {
+    'JOB_BATCH_SIZE': 500,
+    'CART_HOLD_MINUTES': 30,          # cart lines older than this give their copies back
+    'CART_EXPIRY_INTERVAL': 60,       # seconds between runs
+    'LOAN_DAYS': 14,                  # due date = approval + LOAN_DAYS
+    'DUE_DATE_INTERVAL': 300,
+    'FINE_PER_DAY': 0.5,              # per copy and full day overdue
+    'FINE_MAX_DAYS': 30,              # fines stop growing after this many days
+    'FINE_INTERVAL': 3600,
+}
+
+# Orders whose copies are out on loan
+ON_LOAN = ('approved',)
+
+
+def expire_carts(now) -> int:
+    """Release the copies held by cart lines older than CART_HOLD_MINUTES."""
+    cutoff = now - timedelta(minutes=current_app.config['CART_HOLD_MINUTES'])
+    batch = current_app.config['JOB_BATCH_SIZE']
+    total = 0
+    while True:
+        expired = inventory.run_in_transaction(inventory.expire_cart_lines, cutoff, batch)
+        total += expired
+        if expired < batch:
+            return total
+
+
+def set_due_dates(now) -> int:
+    """Give approved orders without a due date one LOAN_DAYS from now.
+
+    Approval sets it already; this catches orders approved by other paths
+    (older releases, bulk tools, direct SQL)."""
+    due = now + timedelta(days=current_app.config['LOAN_DAYS'])
+    return _in_batches(Order.query.filter(Order.status.in_(ON_LOAN), Order.due_date.is_(None)),
+                       {Order.due_date: due})
+
+
+def assess_fines(now) -> int:
+    """Set Order.fine on overdue loans to FINE_PER_DAY per copy and full day late.
+
+    Orders are grouped by how many whole days late they are: everything in one
+    group gets the same per-copy amount, so each group is a single set-based
+    UPDATE per batch."""
+    rate = current_app.config['FINE_PER_DAY']
+    max_days = current_app.config['FINE_MAX_DAYS']
+    overdue = Order.query.filter(Order.status.in_(ON_LOAN), Order.returned_at.is_(None))
+    oldest = (db.session.query(db.func.min(Order.due_date))
+              .filter(Order.status.in_(ON_LOAN), Order.returned_at.is_(None),
+                      Order.due_date < now - timedelta(days=1))
+              .scalar())
+    if oldest is None:
+        return 0
+    late_days = min(max_days, (now - oldest).days)
+    total = 0
+    for days in range(1, late_days + 1):
+        amount = round(days * rate, 2)
+        query = overdue.filter(Order.due_date < now - timedelta(days=days))
+        if days < max_days:
+            query = query.filter(Order.due_date >= now - timedelta(days=days + 1))
+        query = query.filter(or_(Order.fine.is_(None), Order.fine != Order.quantity * amount))
+        total += _in_batches(query, {Order.fine: Order.quantity * amount})
+    return total
+
+
+def _in_batches(query, values) -> int:
+    """UPDATE the rows matching `query` to `values`, at most JOB_BATCH_SIZE per transaction.
+
+    `query` must stop matching a row once it is updated."""
+    batch = current_app.config['JOB_BATCH_SIZE']
+    total = 0
+    while True:
+        ids = [i for (i,) in query.with_entities(Order.id).order_by(Order.id).limit(batch)]
+        if not ids:
+            return total
+        total += inventory.run_in_transaction(_update, query, ids, values)
+        if len(ids) < batch:
+            return total
+
+
+def _update(query, ids, values):
+    # Re-applying the filter keeps rows changed since the SELECT out of the update
+    return query.filter(Order.id.in_(ids)).update(values, synchronize_session=False)
+
+
+def init_app(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    scheduler.add_job('expire_carts', expire_carts, app.config['CART_EXPIRY_INTERVAL'])
+    scheduler.add_job('set_due_dates', set_due_dates, app.config['DUE_DATE_INTERVAL'])
+    scheduler.add_job('assess_fines', assess_fines, app.config['FINE_INTERVAL'])
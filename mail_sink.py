@@ -0,0 +1,111 @@
+"""Local fake SMTP server that accepts every message and keeps it in memory.
+
+Point the app at it for development and tests instead of a real mail server:
+
+    python mail_sink.py --port 1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=False python app.py
+
+It speaks just enough SMTP for smtplib/Flask-Mail (HELO/EHLO, MAIL, RCPT, DATA,
+RSET, NOOP, QUIT) and can also be started in-process with MailSink().start().
+"""
+import argparse
+import socketserver
+import threading
+from email import message_from_bytes
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        sink = self.server.sink
+        sender, recipients = None, []
+        self._reply('220 localhost mail_sink ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self._reply('250-localhost')
+                self._reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self._reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip().strip('<>'))
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(chunk[1:] if chunk.startswith(b'..') else chunk)
+                sink.deliver(sender, recipients, b''.join(data))
+                sender, recipients = None, []
+                self._reply('250 OK: queued')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self._reply('250 OK')
+            elif verb == 'NOOP':
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class MailSink:
+    def __init__(self, host='127.0.0.1', port=0, verbose=False):
+        self.messages = []
+        self.connections = 0
+        self.verbose = verbose
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.sink = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def deliver(self, sender, recipients, raw):
+        msg = message_from_bytes(raw)
+        with self._lock:
+            self.messages.append({'from': sender, 'to': recipients, 'subject': msg['Subject'], 'message': msg})
+        if self.verbose:
+            print(f"[mail_sink] {sender} -> {', '.join(recipients)}: {msg['Subject']}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fake SMTP sink for local development')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    args = parser.parse_args()
+    sink = MailSink(args.host, args.port, verbose=True)
+    print(f'mail_sink listening on {args.host}:{args.port}')
+    try:
+        sink._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,206 @@
+import logging
+import os
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from models import db, OutboxMessage
+
+# Background mail delivery.
+# Request handlers call enqueue(), which only writes a row to the outbox table.
+# A small pool of sender threads per process claims pending rows in batches, sends
+# them over a reused SMTP connection and reschedules failures with exponential
+# backoff. `flask send-mail` drains the outbox from a separate process instead.
+# Flask-Mail is only imported once there is something to send.
+
+DEFAULTS = {
+    'MAIL_ASYNC': True,
+    'MAIL_WORKERS': 2,
+    'MAIL_BATCH_SIZE': 20,
+    'MAIL_MAX_ATTEMPTS': 5,
+    'MAIL_RETRY_BACKOFF': 30.0,   # seconds, doubled per attempt
+    'MAIL_POLL_INTERVAL': 5.0,    # seconds between outbox polls when idle
+    'MAIL_IDLE_TIMEOUT': 30.0,    # close the SMTP connection after this long without mail
+}
+
+# Rows stuck in 'sending' this long (a worker died mid-batch) are picked up again
+STALE_CLAIM = timedelta(minutes=10)
+
+
+class MailQueue:
+    def __init__(self, app=None, mail=None):
+        self.app = None
+        self._mail = None
+        self._threads = []
+        self._pid = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, mail)
+
+    def init_app(self, app, mail=None):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.app = app
+        self._mail = mail
+        app.extensions['mail_queue'] = self
+
+    @property
+    def mail(self):
+        if self._mail is None:
+            from flask_mail import Mail
+            with self._lock:
+                if self._mail is None:
+                    self._mail = Mail(self.app)
+        return self._mail
+
+    def enqueue(self, subject, recipients, body, commit=True):
+        """Store a message for delivery and return its outbox row."""
+        msg = OutboxMessage(subject=subject, recipients=','.join(recipients), body=body)
+        db.session.add(msg)
+        if commit:
+            db.session.commit()
+        if self.app.config['MAIL_ASYNC']:
+            self.start()
+            self._wake.set()
+        else:
+            self.process_batch()
+        return msg
+
+    # -- worker pool ---------------------------------------------------------
+
+    def start(self):
+        """Start the sender threads once per process (safe to call after a fork)."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'mail-sender-{i}', daemon=True)
+                for i in range(self.app.config['MAIL_WORKERS'])
+            ]
+            for t in self._threads:
+                t.start()
+            self._pid = pid
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self._pid = None
+
+    def _run(self):
+        conn = None
+        idle_since = datetime.utcnow()
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    conn, sent = self._process(conn)
+                except Exception:
+                    logging.exception('Mail sender crashed while processing the outbox')
+                    db.session.rollback()
+                    conn, sent = self._close(conn), 0
+                finally:
+                    db.session.remove()
+                if sent:
+                    idle_since = datetime.utcnow()
+                    continue
+                if conn is not None and datetime.utcnow() - idle_since > timedelta(seconds=self.app.config['MAIL_IDLE_TIMEOUT']):
+                    conn = self._close(conn)
+                self._wake.wait(self.app.config['MAIL_POLL_INTERVAL'])
+                self._wake.clear()
+            self._close(conn)
+
+    # -- delivery ------------------------------------------------------------
+
+    def process_batch(self):
+        """Send one batch on a fresh connection; returns the number of rows handled."""
+        conn, handled = self._process(None)
+        self._close(conn)
+        return handled
+
+    def drain(self):
+        """Send everything currently due; used by `flask send-mail`."""
+        conn, total = None, 0
+        while True:
+            conn, handled = self._process(conn)
+            if not handled:
+                break
+            total += handled
+        self._close(conn)
+        return total
+
+    def _claim(self):
+        now = datetime.utcnow()
+        claimable = (((OutboxMessage.status == 'pending') & (OutboxMessage.next_attempt_at <= now)) |
+                     ((OutboxMessage.status == 'sending') & (OutboxMessage.next_attempt_at <= now - STALE_CLAIM)))
+        due = (db.session.query(OutboxMessage.id)
+               .filter(claimable)
+               .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id)
+               .limit(self.app.config['MAIL_BATCH_SIZE']).all())
+        claimed = []
+        for (msg_id,) in due:
+            # Conditional update so concurrent workers never send the same row twice
+            won = (OutboxMessage.query
+                   .filter(OutboxMessage.id == msg_id, claimable)
+                   .update({OutboxMessage.status: 'sending', OutboxMessage.next_attempt_at: now},
+                           synchronize_session=False))
+            if won:
+                claimed.append(msg_id)
+        db.session.commit()
+        if not claimed:
+            return []
+        return OutboxMessage.query.filter(OutboxMessage.id.in_(claimed)).order_by(OutboxMessage.id).all()
+
+    def _process(self, conn):
+        from flask_mail import Message
+        batch = self._claim()
+        for row in batch:
+            try:
+                if conn is None:
+                    conn = self.mail.connect().__enter__()
+                conn.send(Message(row.subject, recipients=row.recipients.split(','), body=row.body))
+            except Exception as e:
+                # Any error counts against the message (e.g. no sender configured), so a
+                # message that can never be sent backs off and ends up 'failed'
+                # instead of being re-claimed forever
+                conn = self._close(conn)
+                self._failed(row, e)
+            else:
+                row.status = 'sent'
+                row.sent_at = datetime.utcnow()
+                row.attempts += 1
+                row.last_error = None
+            db.session.commit()
+        if batch:
+            logging.info(f'Mail sender processed batch of {len(batch)} message(s)')
+        return conn, len(batch)
+
+    def _failed(self, row, error):
+        row.attempts += 1
+        row.last_error = str(error)[:1000]
+        if row.attempts >= self.app.config['MAIL_MAX_ATTEMPTS']:
+            row.status = 'failed'
+            logging.error(f'Giving up on mail {row.id} to {row.recipients} after {row.attempts} attempts: {error}')
+            return
+        delay = self.app.config['MAIL_RETRY_BACKOFF'] * (2 ** (row.attempts - 1))
+        row.status = 'pending'
+        row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        logging.warning(f'Mail {row.id} failed ({error}), retrying in {delay:.0f}s')
+
+    @staticmethod
+    def _close(conn):
+        if conn is not None:
+            try:
+                conn.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+        return None
+
+
+mail_queue = MailQueue()
@@ -0,0 +1,85 @@
+"""indexes for hot query columns
+
+Adds the indexes behind the student dashboard, admin listings and cart/wishlist
+lookups, and makes (user_id, book_id) unique in cart and wishlist. Duplicate
+cart lines are merged (quantities summed) and duplicate wishlist rows dropped
+before the unique constraints are created. Indexes that already exist (databases
+created by db.create_all() from the current models) are skipped.
+
+Revision ID: 1c1ba48ce79b
+Revises: 9c8584778931
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c1ba48ce79b'
+down_revision = '9c8584778931'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_user_role', 'user', ['role']),
+    ('ix_order_user_created', 'order', ['user_id', 'created_at']),
+    ('ix_order_status_created', 'order', ['status', 'created_at']),
+    ('ix_order_created_at', 'order', ['created_at']),
+    ('ix_order_book_id', 'order', ['book_id']),
+    ('ix_cart_book_id', 'cart', ['book_id']),
+    ('ix_book_request_status_created', 'book_request', ['status', 'created_at']),
+    ('ix_book_request_created_at', 'book_request', ['created_at']),
+    ('ix_wishlist_book_id', 'wishlist', ['book_id']),
+]
+
+UNIQUE = [
+    ('uq_cart_user_book', 'cart', ['user_id', 'book_id']),
+    ('uq_wishlist_user_book', 'wishlist', ['user_id', 'book_id']),
+]
+
+
+def _existing(table):
+    inspector = sa.inspect(op.get_bind())
+    names = {ix['name'] for ix in inspector.get_indexes(table)}
+    names |= {uq['name'] for uq in inspector.get_unique_constraints(table)}
+    return names
+
+
+def _dedupe_cart():
+    op.execute(
+        'UPDATE cart SET quantity = ('
+        '  SELECT SUM(c2.quantity) FROM cart c2'
+        '  WHERE c2.user_id = cart.user_id AND c2.book_id = cart.book_id) '
+        'WHERE id IN (SELECT keep_id FROM ('
+        '  SELECT MIN(id) AS keep_id FROM cart GROUP BY user_id, book_id HAVING COUNT(*) > 1) AS dup)'
+    )
+    op.execute(
+        'DELETE FROM cart WHERE id NOT IN (SELECT keep_id FROM ('
+        '  SELECT MIN(id) AS keep_id FROM cart GROUP BY user_id, book_id) AS keep)'
+    )
+
+
+def _dedupe_wishlist():
+    op.execute('CREATE TABLE wishlist_dedupe AS SELECT DISTINCT user_id, book_id FROM wishlist')
+    op.execute('DELETE FROM wishlist')
+    op.execute('INSERT INTO wishlist (user_id, book_id) SELECT user_id, book_id FROM wishlist_dedupe')
+    op.execute('DROP TABLE wishlist_dedupe')
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in _existing(table):
+            op.create_index(name, table, columns)
+    for name, table, columns in UNIQUE:
+        if name in _existing(table):
+            continue
+        _dedupe_cart() if table == 'cart' else _dedupe_wishlist()
+        # A unique index rather than a constraint so SQLite needs no table rebuild
+        op.create_index(name, table, columns, unique=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(UNIQUE + INDEXES):
+        op.drop_index(name, table_name=table)
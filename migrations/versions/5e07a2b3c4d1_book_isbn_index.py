@@ -0,0 +1,26 @@
+"""index book.isbn for bulk import upserts
+
+Revision ID: 5e07a2b3c4d1
+Revises: 1c1ba48ce79b
+Create Date: 2026-10-17 14:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e07a2b3c4d1'
+down_revision = '1c1ba48ce79b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    names = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('book')}
+    if 'ix_book_isbn' not in names:
+        op.create_index('ix_book_isbn', 'book', ['isbn'])
+
+
+def downgrade():
+    op.drop_index('ix_book_isbn', table_name='book')
@@ -0,0 +1,37 @@
+"""indexes for the scheduled jobs
+
+Adds (status, due_date) on order for the overdue-fines job and added_at on cart
+for expiring stale cart holds. Indexes that already exist are skipped.
+
+Revision ID: 7f3d9e1a2b6c
+Revises: 5e07a2b3c4d1
+Create Date: 2026-10-17 16:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f3d9e1a2b6c'
+down_revision = '5e07a2b3c4d1'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_order_status_due', 'order', ['status', 'due_date']),
+    ('ix_cart_added_at', 'cart', ['added_at']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns in INDEXES:
+        if name not in {ix['name'] for ix in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,137 @@
+"""initial schema
+
+Tables as created by db.create_all() before migrations were introduced. Each
+table is only created if it is missing, so existing databases can simply run
+`flask db upgrade`.
+
+Revision ID: 9c8584778931
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c8584778931'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _missing(table):
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade():
+    if _missing('user'):
+        op.create_table('user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=120), nullable=False),
+            sa.Column('email', sa.String(length=200), nullable=False),
+            sa.Column('recovery_email', sa.String(length=200), nullable=True),
+            sa.Column('password_hash', sa.String(length=200), nullable=False),
+            sa.Column('role', sa.String(length=30), nullable=True),
+            sa.Column('profile_pic', sa.String(length=200), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('email'),
+        )
+    if _missing('book'):
+        op.create_table('book',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=250), nullable=False),
+            sa.Column('author', sa.String(length=150), nullable=False),
+            sa.Column('genre', sa.String(length=80), nullable=True),
+            sa.Column('isbn', sa.String(length=80), nullable=True),
+            sa.Column('price', sa.Float(), nullable=True),
+            sa.Column('total_copies', sa.Integer(), nullable=True),
+            sa.Column('available_copies', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if _missing('order'):
+        op.create_table('order',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('book_id', sa.Integer(), nullable=True),
+            sa.Column('quantity', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=30), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('due_date', sa.DateTime(), nullable=True),
+            sa.Column('returned_at', sa.DateTime(), nullable=True),
+            sa.Column('fine', sa.Float(), nullable=True),
+            sa.Column('payment_method', sa.String(length=50), nullable=True),
+            sa.Column('payment_id', sa.String(length=255), nullable=True),
+            sa.Column('payment_status', sa.String(length=30), nullable=True),
+            sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if _missing('cart'):
+        op.create_table('cart',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('book_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=True),
+            sa.Column('added_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if _missing('book_request'):
+        op.create_table('book_request',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=250), nullable=False),
+            sa.Column('author', sa.String(length=150), nullable=False),
+            sa.Column('genre', sa.String(length=80), nullable=True),
+            sa.Column('reason', sa.Text(), nullable=True),
+            sa.Column('status', sa.String(length=30), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    if _missing('wishlist'):
+        op.create_table('wishlist',
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.Column('book_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        )
+    if _missing('book_sales'):
+        op.create_table('book_sales',
+            sa.Column('book_id', sa.Integer(), nullable=False),
+            sa.Column('quantity_sold', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['book_id'], ['book.id']),
+            sa.PrimaryKeyConstraint('book_id'),
+        )
+        op.create_index('ix_book_sales_quantity_sold', 'book_sales', ['quantity_sold'])
+    if _missing('outbox_message'):
+        op.create_table('outbox_message',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('recipients', sa.Text(), nullable=False),
+            sa.Column('subject', sa.String(length=255), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=True),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_outbox_message_status', 'outbox_message', ['status'])
+        op.create_index('ix_outbox_message_next_attempt_at', 'outbox_message', ['next_attempt_at'])
+
+
+def downgrade():
+    op.drop_table('outbox_message')
+    op.drop_table('book_sales')
+    op.drop_table('wishlist')
+    op.drop_table('book_request')
+    op.drop_table('cart')
+    op.drop_table('order')
+    op.drop_table('book')
+    op.drop_table('user')
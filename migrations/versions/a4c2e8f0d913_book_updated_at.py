@@ -0,0 +1,30 @@
+"""book.updated_at for conditional GETs in the JSON API
+
+Existing rows start from their created_at.
+
+Revision ID: a4c2e8f0d913
+Revises: 7f3d9e1a2b6c
+Create Date: 2026-10-17 18:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c2e8f0d913'
+down_revision = '7f3d9e1a2b6c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('book')}
+    if 'updated_at' not in columns:
+        op.add_column('book', sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute('UPDATE book SET updated_at = created_at')
+
+
+def downgrade():
+    with op.batch_alter_table('book') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,68 @@
+"""precomputed recommendation tables
+
+Adds the stored baskets, per-book "also ordered" and per-student lists, and the
+refresh watermark used by recommendations.py. Tables that already exist
+(databases created by db.create_all() from the current models) are skipped. They
+start empty; the first refresh_recommendations run (or
+`flask rebuild-recommendations`) fills them.
+
+Revision ID: b7d1e5c3a620
+Revises: a4c2e8f0d913
+Create Date: 2026-10-17 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d1e5c3a620'
+down_revision = 'a4c2e8f0d913'
+branch_labels = None
+depends_on = None
+
+
+def _missing(table):
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade():
+    if _missing('recommendation_basket'):
+        op.create_table('recommendation_basket',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('book_id', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('user_id', 'book_id'),
+        )
+        op.create_index('ix_recommendation_basket_book_user', 'recommendation_basket', ['book_id', 'user_id'])
+    if _missing('book_recommendation'):
+        op.create_table('book_recommendation',
+            sa.Column('book_id', sa.Integer(), nullable=False),
+            sa.Column('rank', sa.Integer(), nullable=False),
+            sa.Column('other_id', sa.Integer(), nullable=False),
+            sa.Column('score', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('book_id', 'rank'),
+        )
+    if _missing('student_recommendation'):
+        op.create_table('student_recommendation',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('rank', sa.Integer(), nullable=False),
+            sa.Column('book_id', sa.Integer(), nullable=False),
+            sa.Column('score', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('user_id', 'rank'),
+        )
+    if _missing('recommendation_state'):
+        op.create_table('recommendation_state',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('last_order_id', sa.Integer(), nullable=False),
+            sa.Column('built_at', sa.DateTime(), nullable=True),
+            sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade():
+    op.drop_table('recommendation_state')
+    op.drop_table('student_recommendation')
+    op.drop_table('book_recommendation')
+    op.drop_index('ix_recommendation_basket_book_user', table_name='recommendation_basket')
+    op.drop_table('recommendation_basket')
@@ -1,13 +1,26 @@
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
 import bcrypt
+from replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# bcrypt work factor used when the app does not set BCRYPT_LOG_ROUNDS
+BCRYPT_LOG_ROUNDS = 12
+
+
+def bcrypt_rounds() -> int:
+    if has_app_context():
+        return current_app.config.get('BCRYPT_LOG_ROUNDS', BCRYPT_LOG_ROUNDS)
+    return BCRYPT_LOG_ROUNDS
 
 wishlist_table = db.Table('wishlist',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('book_id', db.Integer, db.ForeignKey('book.id'))
+    db.Column('book_id', db.Integer, db.ForeignKey('book.id')),
+    db.Index('uq_wishlist_user_book', 'user_id', 'book_id', unique=True),
+    db.Index('ix_wishlist_book_id', 'book_id'),
 )
 
 class User(db.Model, UserMixin):
@@ -17,7 +30,7 @@ class User(db.Model, UserMixin):
     email = db.Column(db.String(200), unique=True, nullable=False)
     recovery_email = db.Column(db.String(200), nullable=True)
     password_hash = db.Column(db.String(200), nullable=False)
-    role = db.Column(db.String(30), default='student')
+    role = db.Column(db.String(30), default='student', index=True)
     profile_pic = db.Column(db.String(200), default='default.png')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -27,7 +40,7 @@ class User(db.Model, UserMixin):
     def set_password(self, password: str):
         if isinstance(password, str):
             password = password.encode('utf-8')
-        self.password_hash = bcrypt.hashpw(password, bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = bcrypt.hashpw(password, bcrypt.gensalt(rounds=bcrypt_rounds())).decode('utf-8')
 
     def check_password(self, password: str) -> bool:
         if isinstance(password, str):
@@ -37,17 +50,25 @@ class User(db.Model, UserMixin):
         except Exception:
             return False
 
+    def needs_rehash(self) -> bool:
+        # bcrypt hashes look like $2b$<cost>$<salt+hash>
+        try:
+            return int(self.password_hash.split('$')[2]) != bcrypt_rounds()
+        except (AttributeError, IndexError, ValueError):
+            return True
+
 class Book(db.Model):
     __tablename__ = 'book'
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(250), nullable=False)
     author = db.Column(db.String(150), nullable=False)
     genre = db.Column(db.String(80), default='General')
-    isbn = db.Column(db.String(80), nullable=True)
+    isbn = db.Column(db.String(80), nullable=True, index=True)  # bulk import upserts on it
     price = db.Column(db.Float, default=0.0)
     total_copies = db.Column(db.Integer, default=0)
     available_copies = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Last-Modified in the API
 
     orders = db.relationship('Order', back_populates='book')
     wishlisted_by = db.relationship('User', secondary=wishlist_table, back_populates='wishlist')
@@ -70,6 +91,14 @@ class Order(db.Model):
     user = db.relationship('User', back_populates='orders')
     book = db.relationship('Book', back_populates='orders')
 
+    __table_args__ = (
+        db.Index('ix_order_user_created', 'user_id', 'created_at'),   # student dashboard
+        db.Index('ix_order_status_created', 'status', 'created_at'),  # admin queues
+        db.Index('ix_order_status_due', 'status', 'due_date'),        # overdue fines
+        db.Index('ix_order_created_at', 'created_at'),                # recent orders listing
+        db.Index('ix_order_book_id', 'book_id'),
+    )
+
 class Cart(db.Model):
     __tablename__ = 'cart'
     id = db.Column(db.Integer, primary_key=True)
@@ -81,6 +110,12 @@ class Cart(db.Model):
     user = db.relationship('User', backref='cart_items')
     book = db.relationship('Book', backref='cart_items')
 
+    __table_args__ = (
+        db.Index('uq_cart_user_book', 'user_id', 'book_id', unique=True),
+        db.Index('ix_cart_book_id', 'book_id'),
+        db.Index('ix_cart_added_at', 'added_at'),                     # expired holds
+    )
+
 class BookRequest(db.Model):
     __tablename__ = 'book_request'
     id = db.Column(db.Integer, primary_key=True)
@@ -93,3 +128,67 @@ class BookRequest(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship('User', backref='book_requests')
+
+    __table_args__ = (
+        db.Index('ix_book_request_status_created', 'status', 'created_at'),
+        db.Index('ix_book_request_created_at', 'created_at'),
+    )
+
+class BookSales(db.Model):
+    # Running total of copies ordered per book (canceled orders excluded), maintained
+    # by stats.record_sale so the top-sellers chart never aggregates the order table.
+    __tablename__ = 'book_sales'
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'), primary_key=True)
+    quantity_sold = db.Column(db.Integer, default=0, nullable=False, index=True)
+
+class OutboxMessage(db.Model):
+    # Outgoing mail waiting for the background sender (see mailer.py)
+    __tablename__ = 'outbox_message'
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # comma separated
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+# Recommendation tables (see recommendations.py). They hold derived data only, so
+# they have no foreign keys: deleting a book or student never trips on them, and
+# readers join with book to skip rows for deleted books.
+
+class RecommendationBasket(db.Model):
+    # The books each student ordered (not canceled) or wishlisted, as of the last refresh
+    __tablename__ = 'recommendation_basket'
+    user_id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_recommendation_basket_book_user', 'book_id', 'user_id'),
+    )
+
+class BookRecommendation(db.Model):
+    # "Also ordered": each book's nearest neighbours, rank 0 first
+    __tablename__ = 'book_recommendation'
+    book_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    other_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class StudentRecommendation(db.Model):
+    # "Recommended for you", rank 0 first
+    __tablename__ = 'student_recommendation'
+    user_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+class RecommendationState(db.Model):
+    # Single row (id 1): the newest order the recommendation tables have seen
+    __tablename__ = 'recommendation_state'
+    id = db.Column(db.Integer, primary_key=True)
+    last_order_id = db.Column(db.Integer, default=0, nullable=False)
+    built_at = db.Column(db.DateTime, nullable=True)
+    refreshed_at = db.Column(db.DateTime, nullable=True)
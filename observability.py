@@ -0,0 +1,344 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Logging and metrics.
+#
+# Log records are put on an in-memory queue by a QueueHandler and written to a
+# rotating file by a QueueListener thread, so request threads never wait on disk.
+# Records are JSON lines carrying the request id, endpoint and user of the request
+# that produced them. Every request also gets one access record.
+#
+# Per endpoint, request latency and the number of SQL statements issued are kept
+# as histograms; statements slower than SLOW_QUERY_MS are logged. render_metrics()
+# exposes everything, plus registered cache counters, in the Prometheus text
+# format. Metrics are per process: with several gunicorn workers each scrape sees
+# one worker.
+
+DEFAULTS = {
+    'LOG_FILE': 'actions_web.log',
+    'LOG_LEVEL': 'INFO',
+    'LOG_FORMAT': 'json',            # json or text
+    'LOG_MAX_BYTES': 10 * 1024 * 1024,
+    'LOG_BACKUP_COUNT': 5,
+    'ACCESS_LOG': True,
+    'SLOW_QUERY_MS': 200.0,
+    'METRICS_TOKEN': None,           # when set, /metrics requires "Authorization: Bearer <token>"
+    'METRICS_PUBLIC': False,         # without a token, /metrics only answers local requests unless this is set
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+# Extra record attributes copied into JSON log lines
+_CONTEXT_FIELDS = ('request_id', 'user_id', 'method', 'path', 'endpoint', 'status',
+                   'duration_ms', 'db_queries', 'statement')
+
+
+# -- metrics ------------------------------------------------------------------
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-2])}')
+            lines.append(f'{self.name}_count{labels} {series[-1]}')
+        return lines
+
+
+# stats() keys that only ever grow; the rest (size, hit_rate, ...) are gauges
+_CACHE_COUNTERS = {'hits', 'misses', 'sets', 'invalidated'}
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._caches = {}
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def register_cache(self, name, stats_fn):
+        """Export a cache's stats() dict (hits, misses, ...) as cache_* metrics labelled cache=name."""
+        self._caches[name] = stats_fn
+
+    def _render_caches(self):
+        stats = {name: fn() for name, fn in sorted(self._caches.items())}
+        keys = sorted({k for s in stats.values() for k in s})
+        lines = []
+        for key in keys:
+            counter = key in _CACHE_COUNTERS
+            name = f'cache_{key}_total' if counter else f'cache_{key}'
+            lines.append(f'# HELP {name} Cache {key.replace("_", " ")} per cache.')
+            lines.append(f'# TYPE {name} {"counter" if counter else "gauge"}')
+            for cache, s in stats.items():
+                if key in s:
+                    lines.append(f'{name}{_format_labels(("cache",), (cache,))} {_format_value(s[key])}')
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        lines.extend(self._render_caches())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint.', ('endpoint', 'method', 'status'))
+REQUEST_QUERIES = registry.histogram(
+    'http_request_db_queries', 'SQL statements issued per request.', ('endpoint',), QUERY_COUNT_BUCKETS)
+QUERY_LATENCY = registry.histogram(
+    'db_query_duration_seconds', 'SQL statement execution time.', (), LATENCY_BUCKETS)
+SLOW_QUERIES = registry.counter(
+    'db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS.', ('endpoint',))
+LOG_DROPPED = registry.counter(
+    'log_records_dropped_total', 'Log records dropped because the log queue was full.')
+
+
+def render_metrics() -> str:
+    return registry.render()
+
+
+# -- logging ------------------------------------------------------------------
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in _CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records with the request that produced them (runs on the request thread)."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = getattr(record, 'request_id', None) or g.get('request_id')
+            user = g.get('_login_user')
+            if user is not None and getattr(user, 'is_authenticated', False):
+                record.user_id = user.id
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+_listener = None
+
+
+def configure_logging(app):
+    """Route the root logger through a queue to a rotating file."""
+    global _listener
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    if _listener is not None:
+        _listener.stop()
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        app.config['LOG_FILE'], maxBytes=app.config['LOG_MAX_BYTES'],
+        backupCount=app.config['LOG_BACKUP_COUNT'], encoding='utf-8')
+    if app.config['LOG_FORMAT'] == 'json':
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.Queue(maxsize=10000)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(app.config['LOG_LEVEL'])
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+
+
+@atexit.register
+def _stop_listener():
+    # Registered once for whichever listener is current, so reconfiguring never
+    # leaves an exit hook behind on a listener that was already stopped
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def flush_logs():
+    """Write out everything queued so far (the listener restarts afterwards)."""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+# -- request and query hooks --------------------------------------------------
+
+# The start time lives on the statement's execution context, so a statement that
+# fails (and never reaches after_cursor_execute) leaves nothing behind
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, 'query_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    QUERY_LATENCY.observe(elapsed)
+    endpoint = None
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        endpoint = request.endpoint
+    if elapsed * 1000 >= _slow_query_ms:
+        SLOW_QUERIES.inc(endpoint=endpoint or 'none')
+        # The statement only: parameters can hold password hashes and tokens
+        logging.warning(f'Slow query ({elapsed * 1000:.1f} ms)',
+                        extra={'statement': ' '.join(statement.split())[:1000], 'duration_ms': round(elapsed * 1000, 1)})
+
+
+_slow_query_ms = DEFAULTS['SLOW_QUERY_MS']
+_events_installed = False
+
+
+def init_app(app):
+    global _slow_query_ms, _events_installed
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    _slow_query_ms = app.config['SLOW_QUERY_MS']
+    if not _events_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _events_installed = True
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.db_queries = 0
+
+    @app.after_request
+    def _tag_response(response):
+        g.response_status = response.status_code
+        response.headers.setdefault('X-Request-ID', g.get('request_id', ''))
+        return response
+
+    @app.teardown_request
+    def _record_request(exc):
+        started = g.pop('request_started', None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        # Unmatched URLs are grouped so they cannot blow up the label set
+        endpoint = request.endpoint or 'unmatched'
+        status = g.get('response_status', 500)
+        queries = g.get('db_queries', 0)
+        REQUEST_LATENCY.observe(duration, endpoint=endpoint, method=request.method, status=str(status))
+        REQUEST_QUERIES.observe(queries, endpoint=endpoint)
+        if app.config['ACCESS_LOG']:
+            logging.getLogger('access').info(
+                f'{request.method} {request.path} {status}',
+                extra={'method': request.method, 'path': request.path, 'endpoint': endpoint, 'status': status,
+                       'duration_ms': round(duration * 1000, 2), 'db_queries': queries})
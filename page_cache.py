@@ -0,0 +1,388 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+import uuid
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+from cache import TTLCache
+from models import db, Book
+from replica import RoutingSession
+
+# Server-side fragment cache for the catalog.
+#
+# The book grid of a catalog page is the same for every student, so it is rendered
+# once per (query, page) and stored in a pluggable backend. The surrounding page
+# (navbar, flashed messages and any per-user bits) is still rendered per request
+# around the cached fragment.
+#
+# Invalidation is tag based: each fragment records a version token for every tag it
+# depends on (one per book shown, plus 'catalog:search' for search results and
+# 'catalog:tail' for the last page of the listing). Changing a book replaces the
+# token of its tag after the transaction commits, so only fragments that show that
+# book are invalidated. New books and text edits also bump the search/tail tags.
+# Tokens are read before the rows they cover (the search/tail tags before the page
+# query, the book tags before the page's rows are read again by id), so a change
+# that commits while a fragment is being rendered always leaves it invalid.
+
+DEFAULTS = {
+    'CATALOG_CACHE_BACKEND': 'auto',     # auto, memory, filesystem, redis or none
+    'WEB_CONCURRENCY': 1,                # web workers per host (gunicorn reads the same variable)
+    'CATALOG_CACHE_TTL': 300,
+    'CATALOG_CACHE_SIZE': 2048,
+    'CATALOG_CACHE_DIR': None,
+    'CATALOG_CACHE_URL': None,
+}
+
+# Tags outlive the fragments that reference them; a missing tag just means a miss
+TAG_TTL = 24 * 3600
+
+SEARCH_TAG = 'catalog:search'
+TAIL_TAG = 'catalog:tail'
+
+_PENDING = 'page_cache.changed_tags'
+
+
+def book_tag(book_id):
+    return f'book:{book_id}'
+
+
+# -- backends -----------------------------------------------------------------
+
+class MemoryBackend:
+    """Per-process LRU."""
+
+    def __init__(self, maxsize=2048):
+        self._data = TTLCache(maxsize=maxsize)
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def get_many(self, keys):
+        return [self._data.get(k) for k in keys]
+
+    def set(self, key, value, ttl):
+        self._data.set(key, value, ttl=ttl)
+
+    def clear(self):
+        self._data.clear()
+
+
+_TMP_PREFIX = '.tmp'
+
+
+class FileSystemBackend:
+    """One pickle file per key; shared by all workers on a host.
+
+    Each file's mtime is its expiry time. Every so many writes, expired files are
+    deleted and then the soonest to expire until at most `maxsize` remain.
+    """
+
+    def __init__(self, directory, maxsize=2048):
+        self.directory = directory
+        self.maxsize = maxsize
+        self._sweep_every = max(1, maxsize // 8)
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return value if expires > time.time() else None
+
+    def get_many(self, keys):
+        return [self.get(k) for k in keys]
+
+    def set(self, key, value, ttl):
+        # Write to a temp file and rename so readers never see a partial entry
+        expires = time.time() + ttl
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=_TMP_PREFIX)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.utime(tmp, (expires, expires))
+        os.replace(tmp, self._path(key))
+        self._writes += 1
+        if self._writes % self._sweep_every == 0:
+            self.sweep()
+
+    def sweep(self):
+        """Delete expired entries, then the soonest to expire beyond `maxsize`."""
+        now = time.time()
+        live = []
+        for entry in os.scandir(self.directory):
+            try:
+                expires = entry.stat().st_mtime
+                if entry.name.startswith(_TMP_PREFIX):
+                    # Still being written, or left behind by a worker that died mid-write
+                    if expires < now - 60:
+                        os.remove(entry.path)
+                elif expires <= now:
+                    os.remove(entry.path)
+                else:
+                    live.append((expires, entry.path))
+            except FileNotFoundError:
+                pass  # another worker removed it first
+        if len(live) > self.maxsize:
+            live.sort()
+            for _, path in live[:len(live) - self.maxsize]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
+
+
+class RedisBackend:
+    """Any client with redis-py's get/mget/set(ex=)/flushdb API, e.g. redis.Redis or FakeRedis."""
+
+    def __init__(self, client, prefix='bookstore:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [pickle.loads(r) if r is not None else None for r in self.client.mget([self.prefix + k for k in keys])]
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=int(ttl))
+
+    def clear(self):
+        self.client.flushdb()
+
+
+class FakeRedis:
+    """In-memory stand-in for redis.Redis covering what RedisBackend uses."""
+
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key):
+        value, expires = self._data.get(key, (None, 0))
+        return value if expires > time.time() else None
+
+    def mget(self, keys):
+        return [self.get(k) for k in keys]
+
+    def set(self, key, value, ex=None):
+        self._data[key] = (value, time.time() + (ex if ex is not None else 10 ** 9))
+
+    def flushdb(self):
+        self._data.clear()
+
+
+# -- fragment cache -----------------------------------------------------------
+
+class FragmentCache:
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.sets = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        entry = self.backend.get('frag:' + key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, tags = entry
+        current = self.backend.get_many(['tag:' + t for t in tags])
+        if any(token is None or token != tags[t] for t, token in zip(tags, current)):
+            self.invalidated += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def versions(self, tags) -> dict:
+        """The current token of each tag, creating missing ones.
+
+        Read them before querying the data a fragment shows and pass them to set():
+        a change committed after this replaces a token, so the fragment is never served.
+        """
+        if not self.enabled:
+            return {}
+        tags = list(dict.fromkeys(tags))
+        tokens = self.backend.get_many(['tag:' + t for t in tags])
+        versions = {}
+        for tag, token in zip(tags, tokens):
+            if token is None:
+                token = self._new_token()
+                self.backend.set('tag:' + tag, token, TAG_TTL)
+            versions[tag] = token
+        return versions
+
+    def set(self, key, value, versions):
+        """Store `value` under the tag `versions` read before its data was queried."""
+        if not self.enabled:
+            return
+        self.backend.set('frag:' + key, (value, dict(versions)), self.ttl)
+        self.sets += 1
+
+    def invalidate_tags(self, tags):
+        if not self.enabled:
+            return
+        for tag in tags:
+            self.backend.set('tag:' + tag, self._new_token(), TAG_TTL)
+
+    def clear(self):
+        if self.enabled:
+            self.backend.clear()
+
+    @staticmethod
+    def _new_token():
+        return uuid.uuid4().hex
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidated': self.invalidated,
+            'sets': self.sets,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+catalog_cache = FragmentCache()
+
+
+def _make_backend(app):
+    kind = (app.config['CATALOG_CACHE_BACKEND'] or 'none').lower()
+    workers = app.config['WEB_CONCURRENCY']
+    if kind == 'auto':
+        # A per-process cache would miss invalidations made by the other workers
+        kind = 'memory' if workers <= 1 else 'filesystem'
+    if kind == 'memory':
+        if workers > 1:
+            raise ValueError(f"CATALOG_CACHE_BACKEND='memory' is per process and would serve stale pages "
+                             f"with WEB_CONCURRENCY={workers}; use filesystem or redis")
+        return MemoryBackend(app.config['CATALOG_CACHE_SIZE'])
+    if kind == 'filesystem':
+        directory = app.config['CATALOG_CACHE_DIR'] or os.path.join(app.instance_path, 'catalog_cache')
+        return FileSystemBackend(directory, app.config['CATALOG_CACHE_SIZE'])
+    if kind == 'redis':
+        url = app.config['CATALOG_CACHE_URL']
+        if not url or url == 'fake':
+            return RedisBackend(FakeRedis())
+        import redis  # optional dependency, only needed for this backend
+        return RedisBackend(redis.Redis.from_url(url))
+    return None
+
+
+def init_app(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    catalog_cache.backend = _make_backend(app)
+    catalog_cache.ttl = app.config['CATALOG_CACHE_TTL']
+
+
+# -- rendering ----------------------------------------------------------------
+
+_shells = {}
+
+
+def render_block(template_name, block, **context):
+    """Render only `block` of a template, e.g. the user-independent content of a page."""
+    env = current_app.jinja_env
+    template = env.get_template(template_name)
+    current_app.update_template_context(context)
+    return ''.join(template.blocks[block](template.new_context(context)))
+
+
+def render_with_block(template_name, block, html, **context):
+    """Render a template with `block` replaced by already-rendered `html`."""
+    shell = _shells.get((template_name, block))
+    if shell is None:
+        shell = current_app.jinja_env.from_string(
+            f"{{% extends {template_name!r} %}}{{% block {block} %}}{{{{ cached_block|safe }}}}{{% endblock %}}"
+        )
+        _shells[(template_name, block)] = shell
+    current_app.update_template_context(context)
+    return shell.render(cached_block=html, **context)
+
+
+def listing_tags(searching):
+    """The tags a catalog page may depend on besides its books, known before the query."""
+    return [SEARCH_TAG] if searching else [TAIL_TAG]
+
+
+def book_tags(page):
+    return [book_tag(getattr(b, 'id', b)) for b in page]
+
+
+def catalog_tags(page, searching):
+    tags = book_tags(page)
+    if searching:
+        tags.append(SEARCH_TAG)
+    elif not page.has_next:
+        tags.append(TAIL_TAG)
+    return tags
+
+
+# -- invalidation -------------------------------------------------------------
+
+def tags_changed(tags, session=None):
+    """Replace the tokens of these tags once the current transaction commits."""
+    session = session if session is not None else db.session()
+    session.info.setdefault(_PENDING, set()).update(tags)
+
+
+def books_changed(book_ids, session=None, *extra_tags):
+    """Invalidate fragments showing these books once the current transaction commits."""
+    tags_changed([book_tag(b) for b in book_ids] + list(extra_tags), session)
+
+
+_TEXT_FIELDS = ('title', 'author', 'genre')
+
+
+@event.listens_for(Book, 'after_insert')
+def _book_inserted(mapper, connection, book):
+    books_changed([book.id], object_session(book), SEARCH_TAG, TAIL_TAG)
+
+
+@event.listens_for(Book, 'after_update')
+def _book_updated(mapper, connection, book):
+    state = inspect(book)
+    text_changed = any(state.attrs[f].history.has_changes() for f in _TEXT_FIELDS)
+    books_changed([book.id], object_session(book), *([SEARCH_TAG] if text_changed else []))
+
+
+@event.listens_for(Book, 'after_delete')
+def _book_deleted(mapper, connection, book):
+    books_changed([book.id], object_session(book), SEARCH_TAG)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    tags = session.info.pop(_PENDING, None)
+    if tags:
+        catalog_cache.invalidate_tags(tags)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,131 @@
+import base64
+import json
+from datetime import datetime
+from flask import current_app, request, url_for
+from sqlalchemy import and_, or_
+
+# Keyset ("seek") pagination shared by the catalog and admin listings.
+# Each page is fetched with `WHERE (keys) > (last seen keys) ORDER BY keys LIMIT n`,
+# so the cost of a page does not depend on how deep into the listing it is.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class Page:
+    def __init__(self, items, next_token, page_size):
+        self.items = items
+        self.next_token = next_token
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_token is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_token(values) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_token(token: str):
+    """Return the key values stored in `token`, or None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(values, list):
+        return None
+    try:
+        return [_decode_value(v) for v in values]
+    except ValueError:
+        return None
+
+
+def page_size_arg(name='per_page') -> int:
+    default = current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    limit = current_app.config.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+    size = request.args.get(name, default, type=int)
+    return max(1, min(size, limit))
+
+
+def add_next_links(response, tokens):
+    """Add a `Link: <url>; rel="next"` header for each {param: next_token} with a next page."""
+    links = []
+    for param, token in tokens.items():
+        if token is None:
+            continue
+        args = dict(request.args.to_dict(), **{param: token})
+        link = f'<{url_for(request.endpoint, **(request.view_args or {}), **args)}>; rel="next"'
+        links.append(link + (f'; title="{param}"' if len(tokens) > 1 else ''))
+    if links:
+        response.headers['Link'] = ', '.join(links)
+    return response
+
+
+def _seek_condition(keys, values):
+    # (k1, k2, ...) "after" (v1, v2, ...) honouring each key's direction:
+    # k1 > v1 OR (k1 = v1 AND k2 > v2) OR ...
+    clauses = []
+    for i, (expr, descending) in enumerate(keys):
+        equal_prefix = [keys[j][0] == values[j] for j in range(i)]
+        step = expr < values[i] if descending else expr > values[i]
+        clauses.append(and_(*equal_prefix, step))
+    return or_(*clauses)
+
+
+def keyset_page(query, keys, token=None, page_size=None):
+    """Fetch one page of `query` ordered by `keys`, a list of (expression, descending).
+
+    The last key must be unique (normally the primary key) so that pages never
+    overlap or skip rows. Queries over several columns/entities yield tuples.
+    """
+    q, width, page_size = _page_query(query, keys, token, page_size)
+    return _to_page(q.all(), width, page_size)
+
+
+async def keyset_page_async(session, query, keys, token=None, page_size=None):
+    """keyset_page() run on an AsyncSession (ASGI mode); `query` is only used to build the SELECT."""
+    q, width, page_size = _page_query(query, keys, token, page_size)
+    return _to_page((await session.execute(q.statement)).all(), width, page_size)
+
+
+def _page_query(query, keys, token, page_size):
+    page_size = page_size or DEFAULT_PAGE_SIZE
+    width = len(query.column_descriptions)
+    exprs = [expr for expr, _ in keys]
+    q = query.order_by(None).order_by(*[e.desc() if d else e.asc() for e, d in keys])
+    values = decode_token(token)
+    if values is not None and len(values) == len(keys):
+        q = q.filter(_seek_condition(keys, values))
+    return q.add_columns(*exprs).limit(page_size + 1), width, page_size
+
+
+def _to_page(rows, width, page_size):
+    next_token = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_token = encode_token(list(rows[-1][width:]))
+    items = [row[0] if width == 1 else tuple(row[:width]) for row in rows]
+    return Page(items, next_token, page_size)
@@ -0,0 +1,274 @@
+import heapq
+import logging
+import math
+from collections import Counter, defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import exists, tuple_
+from sqlalchemy.exc import IntegrityError
+from models import (db, Book, Order, BookSales, wishlist_table, RecommendationBasket, BookRecommendation,
+                    StudentRecommendation, RecommendationState)
+from scheduler import scheduler
+import inventory
+
+# "Also ordered" and "recommended for you" lists, precomputed so pages only read them.
+#
+# A student's basket is every book they ordered (canceled orders excluded) or
+# wishlisted, kept in recommendation_basket. Two books co-occur once for each
+# basket holding both; a book's neighbours are ranked by cosine similarity
+# (co-occurrences / sqrt(baskets with a * baskets with b)), counted in memory from
+# the sparse baskets one batch of books at a time, and its best RECS_PER_BOOK are
+# stored in book_recommendation. A student's list sums the neighbour scores of the books in
+# their basket, skipping books already in it. Serving either list is one primary
+# key range read; students without a list get the best sellers.
+#
+# build() (`flask rebuild-recommendations`) recomputes everything. The
+# refresh_recommendations job is incremental: it re-reads the baskets of students
+# with orders placed since its last run and recomputes only the books in baskets
+# that changed, from the baskets holding those books, and those students' lists.
+# Other wishlist edits and cancellations are picked up by the next build or by that
+# student's next order, and so is the small drift in other books' scores as basket
+# counts change; run a build nightly.
+
+DEFAULTS = {
+    'RECS_PER_BOOK': 10,              # "also ordered" neighbours kept per book
+    'RECS_PER_STUDENT': 10,
+    'RECS_BATCH_SIZE': 200,           # books or students per transaction
+    'RECS_REFRESH_INTERVAL': 300,     # seconds between incremental refreshes
+}
+
+STATE_ID = 1
+
+_basket = RecommendationBasket.__table__
+_book_recs = BookRecommendation.__table__
+_student_recs = StudentRecommendation.__table__
+_wl = wishlist_table.c
+
+
+# -- serving ------------------------------------------------------------------
+
+def related(book_id, n=None) -> list:
+    """The books most often ordered or wishlisted together with `book_id`, best first."""
+    return db.session.execute(_related_select(book_id, n or current_app.config['RECS_PER_BOOK'])).scalars().all()
+
+
+def popular(n=None) -> list:
+    """The best-selling books, from the book_sales counters."""
+    return db.session.execute(_popular_select(n or current_app.config['RECS_PER_STUDENT'])).scalars().all()
+
+
+def for_student(user_id, n=None) -> list:
+    """The student's precomputed list, or the best sellers until they have one."""
+    n = n or current_app.config['RECS_PER_STUDENT']
+    return db.session.execute(_student_select(user_id, n)).scalars().all() or popular(n)
+
+
+def _related_select(book_id, n):
+    return (db.select(Book).join(BookRecommendation, BookRecommendation.other_id == Book.id)
+            .where(BookRecommendation.book_id == book_id)
+            .order_by(BookRecommendation.rank).limit(n))
+
+
+def _student_select(user_id, n):
+    return (db.select(Book).join(StudentRecommendation, StudentRecommendation.book_id == Book.id)
+            .where(StudentRecommendation.user_id == user_id)
+            .order_by(StudentRecommendation.rank).limit(n))
+
+
+def _popular_select(n):
+    return (db.select(Book).join(BookSales, BookSales.book_id == Book.id)
+            .where(BookSales.quantity_sold > 0)
+            .order_by(BookSales.quantity_sold.desc(), BookSales.book_id).limit(n))
+
+
+# -- building -----------------------------------------------------------------
+
+def build(now=None) -> int:
+    """Recompute every basket and list from the order and wishlist tables; returns rows written."""
+    now = now or datetime.utcnow()
+    last_order_id = _last_order_id()
+    users = sorted({u for (u,) in db.session.execute(db.union(
+        db.select(Order.user_id).where(Order.user_id.isnot(None)),
+        db.select(_wl.user_id),
+        db.select(_basket.c.user_id)))})
+    _sync_baskets(users)
+    books = [b for (b,) in db.session.execute(db.select(_basket.c.book_id).distinct().order_by(_basket.c.book_id))]
+    students = [u for (u,) in db.session.execute(db.select(_basket.c.user_id).distinct().order_by(_basket.c.user_id))]
+    rows = _rank_books(books, everything=True) + _rank_students(students)
+    inventory.run_in_transaction(_drop_stale)
+    inventory.run_in_transaction(_save_state, last_order_id, now, built=True)
+    logging.info(f'Rebuilt recommendations for {len(books)} books and {len(students)} students')
+    return rows
+
+
+def refresh(now=None) -> int:
+    """Fold orders placed since the last run into the lists; the first run builds them."""
+    now = now or datetime.utcnow()
+    state = db.session.get(RecommendationState, STATE_ID)
+    if state is None or state.built_at is None:
+        return build(now)
+    since, last_order_id = state.last_order_id, _last_order_id()
+    if last_order_id <= since:
+        return 0
+    users = sorted(u for (u,) in db.session.query(Order.user_id).distinct()
+                   .filter(Order.id > since, Order.id <= last_order_id, Order.user_id.isnot(None)))
+    changed, books = _sync_baskets(users)
+    rows = _rank_books(sorted(books)) + _rank_students(sorted(changed))
+    inventory.run_in_transaction(_save_state, last_order_id, now)
+    return rows
+
+
+def _last_order_id() -> int:
+    return db.session.query(db.func.max(Order.id)).scalar() or 0
+
+
+def _batches(ids):
+    size = current_app.config['RECS_BATCH_SIZE']
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def _sync_baskets(user_ids):
+    """Update the stored baskets of `user_ids`; returns (students whose basket changed,
+    books whose neighbour lists those changes affect)."""
+    changed, books = [], set()
+    for batch in _batches(user_ids):
+        batch_changed, batch_books = inventory.run_in_transaction(_sync_basket_batch, batch)
+        changed += batch_changed
+        books |= batch_books
+    return changed, books
+
+
+def _sync_basket_batch(user_ids):
+    ordered = (db.select(Order.user_id, Order.book_id).join(Book, Book.id == Order.book_id)
+               .where(Order.user_id.in_(user_ids), Order.status != 'canceled'))
+    wished = db.select(_wl.user_id, _wl.book_id).join(Book, Book.id == _wl.book_id).where(_wl.user_id.in_(user_ids))
+    current = _group(db.session.execute(db.union(ordered, wished)))
+    stored = _group(db.session.execute(
+        db.select(_basket.c.user_id, _basket.c.book_id).where(_basket.c.user_id.in_(user_ids))))
+    changed, books, added, removed = [], set(), [], []
+    for user_id in user_ids:
+        new, old = current[user_id], stored[user_id]
+        if new == old:
+            continue
+        # Every pair with a book in either version of the basket may have changed
+        changed.append(user_id)
+        books |= new | old
+        added += [{'user_id': user_id, 'book_id': b} for b in sorted(new - old)]
+        removed += [(user_id, b) for b in old - new]
+    if removed:
+        db.session.execute(_basket.delete().where(tuple_(_basket.c.user_id, _basket.c.book_id).in_(removed)))
+    if added:
+        try:
+            db.session.execute(_basket.insert(), added)
+        except IntegrityError:
+            raise inventory.Conflict('baskets changed by a concurrent refresh')
+    return changed, books
+
+
+def _group(rows):
+    grouped = defaultdict(set)
+    for key, value in rows:
+        grouped[key].add(value)
+    return grouped
+
+
+def _rank_books(book_ids, everything=False) -> int:
+    """Re-rank `book_ids`, reading only the baskets that hold them unless `everything`."""
+    # The baskets as sparse rows (student -> books) and columns (book -> students)
+    baskets, holders = defaultdict(list), defaultdict(list)
+    if everything:
+        rows = db.session.execute(db.select(_basket.c.user_id, _basket.c.book_id))
+    else:
+        users = sorted({u for batch in _batches(book_ids) for (u,) in db.session.execute(
+            db.select(_basket.c.user_id).distinct().where(_basket.c.book_id.in_(batch)))})
+        rows = (row for batch in _batches(users) for row in db.session.execute(
+            db.select(_basket.c.user_id, _basket.c.book_id).where(_basket.c.user_id.in_(batch))))
+    for user_id, book_id in rows:
+        baskets[user_id].append(book_id)
+        holders[book_id].append(user_id)
+    # Baskets per book, for the cosine; a partial read has only some of the neighbours' holders
+    sizes = {book_id: len(users) for book_id, users in holders.items()}
+    if not everything:
+        for batch in _batches(sorted(holders)):
+            sizes.update(db.session.execute(
+                db.select(_basket.c.book_id, db.func.count()).where(_basket.c.book_id.in_(batch))
+                .group_by(_basket.c.book_id)).all())
+    return sum(inventory.run_in_transaction(_rank_book_batch, batch, baskets, holders, sizes)
+               for batch in _batches(book_ids))
+
+
+def _rank_book_batch(book_ids, baskets, holders, sizes) -> int:
+    """Replace the neighbour lists of `book_ids`, one co-occurrence column at a time."""
+    n = current_app.config['RECS_PER_BOOK']
+    rows = []
+    for book_id in book_ids:
+        together = Counter()
+        for user_id in holders.get(book_id, ()):
+            together.update(baskets[user_id])
+        together.pop(book_id, None)
+        # together / sqrt(n_a * n_b) ranks like together^2 / n_b, as n_a is the same for all
+        best = heapq.nlargest(n, together.items(), key=lambda kv: (kv[1] * kv[1] / sizes[kv[0]], kv[1], -kv[0]))
+        size = sizes.get(book_id, 0)
+        rows += [{'book_id': book_id, 'rank': rank, 'other_id': other_id,
+                  'score': round(count / math.sqrt(size * sizes[other_id]), 6)}
+                 for rank, (other_id, count) in enumerate(best)]
+    return _replace(_book_recs, 'book_id', book_ids, rows)
+
+
+def _rank_students(user_ids) -> int:
+    return sum(inventory.run_in_transaction(_rank_student_batch, batch) for batch in _batches(user_ids))
+
+
+def _rank_student_batch(user_ids) -> int:
+    """Replace the lists of `user_ids` with the summed neighbours of their baskets."""
+    owned = _basket.alias('owned')
+    scores = db.session.execute(
+        db.select(_basket.c.user_id, _book_recs.c.other_id, db.func.sum(_book_recs.c.score), db.func.count())
+        .join(_book_recs, _book_recs.c.book_id == _basket.c.book_id)
+        .where(_basket.c.user_id.in_(user_ids),
+               ~exists().where(owned.c.user_id == _basket.c.user_id, owned.c.book_id == _book_recs.c.other_id))
+        .group_by(_basket.c.user_id, _book_recs.c.other_id))
+    candidates = defaultdict(list)
+    for user_id, book_id, score, votes in scores:
+        candidates[user_id].append((score, votes, -book_id))
+    n = current_app.config['RECS_PER_STUDENT']
+    rows = [{'user_id': user_id, 'rank': rank, 'book_id': -neg_id, 'score': round(score, 6)}
+            for user_id, found in candidates.items()
+            for rank, (score, _, neg_id) in enumerate(heapq.nlargest(n, found))]
+    return _replace(_student_recs, 'user_id', user_ids, rows)
+
+
+def _replace(table, key, keys, rows) -> int:
+    """Replace the lists of `keys` in `table` with `rows`."""
+    db.session.execute(table.delete().where(table.c[key].in_(keys)))
+    if rows:
+        db.session.execute(table.insert(), rows)
+    return len(rows)
+
+
+def _drop_stale():
+    # Lists of books and students that no longer appear in any basket
+    db.session.execute(_book_recs.delete().where(_book_recs.c.book_id.not_in(db.select(_basket.c.book_id))))
+    db.session.execute(_student_recs.delete().where(_student_recs.c.user_id.not_in(db.select(_basket.c.user_id))))
+
+
+def _save_state(last_order_id, now, built=False):
+    state = db.session.get(RecommendationState, STATE_ID)
+    if state is None:
+        state = RecommendationState(id=STATE_ID, last_order_id=0)
+        db.session.add(state)
+    state.last_order_id = max(state.last_order_id or 0, last_order_id)
+    state.refreshed_at = now
+    if built:
+        state.built_at = now
+    try:
+        db.session.flush()
+    except IntegrityError:
+        raise inventory.Conflict('recommendation state created concurrently')
+
+
+def init_app(app):
+    for key, value in DEFAULTS.items():
+        app.config.setdefault(key, value)
+    scheduler.add_job('refresh_recommendations', refresh, app.config['RECS_REFRESH_INTERVAL'])
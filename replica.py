@@ -0,0 +1,55 @@
+import time
+from functools import wraps
+from flask import g, has_request_context, session
+from flask_sqlalchemy.session import Session
+
+# Read-replica routing for the `db` session.
+#
+# When a 'replica' bind is configured (DATABASE_REPLICA_URL), SELECTs issued by
+# views decorated with @read_only go to the replica and everything else goes to
+# the primary. Any write sends the rest of the request to the primary, and the
+# user's next REPLICA_STICKY_SECONDS of requests as well, so people always see
+# their own changes even if the replica is lagging.
+
+REPLICA_BIND = 'replica'
+REPLICA_STICKY_SECONDS = 5.0
+
+_STICKY_KEY = '_primary_until'
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                g.db_wrote = True
+            elif _reads_from_replica(clause):
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _reads_from_replica(clause) -> bool:
+    if not g.get('db_read_only') or g.get('db_wrote'):
+        return False
+    # SELECT ... FOR UPDATE must see and lock the primary's rows
+    return getattr(clause, '_for_update_arg', None) is None
+
+
+def read_only(view):
+    """Let a view's queries be served by the replica (unless the user just wrote)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = session.get(_STICKY_KEY, 0) <= time.time()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def init_app(app):
+    app.config.setdefault('REPLICA_STICKY_SECONDS', REPLICA_STICKY_SECONDS)
+
+    @app.after_request
+    def _remember_writes(response):
+        if g.get('db_wrote') and REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+            session[_STICKY_KEY] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
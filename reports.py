@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from models import db, User, Book, Order
+from book_io import stream_rows, EXPORT_BATCH_SIZE
+
+# Order history reports for accounting.
+# One SELECT over order joined with user and book, filtered in SQL and streamed
+# with stream_rows, so a report over millions of orders is never held in memory.
+
+STATUSES = ('pending', 'approved', 'paid', 'canceled', 'returned')
+PAYMENT_STATUSES = ('unpaid', 'paid', 'failed')
+
+
+class ReportError(ValueError):
+    pass
+
+
+def _parse_date(value, name, end=False):
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ReportError(f'{name} must be an ISO date or datetime, got {value!r}')
+    # A bare end date includes the whole day
+    if end and len(value) <= 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def _parse_choices(value, name, allowed):
+    choices = [v.strip() for v in value.split(',') if v.strip()]
+    unknown = set(choices) - set(allowed)
+    if unknown:
+        raise ReportError(f'unknown {name}: {", ".join(sorted(unknown))}')
+    return choices
+
+
+def parse_filters(args) -> dict:
+    """Report filters from query-string style `args` (from, to, status, payment_status)."""
+    filters = {}
+    if args.get('from'):
+        filters['start'] = _parse_date(args['from'], 'from')
+    if args.get('to'):
+        filters['end'] = _parse_date(args['to'], 'to', end=True)
+    if args.get('status'):
+        filters['statuses'] = _parse_choices(args['status'], 'status', STATUSES)
+    if args.get('payment_status'):
+        filters['payment_statuses'] = _parse_choices(args['payment_status'], 'payment_status', PAYMENT_STATUSES)
+    return filters
+
+
+def order_report_query(start=None, end=None, statuses=None, payment_statuses=None):
+    """Orders with their student and book, oldest first; `end` is exclusive."""
+    query = (db.select(
+                Order.id.label('order_id'), Order.created_at, Order.status, Order.payment_status,
+                Order.payment_method, Order.quantity, Book.price.label('unit_price'),
+                (Order.quantity * Book.price).label('total'), Order.fine, Order.due_date, Order.returned_at,
+                User.id.label('user_id'), User.name.label('student_name'), User.email.label('student_email'),
+                Book.id.label('book_id'), Book.isbn, Book.title)
+             .select_from(Order)
+             # Outer joins so orders for deleted books or students still show up
+             .outerjoin(User, Order.user_id == User.id)
+             .outerjoin(Book, Order.book_id == Book.id)
+             .order_by(Order.created_at, Order.id))
+    if start is not None:
+        query = query.where(Order.created_at >= start)
+    if end is not None:
+        query = query.where(Order.created_at < end)
+    if statuses:
+        query = query.where(Order.status.in_(statuses))
+    if payment_statuses:
+        query = query.where(Order.payment_status.in_(payment_statuses))
+    return query
+
+
+def order_report(fmt='csv', batch_size=EXPORT_BATCH_SIZE, **filters):
+    """Yield the filtered order report as CSV, JSONL or JSON text chunks."""
+    return stream_rows(order_report_query(**filters), fmt, batch_size)
@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from models import db
+import observability
+
+# Periodic background jobs.
+# Jobs are plain functions taking the current time and returning how many rows
+# they touched. The scheduler runs them either on a thread inside each web process
+# (SCHEDULER_ENABLED) or in a separate process via `flask run-jobs`. Jobs must be
+# idempotent and commit in small batches: with several workers they may run
+# concurrently, and nothing else waits on them.
+#
+# Time comes from `clock`, so tests can replace it and call run_pending() directly
+# instead of sleeping.
+
+DEFAULTS = {
+    'SCHEDULER_ENABLED': False,       # run jobs on a thread in every web process
+    'SCHEDULER_MAX_SLEEP': 30.0,      # seconds; upper bound between checks for due jobs
+}
+
+JOB_RUNS = observability.registry.counter(
+    'scheduler_job_runs_total', 'Scheduled job runs by outcome.', ('job', 'outcome'))
+JOB_ROWS = observability.registry.counter(
+    'scheduler_job_rows_total', 'Rows changed by scheduled jobs.', ('job',))
+JOB_DURATION = observability.registry.histogram(
+    'scheduler_job_duration_seconds', 'Scheduled job run time.', ('job',))
+
+
+class Job:
+    def __init__(self, name, fn, interval):
+        self.name = name
+        self.fn = fn
+        self.interval = timedelta(seconds=interval)
+        self.next_run = None      # None: due on the next check
+        self.last_run = None
+        self.last_result = None
+        self.last_error = None
+
+    def due(self, now) -> bool:
+        return self.next_run is None or now >= self.next_run
+
+
+class Scheduler:
+    def __init__(self, app=None, clock=datetime.utcnow):
+        self.app = None
+        self.clock = clock
+        self.jobs = {}
+        self._thread = None
+        self._pid = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.app = app
+        app.extensions['scheduler'] = self
+        if app.config['SCHEDULER_ENABLED']:
+            # Started by the first request, so forked workers each get their own thread
+            app.before_request(self.start)
+
+    def add_job(self, name, fn, interval):
+        self.jobs[name] = Job(name, fn, interval)
+        return self.jobs[name]
+
+    # -- running -------------------------------------------------------------
+
+    def run_job(self, name, now=None):
+        """Run one job now and schedule its next run; needs an app context."""
+        job = self.jobs[name]
+        now = now or self.clock()
+        start = time.perf_counter()
+        try:
+            result = job.fn(now)
+        except Exception as e:
+            db.session.rollback()
+            job.last_error = str(e)
+            JOB_RUNS.inc(job=name, outcome='error')
+            logging.exception(f'Scheduled job {name} failed')
+            result = None
+        else:
+            job.last_error = None
+            JOB_RUNS.inc(job=name, outcome='ok')
+            JOB_ROWS.inc(result or 0, job=name)
+            if result:
+                logging.info(f'Scheduled job {name} changed {result} row(s)')
+        finally:
+            db.session.remove()
+        JOB_DURATION.observe(time.perf_counter() - start, job=name)
+        job.last_run, job.last_result = now, result
+        job.next_run = now + job.interval
+        return result
+
+    def run_pending(self, now=None):
+        """Run every job that is due at `now` (default: the clock); returns {name: result}."""
+        now = now or self.clock()
+        return {name: self.run_job(name, now) for name, job in list(self.jobs.items()) if job.due(now)}
+
+    def seconds_until_next(self, now=None) -> float:
+        now = now or self.clock()
+        pending = [job.next_run for job in self.jobs.values()]
+        if not pending or any(n is None for n in pending):
+            return 0.0
+        return max(0.0, (min(pending) - now).total_seconds())
+
+    def run_forever(self, stop=None):
+        """Loop running due jobs until `stop` (an Event) is set; used by `flask run-jobs`."""
+        stop = stop or self._stop
+        with self.app.app_context():
+            while not stop.is_set():
+                self.run_pending()
+                self._wake.wait(min(self.seconds_until_next(), self.app.config['SCHEDULER_MAX_SLEEP']))
+                self._wake.clear()
+
+    # -- background thread ---------------------------------------------------
+
+    def start(self):
+        """Start the scheduler thread once per process (safe to call after a fork)."""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='scheduler', daemon=True)
+            self._thread.start()
+            self._pid = pid
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+
+scheduler = Scheduler()
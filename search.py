@@ -0,0 +1,168 @@
+import logging
+import re
+from sqlalchemy import event, inspect, text, bindparam, literal_column, Table, Column, Integer, Text, MetaData
+from sqlalchemy.engine import Engine
+from models import db, Book
+
+# Full-text index over Book.title/author/genre.
+# On SQLite this is an FTS5 table kept in sync by ORM events; on other backends
+# (or SQLite builds without FTS5) catalog search falls back to ILIKE scans.
+FTS_TABLE = 'book_fts'
+
+# bm25 weights for the indexed columns, in declaration order
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Separate metadata so db.create_all() never tries to create it as a plain table
+book_fts = Table(FTS_TABLE, MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('title', Text),
+    Column('author', Text),
+    Column('genre', Text),
+)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Engine URL -> whether it has a usable FTS index, probed on first use
+_enabled = {}
+
+INDEXED_FIELDS = ('title', 'author', 'genre')
+
+
+def _engine_key(bind):
+    return str(bind.engine.url)
+
+
+def _probe(connection) -> bool:
+    if connection.dialect.name != 'sqlite':
+        return False
+    try:
+        return connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}
+        ).first() is not None
+    except Exception:
+        return False
+
+
+def index_available(bind=None) -> bool:
+    """Whether `bind` has the FTS table (created by init_search_index(), e.g. via `flask init-db`)."""
+    bind = bind if bind is not None else db.engine
+    key = _engine_key(bind)
+    available = _enabled.get(key)
+    if available is None:
+        if isinstance(bind, Engine):
+            with bind.connect() as conn:
+                available = _probe(conn)
+        else:
+            available = _probe(bind)
+        _enabled[key] = available
+    return available
+
+
+def init_search_index(rebuild=False):
+    """Create the FTS table if the backend supports it and backfill it from `book`."""
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        logging.info(f'Book search: FTS index not supported on {engine.dialect.name}, using ILIKE fallback')
+        return False
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                f"USING fts5(title, author, genre, tokenize='unicode61 remove_diacritics 2')"
+            ))
+            indexed = conn.execute(text(f'SELECT count(*) FROM {FTS_TABLE}')).scalar()
+            books = conn.execute(text('SELECT count(*) FROM book')).scalar()
+            if rebuild or indexed != books:
+                conn.execute(text(f'DELETE FROM {FTS_TABLE}'))
+                conn.execute(text(
+                    f'INSERT INTO {FTS_TABLE}(rowid, title, author, genre) '
+                    'SELECT id, title, author, genre FROM book'
+                ))
+                logging.info(f'Book search: indexed {books} books')
+    except Exception as e:
+        logging.warning(f'Book search: FTS index unavailable ({e}), using ILIKE fallback')
+        _enabled[_engine_key(engine)] = False
+        return False
+    _enabled[_engine_key(engine)] = True
+    return True
+
+
+def build_match_query(q: str) -> str:
+    """Turn free text into an FTS5 query: every token must match, each as a prefix."""
+    tokens = _TOKEN_RE.findall(q.lower())
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+def _fallback_query(q: str):
+    pattern = f'%{q}%'
+    return Book.query.filter(Book.title.ilike(pattern) | Book.author.ilike(pattern) | Book.genre.ilike(pattern))
+
+
+def _uses_index(q: str) -> bool:
+    return bool(build_match_query(q)) and index_available()
+
+
+def search_keys(q: str):
+    """Ordering keys for `search_books(q)` as (expression, descending) pairs."""
+    if not _uses_index(q):
+        return [(Book.id, False)]
+    return [(db.func.bm25(literal_column(FTS_TABLE), *RANK_WEIGHTS), False), (Book.id, False)]
+
+
+def search_books(q: str):
+    """Return a Book query for `q`, ordered by relevance when the index is available."""
+    order = [expr.desc() if descending else expr for expr, descending in search_keys(q)]
+    if not _uses_index(q):
+        return _fallback_query(q).order_by(*order)
+    return (Book.query
+            .join(book_fts, book_fts.c.rowid == Book.id)
+            .filter(literal_column(FTS_TABLE).op('MATCH')(build_match_query(q)))
+            .order_by(*order))
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Alembic filter: the FTS table and its shadow tables are managed here, not by migrations."""
+    return not (type_ == 'table' and name.startswith(FTS_TABLE))
+
+
+def _sync(connection, book, delete=False):
+    if not index_available(connection):
+        return
+    connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': book.id})
+    if not delete:
+        connection.execute(
+            text(f'INSERT INTO {FTS_TABLE}(rowid, title, author, genre) VALUES (:id, :title, :author, :genre)'),
+            {'id': book.id, 'title': book.title, 'author': book.author, 'genre': book.genre},
+        )
+
+
+def reindex(book_ids):
+    """Refresh the index entries of `book_ids`, for writes that bypass the ORM events."""
+    connection = db.session.connection()
+    if not book_ids or not index_available(connection):
+        return
+    ids = bindparam('ids', expanding=True)
+    connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid IN :ids').bindparams(ids), {'ids': list(book_ids)})
+    connection.execute(
+        text(f'INSERT INTO {FTS_TABLE}(rowid, title, author, genre) '
+             'SELECT id, title, author, genre FROM book WHERE id IN :ids').bindparams(ids),
+        {'ids': list(book_ids)},
+    )
+
+
+@event.listens_for(Book, 'after_insert')
+def _book_inserted(mapper, connection, book):
+    _sync(connection, book)
+
+
+@event.listens_for(Book, 'after_update')
+def _book_updated(mapper, connection, book):
+    # Stock and price updates are frequent; only reindex when searchable text changes
+    state = inspect(book)
+    if any(state.attrs[f].history.has_changes() for f in INDEXED_FIELDS):
+        _sync(connection, book)
+
+
+@event.listens_for(Book, 'after_delete')
+def _book_deleted(mapper, connection, book):
+    _sync(connection, book, delete=True)
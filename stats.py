@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session
+from cache import TTLCache
+from models import db, Book, Order, BookSales
+from replica import RoutingSession
+import inventory
+
+# Top-sellers data for /api/stats, served from the book_sales counter table.
+# Counter changes clear the cached chart once their transaction commits.
+
+STATS_CACHE_TTL = 10.0
+
+_cache = TTLCache(maxsize=32, ttl=STATS_CACHE_TTL)
+
+_PENDING = 'stats_changed'
+
+
+def configure(app):
+    _cache.ttl = app.config.get('STATS_CACHE_TTL', STATS_CACHE_TTL)
+
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+
+def record_sale(book_id, delta):
+    """Adjust the sold counter for `book_id` inside the caller's transaction."""
+    if not delta:
+        return
+    updated = (BookSales.query.filter_by(book_id=book_id)
+               .update({BookSales.quantity_sold: BookSales.quantity_sold + delta}, synchronize_session=False))
+    if not updated:
+        _insert_counters([{'book_id': book_id, 'quantity_sold': max(delta, 0)}])
+    db.session.info[_PENDING] = True
+
+
+def record_sales(deltas):
+    """Batched record_sale for a {book_id: delta} mapping: one UPDATE batch plus one INSERT batch."""
+    deltas = {b: d for b, d in deltas.items() if d}
+    if not deltas:
+        return
+    existing = {b for (b,) in db.session.query(BookSales.book_id).filter(BookSales.book_id.in_(list(deltas)))}
+    table = BookSales.__table__
+    if existing:
+        db.session.execute(
+            table.update()
+            .where(table.c.book_id == db.bindparam('b_id'))
+            .values(quantity_sold=table.c.quantity_sold + db.bindparam('delta')),
+            [{'b_id': b, 'delta': deltas[b]} for b in existing],
+        )
+    missing = [{'book_id': b, 'quantity_sold': max(d, 0)} for b, d in deltas.items() if b not in existing]
+    if missing:
+        _insert_counters(missing)
+    db.session.info[_PENDING] = True
+
+
+def _insert_counters(rows):
+    try:
+        db.session.execute(BookSales.__table__.insert(), rows)
+    except IntegrityError:
+        # Another transaction created the counter after our UPDATE missed it;
+        # run_in_transaction retries and the UPDATE then finds the row
+        raise inventory.Conflict('sales counter created concurrently')
+
+
+def rebuild_sales():
+    """Recompute every counter from the order table."""
+    db.session.query(BookSales).delete(synchronize_session=False)
+    rows = (db.session.query(Order.book_id, db.func.sum(Order.quantity))
+            .filter(Order.status != 'canceled', Order.book_id.isnot(None))
+            .group_by(Order.book_id).all())
+    db.session.bulk_insert_mappings(BookSales, [{'book_id': b, 'quantity_sold': int(q)} for b, q in rows])
+    db.session.commit()
+    _cache.clear()
+    logging.info(f'Rebuilt sales counters for {len(rows)} books')
+    return len(rows)
+
+
+@event.listens_for(Book, 'before_delete')
+def _book_deleted(mapper, connection, book):
+    # book_sales references book, so its counter goes in the same transaction
+    connection.execute(BookSales.__table__.delete().where(BookSales.book_id == book.id))
+    object_session(book).info[_PENDING] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if session.info.pop(_PENDING, None):
+        _cache.clear()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+def ensure_sales():
+    """Backfill counters once for databases created before book_sales existed."""
+    if BookSales.query.first() is None and Order.query.first() is not None:
+        rebuild_sales()
+
+
+def top_sellers(k=5):
+    """Return (payload, etag) for the k best-selling books, cached for STATS_CACHE_TTL seconds."""
+    cached = _cache.get(k)
+    if cached is not None:
+        return cached
+    return _remember_top_sellers(k, db.session.execute(_top_sellers_select(k)).all())
+
+
+async def top_sellers_async(session, k=5):
+    """top_sellers() on an AsyncSession (ASGI mode), sharing its cache."""
+    cached = _cache.get(k)
+    if cached is not None:
+        return cached
+    return _remember_top_sellers(k, (await session.execute(_top_sellers_select(k))).all())
+
+
+def _top_sellers_select(k):
+    return (db.select(Book.title, BookSales.quantity_sold)
+            .join(Book, Book.id == BookSales.book_id)
+            .where(BookSales.quantity_sold > 0)
+            .order_by(BookSales.quantity_sold.desc(), BookSales.book_id)
+            .limit(k))
+
+
+def _remember_top_sellers(k, rows):
+    payload = {'labels': [r[0] for r in rows], 'values': [int(r[1]) for r in rows]}
+    etag = hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+    _cache.set(k, (payload, etag))
+    return payload, etag
@@ -0,0 +1,246 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import request, send_from_directory
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Pillow is in requirements.txt; without it originals are still stored but no
+# thumbnails are made. It is only imported by the thumbnail workers, not at startup.
+HAS_PIL = importlib.util.find_spec('PIL') is not None
+
+# Content-addressed image uploads.
+#
+# Uploads are streamed to a temp file in chunks while their SHA-256 is computed,
+# and rejected as soon as they pass UPLOAD_MAX_BYTES. The request body as a whole
+# is bounded before Werkzeug parses it (limit_request), also when it is sent
+# chunked without a Content-Length. The file is stored as
+# <digest>.<ext>, so identical images are stored once and a name never changes
+# content; such URLs are served with a one-year immutable Cache-Control.
+# Fixed-size thumbnails (thumbs/<digest>-<size>.<ext>) are rendered on a small
+# thread pool after the request returns. Until a thumbnail exists its URL serves
+# the original, uncached.
+#
+# Sizes are per kind of image (profile pictures now, book covers later), see
+# VARIANTS.
+
+DEFAULTS = {
+    'UPLOAD_MAX_BYTES': 5 * 1024 * 1024,
+    'UPLOAD_THUMB_WORKERS': 2,
+    'UPLOAD_CACHE_MAX_AGE': 365 * 24 * 3600,
+}
+
+# kind -> variant -> longest side in pixels
+VARIANTS = {
+    'avatar': {'sm': 64, 'md': 256},
+    'cover': {'sm': 160, 'md': 480},
+}
+
+CHUNK_SIZE = 64 * 1024
+
+# Room for the other form fields and multipart headers around the file
+FORM_OVERHEAD = 64 * 1024
+
+# Magic numbers of the formats we accept, mapped to the stored extension
+_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+
+# Thumbnails of GIFs are still PNGs
+_THUMB_EXT = {'png': 'png', 'jpg': 'jpg', 'gif': 'png'}
+
+_HASHED_NAME = re.compile(r'^(thumbs/)?[0-9a-f]{64}(-\d+)?\.(png|jpg|gif)$')
+
+
+class UploadError(ValueError):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class _BoundedStream:
+    """Request body without a Content-Length, cut off with a 413 past `limit` bytes."""
+
+    def __init__(self, stream, limit):
+        self._stream = stream
+        self._left = limit
+
+    def _count(self, data):
+        self._left -= len(data)
+        if self._left < 0:
+            raise RequestEntityTooLarge()
+        return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(CHUNK_SIZE), b''))
+        return self._count(self._stream.read(size))
+
+    def readline(self, size=-1):
+        return self._count(self._stream.readline(size))
+
+
+def _sniff(head):
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+class ImageStore:
+    def __init__(self, app=None):
+        self.directory = None
+        self.max_bytes = DEFAULTS['UPLOAD_MAX_BYTES']
+        self.max_age = DEFAULTS['UPLOAD_CACHE_MAX_AGE']
+        self.workers = DEFAULTS['UPLOAD_THUMB_WORKERS']
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.directory = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+        self.max_bytes = app.config['UPLOAD_MAX_BYTES']
+        self.max_age = app.config['UPLOAD_CACHE_MAX_AGE']
+        self.workers = app.config['UPLOAD_THUMB_WORKERS']
+        if not HAS_PIL:
+            logging.warning('Image uploads: Pillow not installed, thumbnails disabled')
+
+    @property
+    def thumbnails_enabled(self):
+        return HAS_PIL
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='thumbnailer')
+            return self._executor
+
+    # -- storing -------------------------------------------------------------
+
+    def limit_request(self) -> bool:
+        """Bound the body of an upload request before Werkzeug parses (and spools) it.
+
+        Returns True if the declared Content-Length is over the limit. A body without
+        one is read through a stream that aborts with 413 once it passes the limit.
+        Call it before the view touches request.form or request.files.
+        """
+        limit = self.max_bytes + FORM_OVERHEAD
+        if request.content_length is not None:
+            return request.content_length > limit
+        request.environ['wsgi.input'] = _BoundedStream(request.environ['wsgi.input'], limit)
+        return False
+
+    def save(self, file_storage, kind='avatar'):
+        """Store an uploaded image and queue its thumbnails; returns (name, future or None)."""
+        os.makedirs(os.path.join(self.directory, 'thumbs'), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.upload-')
+        try:
+            digest, ext = self._copy(file_storage.stream, fd)
+            name = f'{digest}.{ext}'
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                os.remove(tmp)
+            else:
+                os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        future = None
+        if self.thumbnails_enabled and not self._thumbnails_exist(digest, ext, kind):
+            future = self._pool().submit(self.make_thumbnails, digest, ext, kind)
+        return name, future
+
+    def _copy(self, stream, fd):
+        sha = hashlib.sha256()
+        size = 0
+        ext = None
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if ext is None:
+                    ext = _sniff(chunk)
+                    if ext is None:
+                        raise UploadError('not a PNG, JPEG or GIF image')
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise UploadTooLarge(f'image is larger than {self.max_bytes // 1024} KB')
+                sha.update(chunk)
+                out.write(chunk)
+        if ext is None:
+            raise UploadError('empty upload')
+        return sha.hexdigest(), ext
+
+    # -- thumbnails ----------------------------------------------------------
+
+    def variant_name(self, name, kind='avatar', variant='md'):
+        """Name of the `variant` thumbnail of a stored original (the original itself without Pillow)."""
+        if not self.thumbnails_enabled or not _HASHED_NAME.match(name):
+            return name
+        digest, ext = name.rsplit('.', 1)
+        return f'thumbs/{digest}-{VARIANTS[kind][variant]}.{_THUMB_EXT[ext]}'
+
+    def _thumbnails_exist(self, digest, ext, kind):
+        return all(os.path.exists(os.path.join(self.directory, self.variant_name(f'{digest}.{ext}', kind, v)))
+                   for v in VARIANTS[kind])
+
+    def make_thumbnails(self, digest, ext, kind='avatar'):
+        from PIL import Image, ImageOps
+        original = os.path.join(self.directory, f'{digest}.{ext}')
+        try:
+            with Image.open(original) as img:
+                img = ImageOps.exif_transpose(img)
+                for variant, size in VARIANTS[kind].items():
+                    target = os.path.join(self.directory, self.variant_name(f'{digest}.{ext}', kind, variant))
+                    if os.path.exists(target):
+                        continue
+                    thumb = img.copy()
+                    thumb.thumbnail((size, size))
+                    if _THUMB_EXT[ext] == 'jpg' and thumb.mode != 'RGB':
+                        thumb = thumb.convert('RGB')
+                    # Write then rename, so a half-written thumbnail is never served
+                    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), prefix='.thumb-')
+                    with os.fdopen(fd, 'wb') as out:
+                        thumb.save(out, format='JPEG' if _THUMB_EXT[ext] == 'jpg' else 'PNG', optimize=True)
+                    os.replace(tmp, target)
+        except Exception as e:
+            logging.warning(f'Image uploads: thumbnails for {digest}.{ext} failed ({e})')
+            raise
+
+    # -- serving -------------------------------------------------------------
+
+    def send(self, filename):
+        """Serve an uploaded file; content-addressed names are cached for good."""
+        if not _HASHED_NAME.match(filename):
+            return send_from_directory(self.directory, filename)
+        path = os.path.join(self.directory, filename)
+        if filename.startswith('thumbs/') and not os.path.exists(path):
+            # Thumbnail still being rendered: serve the original, but don't let it be cached
+            digest = filename[len('thumbs/'):].rsplit('-', 1)[0]
+            originals = [n for n in (f'{digest}.{e}' for e in ('jpg', 'png', 'gif'))
+                         if os.path.exists(os.path.join(self.directory, n))]
+            if originals:
+                response = send_from_directory(self.directory, originals[0], max_age=0)
+                response.cache_control.no_cache = True
+                return response
+        response = send_from_directory(self.directory, filename, max_age=self.max_age)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+images = ImageStore()
@@ -0,0 +1,87 @@
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached, object_session
+from cache import TTLCache
+from models import db, User
+import page_cache
+
+# Identity cache for Flask-Login's user_loader.
+# Column values of recently seen users are kept per process; a hit rebuilds the
+# User and attaches it to the session with merge(load=False), so the request gets
+# a normal persistent object without a primary-key SELECT. Entries are dropped
+# whenever a User row is updated or deleted through the ORM, and expire after
+# USER_CACHE_TTL seconds.
+#
+# Other workers learn about such changes through a 'user:<id>' version tag kept in
+# the catalog cache backend (page_cache), which is shared between workers: an entry
+# is only used while the tag still has the token read before the user was loaded.
+# With CATALOG_CACHE_BACKEND=none only the TTL bounds staleness across workers.
+
+USER_CACHE_TTL = 60.0
+USER_CACHE_SIZE = 10000
+
+_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+_COLUMNS = [c.key for c in User.__mapper__.column_attrs]
+
+
+def configure(app):
+    _cache.ttl = app.config.get('USER_CACHE_TTL', USER_CACHE_TTL)
+    _cache.maxsize = app.config.get('USER_CACHE_SIZE', USER_CACHE_SIZE)
+
+
+def _tag(user_id):
+    return f'user:{user_id}'
+
+
+def _cached(user_id):
+    """(version, data): the user's current version token, and its cached columns if
+    they were cached under that token."""
+    version = page_cache.catalog_cache.versions([_tag(user_id)]).get(_tag(user_id))
+    entry = _cache.get(user_id)
+    if entry is None or entry[0] != version:
+        return version, None
+    return version, entry[1]
+
+
+def _remember(user_id, version, user):
+    if user is not None:
+        _cache.set(user_id, (version, {key: getattr(user, key) for key in _COLUMNS}))
+
+
+def load_user(user_id):
+    version, data = _cached(user_id)
+    if data is None:
+        user = db.session.get(User, user_id)
+        _remember(user_id, version, user)
+        return user
+    user = User(**data)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+async def load_user_async(session, user_id):
+    """load_user() for ASGI views: returns a detached User, from the cache or one
+    primary-key SELECT on the AsyncSession."""
+    version, data = _cached(user_id)
+    if data is None:
+        user = await session.get(User, user_id)
+        _remember(user_id, version, user)
+        return user
+    user = User(**data)
+    make_transient_to_detached(user)
+    return user
+
+
+def invalidate(user_id):
+    _cache.delete(user_id)
+
+
+def stats() -> dict:
+    return _cache.stats()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, user):
+    invalidate(user.id)
+    page_cache.tags_changed([_tag(user.id)], object_session(user))
@@ -0,0 +1,102 @@
+from werkzeug.utils import cached_property, import_string
+
+# URL map of the app, grouped by view module.
+# Rules are registered up front, but a view module is only imported by the first
+# request routed to it, so booting a worker does not load the admin, import/export
+# and report code. Endpoints keep their plain names (no blueprint prefix) because
+# the templates refer to them as url_for('catalog'), url_for('admin_dashboard'), ...
+#
+# The JSON API is a regular blueprint under its own prefix; it has no templates to
+# keep compatible, so it is imported and registered as a whole.
+
+GET_POST = ('GET', 'POST')
+POST = ('POST',)
+
+ROUTES = {
+    'account': [
+        ('/', 'index', None),
+        ('/login', 'login', GET_POST),
+        ('/register', 'register', GET_POST),
+        ('/logout', 'logout', None),
+        ('/profile', 'profile', GET_POST),
+        ('/static/uploads/<path:filename>', 'uploaded_file', None),
+        ('/forgot-password', 'forgot_password', GET_POST),
+        ('/reset-password/<token>', 'reset_password', GET_POST),
+    ],
+    'store': [
+        ('/catalog', 'catalog', None),
+        ('/order/<int:book_id>', 'place_order', POST),
+        ('/wishlist/toggle/<int:book_id>', 'toggle_wishlist', POST),
+        ('/student', 'student_dashboard', None),
+        ('/student/orders/<int:order_id>/edit', 'student_edit_order', GET_POST),
+        ('/student/orders/<int:order_id>/cancel', 'student_cancel_order', POST),
+        ('/request-book', 'request_book', GET_POST),
+        ('/cart', 'cart', None),
+        ('/add_to_cart/<int:book_id>', 'add_to_cart', POST),
+        ('/cart/remove/<int:item_id>', 'remove_from_cart', POST),
+        ('/cart/checkout', 'cart_checkout', POST),
+    ],
+    'admin': [
+        ('/admin', 'admin_dashboard', None),
+        ('/admin/books/new', 'admin_add_book', GET_POST),
+        ('/admin/books/<int:book_id>/edit', 'admin_edit_book', GET_POST),
+        ('/admin/books/<int:book_id>/delete', 'admin_delete_book', POST),
+        ('/admin/books/import', 'admin_import_books', POST),
+        ('/admin/export/<kind>', 'admin_export', None),
+        ('/admin/reports/orders', 'admin_order_report', None),
+        ('/admin/orders/<int:order_id>/approve', 'admin_approve_order', POST),
+        ('/admin/orders/<int:order_id>/cancel', 'admin_cancel_order', POST),
+        ('/admin/orders/approve', 'admin_bulk_approve_orders', POST),
+        ('/admin/orders/cancel', 'admin_bulk_cancel_orders', POST),
+        ('/admin/students', 'admin_students', None),
+        ('/admin/students/<int:user_id>/edit', 'admin_edit_student', GET_POST),
+        ('/admin/students/<int:user_id>/delete', 'admin_delete_student', POST),
+        ('/admin/requests', 'admin_requests', None),
+        ('/admin/requests/<int:request_id>/approve', 'admin_approve_request', POST),
+        ('/admin/requests/<int:request_id>/reject', 'admin_reject_request', POST),
+        ('/admin/requests/approve', 'admin_bulk_approve_requests', POST),
+        ('/admin/requests/reject', 'admin_bulk_reject_requests', POST),
+    ],
+    'api': [
+        ('/api/stats', 'api_stats', None),
+        ('/metrics', 'metrics', None),
+    ],
+}
+
+BLUEPRINTS = {
+    'api_v1': 'views.api_v1:bp',
+}
+
+
+class LazyView:
+    """A view function that imports `module.name` on first call."""
+
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+def register_views(app, groups=None):
+    """Add the URL rules of `groups` (default: all) to `app`."""
+    for group, routes in ROUTES.items():
+        if groups is not None and group not in groups:
+            continue
+        for rule, endpoint, methods in routes:
+            app.add_url_rule(rule, endpoint, LazyView(f'views.{group}.{endpoint}'), methods=methods)
+    for group, import_name in BLUEPRINTS.items():
+        if groups is None or group in groups:
+            app.register_blueprint(import_string(import_name))
+
+
+def load_views(groups=None):
+    """Import the view modules now, e.g. before forking workers that should share them."""
+    for group in ROUTES:
+        if groups is None or group in groups:
+            import_string(f'views.{group}')
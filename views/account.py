@@ -0,0 +1,140 @@
+import logging
+from flask import current_app, render_template, redirect, url_for, flash, request
+from flask_login import login_user, login_required, logout_user, current_user
+from itsdangerous import URLSafeTimedSerializer
+from models import db, User
+from forms import LoginForm, RegisterForm
+from mailer import mail_queue
+from uploads import images, UploadError
+from auth import password_checker, HashPoolBusy
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
+
+
+def index():
+    if current_user.is_authenticated:
+        if current_user.role == 'admin':
+            return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('student_dashboard'))
+    return render_template('index.html')
+
+
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('index'))
+    form = LoginForm()
+    if form.validate_on_submit():
+        email = form.email.data.strip().lower()
+        if password_checker.limiter.is_blocked(email, request.remote_addr):
+            flash('Too many failed login attempts. Please try again later.', 'danger')
+            return render_template('login.html', form=form), 429
+        user = User.query.filter_by(email=email).first()
+        try:
+            authenticated = password_checker.authenticate(user, email, form.password.data, request.remote_addr)
+        except HashPoolBusy:
+            flash('The server is busy. Please try again in a moment.', 'warning')
+            return render_template('login.html', form=form), 503
+        if authenticated:
+            db.session.commit()  # persists an upgraded password hash, if any
+            login_user(user)
+            logging.info(f'User {user.email} logged in')
+            flash('Login successful!', 'success')
+            next_page = request.args.get('next')
+            return redirect(next_page) if next_page else redirect(url_for('index'))
+        flash('Invalid email or password', 'danger')
+    return render_template('login.html', form=form)
+
+
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for('index'))
+    form = RegisterForm()
+    if form.validate_on_submit():
+        email = form.email.data.strip().lower()
+        if User.query.filter_by(email=email).first():
+            flash('Email already registered', 'warning')
+            return redirect(url_for('register'))
+        user = User(name=form.name.data, email=email)
+        user.set_password(form.password.data)
+        db.session.add(user)
+        db.session.commit()
+        logging.info(f'New user registered: {user.email}')
+        flash('Registration successful! Please log in.', 'success')
+        return redirect(url_for('login'))
+    return render_template('register.html', form=form)
+
+
+@login_required
+def logout():
+    logging.info(f'User {current_user.email} logged out')
+    logout_user()
+    flash('Logged out successfully', 'info')
+    return redirect(url_for('index'))
+
+
+@login_required
+def profile():
+    if request.method == 'POST':
+        if images.limit_request():
+            flash('Image is too large', 'danger')
+            return redirect(url_for('profile'))
+        current_user.name = request.form.get('name', current_user.name)
+        if 'profile_pic' in request.files:
+            file = request.files['profile_pic']
+            if file and allowed_file(file.filename):
+                try:
+                    name, _ = images.save(file, 'avatar')
+                except UploadError as e:
+                    flash(f'Could not use that picture: {e}', 'danger')
+                    return redirect(url_for('profile'))
+                # Pages show the thumbnail, served from the original until it is ready
+                current_user.profile_pic = images.variant_name(name, 'avatar', 'md')
+        db.session.commit()
+        flash('Profile updated', 'success')
+        return redirect(url_for('profile'))
+    return render_template('profile.html', user=current_user)
+
+
+def uploaded_file(filename):
+    # Takes precedence over the generic static route for uploads, see uploads.py
+    return images.send(filename)
+
+
+def forgot_password():
+    if request.method == 'POST':
+        email = request.form['email'].strip().lower()
+        user = User.query.filter_by(email=email).first()
+        if not user:
+            flash('Email not found', 'warning')
+            return redirect(url_for('forgot_password'))
+        token = _serializer().dumps(email, salt='recover-key')
+        reset_url = url_for('reset_password', token=token, _external=True)
+        body = f'Click here to reset your password:\n{reset_url}\nThis link expires in 30 minutes.'
+        mail_queue.enqueue('Password Reset', [email], body)
+        flash('Password reset email sent!', 'info')
+        return redirect(url_for('login'))
+    return render_template('forgot_password.html')
+
+
+def reset_password(token):
+    try:
+        email = _serializer().loads(token, salt='recover-key', max_age=1800)
+    except Exception:
+        flash('Invalid or expired link', 'danger')
+        return redirect(url_for('login'))
+    if request.method == 'POST':
+        new_pw = request.form['password']
+        user = User.query.filter_by(email=email).first()
+        user.set_password(new_pw)
+        db.session.commit()
+        flash('Password updated. You can log in now.', 'success')
+        return redirect(url_for('login'))
+    return render_template('reset_password.html', email=email)
@@ -0,0 +1,284 @@
+import logging
+from datetime import datetime, timedelta
+from flask import current_app, render_template, redirect, url_for, flash, request, jsonify, make_response, Response, stream_with_context
+from flask_login import login_required, current_user
+from models import db, User, Book, BookRequest, Order
+from forms import BookForm, StudentForm
+from pagination import keyset_page, page_size_arg, add_next_links
+from replica import read_only
+import book_io
+import book_requests
+import dashboard
+import inventory
+import reports
+
+# Most ids one bulk action takes. inventory.cancel_orders binds two parameters per
+# id, (id, quantity) pairs, which keeps it under SQLite's default limit of 999.
+MAX_BULK_IDS = 450
+
+
+def _selected_ids():
+    """Ids of a bulk action: checkbox values `ids` from a form, or {"ids": [...]} as JSON."""
+    data = request.get_json(silent=True)
+    raw = data.get('ids') if isinstance(data, dict) else request.form.getlist('ids')
+    try:
+        ids = [int(i) for i in raw or []]
+    except (TypeError, ValueError):
+        return None
+    return ids if 0 < len(ids) <= MAX_BULK_IDS else None
+
+
+def _bulk_report(outcomes):
+    succeeded = sum(1 for o in outcomes if o.ok)
+    return jsonify({'results': [{'id': o.id, 'ok': o.ok, 'error': o.reason} for o in outcomes],
+                    'succeeded': succeeded, 'failed': len(outcomes) - succeeded})
+
+
+@login_required
+@read_only
+def admin_dashboard():
+    if current_user.role != 'admin':
+        flash('Not authorized', 'danger')
+        return redirect(url_for('index'))
+    stats = dashboard.summary()
+    # The totals cards count the lists with |length, so they carry the summary totals
+    books = dashboard.Recent(dashboard.recent_books(), stats['books'])
+    users = dashboard.Recent(dashboard.recent_students(), stats['students'])
+    orders = dashboard.Recent(dashboard.recent_orders(), stats['orders'])
+    return render_template('admin_dashboard.html', books=books, users=users, orders=orders, stats=stats,
+                           pending_requests=stats['pending_requests'])
+
+
+@login_required
+def admin_add_book():
+    if current_user.role != 'admin':
+        return redirect(url_for('index'))
+    form = BookForm()
+    if form.validate_on_submit():
+        b = Book(title=form.title.data, author=form.author.data, genre=form.genre.data or 'General', isbn=form.isbn.data, price=form.price.data or 0.0, total_copies=form.total_copies.data or 1, available_copies=form.total_copies.data or 1)
+        db.session.add(b)
+        db.session.commit()
+        logging.info(f'Admin {current_user.email} added book {b.title}')
+        flash('Book added', 'success')
+        return redirect(url_for('admin_dashboard'))
+    return render_template('admin_add_book.html', form=form)
+
+
+@login_required
+def admin_edit_book(book_id):
+    if current_user.role != 'admin':
+        return redirect(url_for('index'))
+    book = Book.query.get_or_404(book_id)
+    form = BookForm(obj=book)
+    if form.validate_on_submit():
+        form.populate_obj(book)
+        db.session.commit()
+        logging.info(f'Admin {current_user.email} edited book {book.title}')
+        flash('Book updated', 'success')
+        return redirect(url_for('admin_dashboard'))
+    return render_template('admin_edit_book.html', form=form, book=book)
+
+
+@login_required
+def admin_delete_book(book_id):
+    if current_user.role != 'admin':
+        return redirect(url_for('index'))
+    book = Book.query.get_or_404(book_id)
+    db.session.delete(book)
+    db.session.commit()
+    logging.info(f'Admin {current_user.email} deleted book {book.title}')
+    flash('Book deleted', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+
+@login_required
+def admin_import_books():
+    if current_user.role != 'admin':
+        return jsonify({'error':'unauthorized'}), 403
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'error':'no file uploaded'}), 400
+    fmt = request.form.get('format') or book_io.detect_format(upload.filename)
+    if fmt not in book_io.FORMATS:
+        return jsonify({'error':f'unsupported format {fmt}'}), 400
+    # Werkzeug spools large uploads to a temp file; rows are parsed from it incrementally
+    report = book_io.import_books(upload.stream, fmt)
+    logging.info(f'Admin {current_user.email} imported {upload.filename}: {report.inserted} inserted, {report.updated} updated, {report.failed} failed')
+    return jsonify(report.to_dict())
+
+
+@login_required
+@read_only
+def admin_export(kind):
+    if current_user.role != 'admin':
+        return jsonify({'error':'unauthorized'}), 403
+    fmt = request.args.get('format', 'csv')
+    if kind not in book_io.EXPORT_COLUMNS or fmt not in book_io.EXPORT_FORMATS:
+        return jsonify({'error':'unknown export'}), 404
+    filename = f'{kind}-{datetime.utcnow():%Y%m%d}.{fmt}'
+    return Response(stream_with_context(book_io.export_rows(kind, fmt)), mimetype=book_io.MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@login_required
+@read_only
+def admin_order_report():
+    if current_user.role != 'admin':
+        return jsonify({'error':'unauthorized'}), 403
+    fmt = request.args.get('format', 'csv')
+    if fmt not in book_io.EXPORT_FORMATS:
+        return jsonify({'error':f'unsupported format {fmt}'}), 400
+    try:
+        filters = reports.parse_filters(request.args)
+    except reports.ReportError as e:
+        return jsonify({'error':str(e)}), 400
+    logging.info(f'Admin {current_user.email} exported order report {filters}')
+    filename = f'orders-report-{datetime.utcnow():%Y%m%d}.{fmt}'
+    return Response(stream_with_context(reports.order_report(fmt, **filters)), mimetype=book_io.MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@login_required
+def admin_approve_order(order_id):
+    if current_user.role != 'admin':
+        return redirect(url_for('index'))
+    order = Order.query.get_or_404(order_id)
+    due = datetime.utcnow() + timedelta(days=current_app.config['LOAN_DAYS'])
+    if not inventory.run_in_transaction(inventory.approve_order, order.id, due):
+        flash('Only pending orders can be approved', 'warning')
+        return redirect(url_for('admin_dashboard'))
+    logging.info(f'Admin {current_user.email} approved order {order.id}')
+    flash('Order approved', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+
+@login_required
+def admin_cancel_order(order_id):
+    if current_user.role != 'admin':
+        return redirect(url_for('index'))
+    order = Order.query.get_or_404(order_id)
+    # Return the copies to available
+    if not inventory.run_in_transaction(inventory.cancel_order, order, inventory.CANCELABLE_BY_ADMIN):
+        flash('Order cannot be canceled', 'info')
+        return redirect(url_for('admin_dashboard'))
+    logging.info(f'Admin {current_user.email} canceled order {order.id}')
+    flash('Order canceled', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+
+@login_required
+def admin_bulk_approve_orders():
+    if current_user.role != 'admin':
+        return jsonify({'error':'unauthorized'}), 403
+    ids = _selected_ids()
+    if ids is None:
+        return jsonify({'error':f'select between 1 and {MAX_BULK_IDS} orders'}), 400
+    due = datetime.utcnow() + timedelta(days=current_app.config['LOAN_DAYS'])
+    outcomes = inventory.run_in_transaction(inventory.approve_orders, ids, due)
+    logging.info(f'Admin {current_user.email} approved {sum(o.ok for o in outcomes)}/{len(outcomes)} orders')
+    return _bulk_report(outcomes)
+
+
+@login_required
+def admin_bulk_cancel_orders():
+    if current_user.role != 'admin':
+        return jsonify({'error':'unauthorized'}), 403
+    ids = _selected_ids()
+    if ids is None:
+        return jsonify({'error':f'select between 1 and {MAX_BULK_IDS} orders'}), 400
+    # Every canceled order's copies go back in the same transaction
+    outcomes = inventory.run_in_transaction(inventory.cancel_orders, ids, inventory.CANCELABLE_BY_ADMIN)
+    logging.info(f'Admin {current_user.email} canceled {sum(o.ok for o in outcomes)}/{len(outcomes)} orders')
+    return _bulk_report(outcomes)
+
+
+@login_required
+@read_only
+def admin_students():
+    if current_user.role != 'admin':
+        flash('Not authorized', 'danger')
+        return redirect(url_for('index'))
+    students = keyset_page(User.query.filter_by(role='student'), [(User.id, False)], request.args.get('after'), page_size_arg())
+    return add_next_links(make_response(render_template('admin_students.html', students=students)), {'after': students.next_token})
+
+
+@login_required
+def admin_edit_student(user_id):
+    if current_user.role != 'admin':
+        return redirect(url_for('index'))
+    user = User.query.get_or_404(user_id)
+    form = StudentForm(obj=user)
+    if form.validate_on_submit():
+        form.populate_obj(user)
+        db.session.commit()
+        logging.info(f'Admin {current_user.email} edited student {user.email}')
+        flash('Student updated', 'success')
+        return redirect(url_for('admin_dashboard'))
+    return render_template('admin_edit_student.html', form=form, user=user)
+
+
+@login_required
+def admin_delete_student(user_id):
+    if current_user.role != 'admin':
+        return redirect(url_for('index'))
+    user = User.query.get_or_404(user_id)
+    db.session.delete(user)
+    db.session.commit()
+    logging.info(f'Admin {current_user.email} deleted student {user.email}')
+    flash('Student deleted', 'success')
+    return redirect(url_for('admin_dashboard'))
+
+
+@login_required
+@read_only
+def admin_requests():
+    if current_user.role != 'admin':
+        flash('Not authorized', 'danger')
+        return redirect(url_for('index'))
+    requests = keyset_page(BookRequest.query, [(BookRequest.created_at, True), (BookRequest.id, True)], request.args.get('after'), page_size_arg())
+    return add_next_links(make_response(render_template('admin_requests.html', requests=requests)), {'after': requests.next_token})
+
+
+@login_required
+def admin_approve_request(request_id):
+    if current_user.role != 'admin':
+        return redirect(url_for('index'))
+    book_request = BookRequest.query.get_or_404(request_id)
+    book_request.status = 'approved'
+    db.session.commit()
+    logging.info(f'Admin {current_user.email} approved book request {request_id}')
+    flash('Book request approved', 'success')
+    return redirect(url_for('admin_requests'))
+
+
+@login_required
+def admin_reject_request(request_id):
+    if current_user.role != 'admin':
+        return redirect(url_for('index'))
+    book_request = BookRequest.query.get_or_404(request_id)
+    book_request.status = 'rejected'
+    db.session.commit()
+    logging.info(f'Admin {current_user.email} rejected book request {request_id}')
+    flash('Book request rejected', 'info')
+    return redirect(url_for('admin_requests'))
+
+
+@login_required
+def admin_bulk_approve_requests():
+    return _bulk_review_requests('approved')
+
+
+@login_required
+def admin_bulk_reject_requests():
+    return _bulk_review_requests('rejected')
+
+
+def _bulk_review_requests(status):
+    if current_user.role != 'admin':
+        return jsonify({'error':'unauthorized'}), 403
+    ids = _selected_ids()
+    if ids is None:
+        return jsonify({'error':f'select between 1 and {MAX_BULK_IDS} requests'}), 400
+    outcomes = inventory.run_in_transaction(book_requests.review, ids, status)
+    logging.info(f'Admin {current_user.email} set {sum(o.ok for o in outcomes)}/{len(outcomes)} book requests to {status}')
+    return _bulk_report(outcomes)
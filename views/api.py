@@ -0,0 +1,34 @@
+import secrets
+from flask import current_app, request, jsonify, Response
+from flask_login import login_required, current_user
+from replica import read_only
+import observability
+import stats
+
+
+@login_required
+@read_only
+def api_stats():
+    if current_user.role != 'admin':
+        return jsonify({'error':'unauthorized'}), 403
+    payload, etag = stats.top_sellers(5)
+    resp = jsonify(payload)
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.max_age = int(current_app.config['STATS_CACHE_TTL'])
+    return resp.make_conditional(request)
+
+
+def _local_request():
+    # A request relayed by a proxy on this host carries X-Forwarded-For
+    return request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+
+
+def metrics():
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        if not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'error':'unauthorized'}), 401
+    elif not current_app.config['METRICS_PUBLIC'] and not _local_request():
+        return jsonify({'error':'set METRICS_TOKEN to read metrics remotely'}), 403
+    return Response(observability.render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,365 @@
+import logging
+from datetime import datetime, timedelta
+from flask import Blueprint, current_app, request, jsonify, abort
+from flask_login import login_user, logout_user, current_user
+from sqlalchemy.orm import load_only
+from werkzeug.exceptions import HTTPException
+from models import db, User, Book, Order, Cart, wishlist_table
+from search import search_books, search_keys
+from pagination import keyset_page, page_size_arg, add_next_links
+from replica import read_only
+from auth import password_checker, HashPoolBusy
+import inventory
+import wishlist
+
+# Versioned JSON API for kiosk and mobile clients, mounted at /api/v1.
+#
+# Sessions are the same cookie sessions as the HTML site (POST /login). List
+# endpoints take `fields=a,b,c` to return only those attributes and use the same
+# keyset `after` tokens as the HTML listings. Every GET carries an ETag (and single
+# books a Last-Modified), so clients revalidate with If-None-Match and get a 304.
+# Batch endpoints take up to API_MAX_BATCH items, commit them in one transaction
+# and report an outcome per item instead of failing the whole request.
+
+DEFAULTS = {
+    'API_MAX_BATCH': 100,
+}
+
+bp = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+
+@bp.record_once
+def _configure(state):
+    for key, value in DEFAULTS.items():
+        state.app.config.setdefault(key, value)
+
+
+BOOK_FIELDS = ('id', 'title', 'author', 'genre', 'isbn', 'price', 'total_copies', 'available_copies',
+               'created_at', 'updated_at')
+ORDER_FIELDS = ('id', 'user_id', 'book_id', 'quantity', 'status', 'created_at', 'due_date', 'returned_at',
+                'fine', 'payment_method', 'payment_status')
+CART_FIELDS = ('id', 'book_id', 'quantity', 'added_at')
+
+
+# -- helpers ------------------------------------------------------------------
+
+@bp.errorhandler(HTTPException)
+def _http_error(e):
+    return jsonify({'error': e.description}), e.code
+
+
+@bp.before_request
+def _require_login():
+    if request.endpoint != 'api_v1.login' and not current_user.is_authenticated:
+        abort(401, 'login required')
+
+
+def _require_role(role):
+    if current_user.role != role:
+        abort(403, f'{role}s only')
+
+
+def _fields(allowed):
+    """The attributes requested with ?fields=, always including id."""
+    raw = request.args.get('fields')
+    if not raw:
+        return allowed
+    names = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in names if f not in allowed]
+    if unknown:
+        abort(400, f'unknown field(s): {", ".join(unknown)}')
+    return ('id',) + tuple(f for f in dict.fromkeys(names) if f != 'id')
+
+
+def _dump(obj, fields):
+    data = {}
+    for field in fields:
+        value = getattr(obj, field)
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+
+def _page(page, fields):
+    return {'items': [_dump(o, fields) for o in page], 'next': page.next_token}
+
+
+def _conditional(payload, last_modified=None):
+    resp = jsonify(payload)
+    resp.add_etag()
+    if last_modified is not None:
+        resp.last_modified = last_modified
+    # Per-user data: clients and proxies may store it but must revalidate
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+def _id_list(value, name):
+    if not isinstance(value, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in value):
+        abort(400, f'{name} must be a list of integers')
+    if len(value) > current_app.config['API_MAX_BATCH']:
+        abort(400, f'at most {current_app.config["API_MAX_BATCH"]} {name} per request')
+    return value
+
+
+def _body():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, 'expected a JSON object')
+    return data
+
+
+def _items(data):
+    """Validate a batch of {"book_id": int, "qty": int} lines."""
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        abort(400, 'items must be a non-empty list')
+    if len(items) > current_app.config['API_MAX_BATCH']:
+        abort(400, f'at most {current_app.config["API_MAX_BATCH"]} items per request')
+    lines = []
+    for item in items:
+        book_id = item.get('book_id') if isinstance(item, dict) else None
+        qty = item.get('qty', 1) if isinstance(item, dict) else None
+        if not isinstance(book_id, int) or not isinstance(qty, int) or isinstance(qty, bool):
+            abort(400, 'each item needs an integer book_id and qty')
+        lines.append((book_id, qty))
+    return lines
+
+
+def _existing_books(book_ids):
+    return {b for (b,) in db.session.query(Book.id).filter(Book.id.in_(set(book_ids)))}
+
+
+def _results(results):
+    ok = sum(1 for r in results if r['ok'])
+    return jsonify({'results': results, 'succeeded': ok, 'failed': len(results) - ok})
+
+
+# -- session ------------------------------------------------------------------
+
+@bp.route('/login', methods=['POST'])
+def login():
+    data = _body()
+    email = str(data.get('email', '')).strip().lower()
+    password = str(data.get('password', ''))
+    if password_checker.limiter.is_blocked(email, request.remote_addr):
+        abort(429, 'too many failed login attempts')
+    user = User.query.filter_by(email=email).first()
+    try:
+        authenticated = password_checker.authenticate(user, email, password, request.remote_addr)
+    except HashPoolBusy:
+        abort(503, 'server busy, retry shortly')
+    if not authenticated:
+        abort(401, 'invalid email or password')
+    db.session.commit()  # persists an upgraded password hash, if any
+    login_user(user)
+    logging.info(f'User {user.email} logged in via API')
+    return jsonify({'id': user.id, 'name': user.name, 'email': user.email, 'role': user.role})
+
+
+@bp.route('/logout', methods=['POST'])
+def logout():
+    logout_user()
+    return jsonify({'ok': True})
+
+
+# -- books --------------------------------------------------------------------
+
+@bp.route('/books')
+@read_only
+def list_books():
+    fields = _fields(BOOK_FIELDS)
+    columns = [getattr(Book, f) for f in fields]
+    ids = request.args.get('ids')
+    if ids:
+        try:
+            wanted = _id_list([int(i) for i in ids.split(',') if i.strip()], 'ids')
+        except ValueError:
+            abort(400, 'ids must be comma-separated integers')
+        found = {b.id: b for b in Book.query.options(load_only(*columns)).filter(Book.id.in_(wanted))}
+        return _conditional({'items': [_dump(found[i], fields) for i in dict.fromkeys(wanted) if i in found],
+                             'next': None})
+    q = request.args.get('q', '').strip()
+    query = search_books(q) if q else Book.query
+    keys = search_keys(q) if q else [(Book.id, False)]
+    page = keyset_page(query.options(load_only(*columns)), keys, request.args.get('after'), page_size_arg())
+    return add_next_links(_conditional(_page(page, fields)), {'after': page.next_token})
+
+
+@bp.route('/books/<int:book_id>')
+@read_only
+def get_book(book_id):
+    book = db.session.get(Book, book_id) or abort(404, 'book not found')
+    return _conditional(_dump(book, _fields(BOOK_FIELDS)), book.updated_at)
+
+
+@bp.route('/books/<int:book_id>/related')
+@read_only
+def related_books(book_id):
+    if db.session.get(Book, book_id) is None:
+        abort(404, 'book not found')
+    import recommendations
+    fields = _fields(BOOK_FIELDS)
+    return _conditional({'items': [_dump(b, fields) for b in recommendations.related(book_id)], 'next': None})
+
+
+@bp.route('/books/popular')
+@read_only
+def popular_books():
+    import recommendations
+    fields = _fields(BOOK_FIELDS)
+    return _conditional({'items': [_dump(b, fields) for b in recommendations.popular()], 'next': None})
+
+
+@bp.route('/recommendations')
+@read_only
+def recommended_books():
+    import recommendations
+    fields = _fields(BOOK_FIELDS)
+    books = recommendations.for_student(current_user.id)
+    return _conditional({'items': [_dump(b, fields) for b in books], 'next': None})
+
+
+# -- orders -------------------------------------------------------------------
+
+@bp.route('/orders')
+@read_only
+def list_orders():
+    fields = _fields(ORDER_FIELDS)
+    query = Order.query.options(load_only(*[getattr(Order, f) for f in fields]))
+    if current_user.role != 'admin':
+        query = query.filter(Order.user_id == current_user.id)
+    elif request.args.get('user_id', type=int):
+        query = query.filter(Order.user_id == request.args.get('user_id', type=int))
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Order.status.in_(status.split(',')))
+    page = keyset_page(query, [(Order.created_at, True), (Order.id, True)], request.args.get('after'), page_size_arg())
+    return add_next_links(_conditional(_page(page, fields)), {'after': page.next_token})
+
+
+def _place_orders(user_id, lines):
+    known = _existing_books(b for b, _ in lines)
+    placed = []
+    for book_id, qty in lines:
+        if book_id not in known:
+            placed.append((book_id, qty, None, 'book not found'))
+        elif qty < 1:
+            placed.append((book_id, qty, None, 'invalid quantity'))
+        else:
+            order = inventory.place_order(user_id, book_id, qty)
+            placed.append((book_id, qty, order, None if order else 'not enough copies available'))
+    db.session.flush()
+    return [{'book_id': b, 'qty': q, 'ok': o is not None, 'order_id': o.id if o else None, 'error': e}
+            for b, q, o, e in placed]
+
+
+@bp.route('/orders', methods=['POST'])
+def place_orders():
+    _require_role('student')
+    results = inventory.run_in_transaction(_place_orders, current_user.id, _items(_body()))
+    logging.info(f'User {current_user.email} placed {sum(r["ok"] for r in results)}/{len(results)} orders via API')
+    return _results(results)
+
+
+@bp.route('/orders/approve', methods=['POST'])
+def approve_orders():
+    _require_role('admin')
+    ids = _id_list(_body().get('ids'), 'ids')
+    due = datetime.utcnow() + timedelta(days=current_app.config['LOAN_DAYS'])
+    outcomes = inventory.run_in_transaction(inventory.approve_orders, ids, due)
+    logging.info(f'Admin {current_user.email} approved {sum(o.ok for o in outcomes)}/{len(outcomes)} orders via API')
+    return _results([{'id': o.id, 'ok': o.ok, 'error': o.reason} for o in outcomes])
+
+
+@bp.route('/orders/cancel', methods=['POST'])
+def cancel_orders():
+    _require_role('admin')
+    ids = _id_list(_body().get('ids'), 'ids')
+    outcomes = inventory.run_in_transaction(inventory.cancel_orders, ids, inventory.CANCELABLE_BY_ADMIN)
+    logging.info(f'Admin {current_user.email} canceled {sum(o.ok for o in outcomes)}/{len(outcomes)} orders via API')
+    return _results([{'id': o.id, 'ok': o.ok, 'error': o.reason} for o in outcomes])
+
+
+# -- cart ---------------------------------------------------------------------
+
+@bp.route('/cart')
+@read_only
+def get_cart():
+    fields = _fields(CART_FIELDS)
+    lines = (Cart.query.options(load_only(*[getattr(Cart, f) for f in fields]))
+             .filter_by(user_id=current_user.id).order_by(Cart.id))
+    return _conditional({'items': [_dump(line, fields) for line in lines]})
+
+
+def _add_to_cart(user_id, lines):
+    known = _existing_books(b for b, _ in lines)
+    results = []
+    for book_id, qty in lines:
+        if book_id not in known:
+            error = 'book not found'
+        elif qty < 1:
+            error = 'invalid quantity'
+        elif not inventory.add_to_cart(user_id, book_id, qty):
+            error = 'not enough copies available'
+        else:
+            error = None
+        results.append({'book_id': book_id, 'qty': qty, 'ok': error is None, 'error': error})
+    return results
+
+
+@bp.route('/cart', methods=['POST'])
+def add_to_cart():
+    results = inventory.run_in_transaction(_add_to_cart, current_user.id, _items(_body()))
+    return _results(results)
+
+
+@bp.route('/cart/<int:item_id>', methods=['DELETE'])
+def remove_from_cart(item_id):
+    item = Cart.query.filter_by(id=item_id, user_id=current_user.id).first() or abort(404, 'cart line not found')
+    inventory.run_in_transaction(inventory.remove_cart_item, item)
+    return jsonify({'ok': True})
+
+
+@bp.route('/cart/checkout', methods=['POST'])
+def checkout():
+    data = request.get_json(silent=True) or {}
+    lines = inventory.run_in_transaction(inventory.checkout_cart, current_user.id, data.get('payment_method', 'mock'))
+    logging.info(f'User {current_user.email} checked out {sum(l.ok for l in lines)}/{len(lines)} cart lines via API')
+    return _results([{'book_id': l.book_id, 'qty': l.quantity, 'ok': l.ok, 'error': l.reason} for l in lines])
+
+
+# -- wishlist -----------------------------------------------------------------
+
+@bp.route('/wishlist')
+@read_only
+def get_wishlist():
+    rows = db.session.execute(
+        db.select(wishlist_table.c.book_id)
+        .where(wishlist_table.c.user_id == current_user.id)
+        .order_by(wishlist_table.c.book_id)
+    )
+    return _conditional({'book_ids': [b for (b,) in rows]})
+
+
+@bp.route('/wishlist', methods=['POST'])
+def update_wishlist():
+    """Body: {"add": [ids], "remove": [ids], "toggle": [ids]}; returns each book's new state."""
+    data = _body()
+    add = _id_list(data.get('add', []), 'add')
+    remove = _id_list(data.get('remove', []), 'remove')
+    toggle = _id_list(data.get('toggle', []), 'toggle')
+    if not (add or remove or toggle):
+        abort(400, 'nothing to do: give add, remove or toggle')
+    known = _existing_books(add + toggle)
+    state = {}
+    wishlist.remove_many(current_user.id, remove)
+    state.update((b, False) for b in remove)
+    wishlist.add_many(current_user.id, [b for b in add if b in known])
+    state.update((b, True) for b in add if b in known)
+    state.update(wishlist.toggle_many(current_user.id, [b for b in toggle if b in known]))
+    db.session.commit()
+    results = [{'book_id': b, 'ok': b in state, 'wishlisted': state.get(b),
+                'error': None if b in state else 'book not found'}
+               for b in dict.fromkeys(add + remove + toggle)]
+    return _results(results)
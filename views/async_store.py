@@ -0,0 +1,66 @@
+from flask import current_app, g, jsonify, request, session, render_template
+from flask_login import current_user
+from async_db import async_db
+from pagination import keyset_page_async
+from views.store import (catalog_args, catalog_key, catalog_query, catalog_fragment, reload_select, reloaded,
+                         render_catalog, cart_query)
+import page_cache
+import stats
+import user_cache
+
+# Async versions of the hot read views, served natively by asgi.py in ASGI mode.
+# They do their database I/O on the async engine and otherwise reuse the sync
+# views' helpers, so both modes return the same pages. Each runs in a Flask
+# request context, so request, session, url_for and templates work as usual.
+
+
+async def _login(db_session):
+    """Set current_user from the session cookie; False if nobody is logged in."""
+    user_id = session.get('_user_id')
+    if user_id is None:
+        return False
+    user = await user_cache.load_user_async(db_session, int(user_id))
+    if user is None:
+        return False
+    g._login_user = user  # what flask_login's user_loader would have set
+    return True
+
+
+async def catalog():
+    async with async_db.session() as db_session:
+        if not await _login(db_session):
+            return current_app.login_manager.unauthorized()
+        q, after, per_page = catalog_args()
+        key = catalog_key(q, after, per_page)
+        fragment = page_cache.catalog_cache.get(key)
+        if fragment is None:
+            query, keys = catalog_query(q)
+            versions = page_cache.catalog_cache.versions(page_cache.listing_tags(bool(q)))
+            books = await keyset_page_async(db_session, query, keys, after, per_page)
+            if page_cache.catalog_cache.enabled:
+                versions.update(page_cache.catalog_cache.versions(page_cache.book_tags(books)))
+                books = reloaded(books, (await db_session.execute(reload_select(books))).scalars().all())
+            fragment = catalog_fragment(key, q, books, versions)
+    return render_catalog(q, fragment)
+
+
+async def cart():
+    async with async_db.session() as db_session:
+        if not await _login(db_session):
+            return current_app.login_manager.unauthorized()
+        cart_items = (await db_session.execute(cart_query(current_user.id).statement)).scalars().unique().all()
+    return render_template('cart.html', cart_items=cart_items)
+
+
+async def api_stats():
+    async with async_db.session() as db_session:
+        if not await _login(db_session):
+            return current_app.login_manager.unauthorized()
+        if current_user.role != 'admin':
+            return jsonify({'error':'unauthorized'}), 403
+        payload, etag = await stats.top_sellers_async(db_session, 5)
+    resp = jsonify(payload)
+    resp.set_etag(etag)
+    resp.cache_control.private = True
+    resp.cache_control.max_age = int(current_app.config['STATS_CACHE_TTL'])
+    return resp.make_conditional(request)
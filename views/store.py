@@ -0,0 +1,228 @@
+import logging
+from flask import render_template, redirect, url_for, flash, request, jsonify, make_response
+from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+from models import db, Book, Order, Cart, BookRequest
+from search import search_books, search_keys
+from pagination import Page, keyset_page, page_size_arg, add_next_links
+from replica import read_only
+import inventory
+import page_cache
+import wishlist
+
+
+@login_required
+@read_only
+def catalog():
+    q, after, per_page = catalog_args()
+    key = catalog_key(q, after, per_page)
+    fragment = page_cache.catalog_cache.get(key)
+    if fragment is None:
+        query, keys = catalog_query(q)
+        versions = page_cache.catalog_cache.versions(page_cache.listing_tags(bool(q)))
+        books = keyset_page(query, keys, after, per_page)
+        if page_cache.catalog_cache.enabled:
+            versions.update(page_cache.catalog_cache.versions(page_cache.book_tags(books)))
+            books = reloaded(books, db.session.execute(reload_select(books)).scalars().all())
+        fragment = catalog_fragment(key, q, books, versions)
+    return render_catalog(q, fragment)
+
+
+# The catalog steps are shared with the ASGI handler in views/async_store.py
+
+def catalog_args():
+    return request.args.get('q','').strip(), request.args.get('after'), page_size_arg()
+
+
+def catalog_key(q, after, per_page):
+    # The book grid is shared by all students; only the page around it is per user
+    return f'catalog:{per_page}:{after or ""}:{q}'
+
+
+def catalog_query(q):
+    if q:
+        return search_books(q), search_keys(q)
+    return Book.query, [(Book.id, False)]
+
+
+def reload_select(books):
+    # populate_existing: the session already holds these rows as the page query read them
+    return (db.select(Book).where(Book.id.in_([b.id for b in books]))
+            .execution_options(populate_existing=True))
+
+
+def reloaded(books, rows):
+    """`books` with its items replaced by `rows`, the same books read again, in page order."""
+    by_id = {b.id: b for b in rows}
+    return Page([by_id[b.id] for b in books if b.id in by_id], books.next_token, books.page_size)
+
+
+def catalog_fragment(key, q, books, versions):
+    fragment = {
+        'html': page_cache.render_block('catalog.html', 'content', books=books, q=q),
+        'next_token': books.next_token,
+    }
+    tags = page_cache.catalog_tags(books, bool(q))
+    page_cache.catalog_cache.set(key, fragment, {tag: versions[tag] for tag in tags if tag in versions})
+    return fragment
+
+
+def render_catalog(q, fragment):
+    html = page_cache.render_with_block('catalog.html', 'content', fragment['html'], q=q,
+                                        next_token=fragment['next_token'])
+    return add_next_links(make_response(html), {'after': fragment['next_token']})
+
+
+@login_required
+def place_order(book_id):
+    if current_user.role != 'student':
+        return jsonify({'error':'only students may order'}), 403
+    qty = int(request.form.get('qty',1))
+    book = Book.query.get_or_404(book_id)
+    o = inventory.run_in_transaction(inventory.place_order, current_user.id, book.id, qty)
+    if o is None:
+        flash('Not enough copies available', 'warning')
+        return redirect(url_for('catalog'))
+    logging.info(f'User {current_user.email} placed order {o.id} for {book.title} x{qty}')
+    flash('Order placed', 'success')
+    return redirect(url_for('catalog'))
+
+
+@login_required
+def toggle_wishlist(book_id):
+    book = Book.query.get_or_404(book_id)
+    added = wishlist.toggle(current_user.id, book.id)
+    db.session.commit()
+    if added:
+        flash('Added to wishlist', 'success')
+    else:
+        flash('Removed from wishlist', 'info')
+    return redirect(request.referrer or url_for('catalog'))
+
+
+@login_required
+@read_only
+def student_dashboard():
+    if current_user.role == 'admin':
+        return redirect(url_for('admin_dashboard'))
+    # Student-specific overview: orders and cart count
+    orders = Order.query.filter_by(user_id=current_user.id).order_by(Order.created_at.desc()).all()
+    # cart_count: sum of quantities in Cart for this user
+    cart_count = sum(item.quantity for item in getattr(current_user, 'cart_items', []))
+    return render_template('student_dashboard.html', orders=orders, cart_count=cart_count)
+
+
+@login_required
+def student_edit_order(order_id):
+    order = Order.query.get_or_404(order_id)
+    if order.user_id != current_user.id:
+        flash('Not authorized', 'danger')
+        return redirect(url_for('index'))
+    if order.status != 'pending':
+        flash('Only pending orders can be edited', 'warning')
+        return redirect(url_for('student_dashboard'))
+    if request.method == 'POST':
+        try:
+            new_qty = int(request.form.get('quantity', order.quantity))
+        except ValueError:
+            flash('Invalid quantity', 'warning')
+            return redirect(url_for('student_edit_order', order_id=order.id))
+        if not inventory.run_in_transaction(inventory.resize_order, order, new_qty):
+            flash('Quantity out of range', 'warning')
+            return redirect(url_for('student_edit_order', order_id=order.id))
+        flash('Order updated', 'success')
+        return redirect(url_for('student_dashboard'))
+    return render_template('student_edit_order.html', order=order)
+
+
+@login_required
+def student_cancel_order(order_id):
+    order = Order.query.get_or_404(order_id)
+    if order.user_id != current_user.id:
+        flash('Not authorized', 'danger')
+        return redirect(url_for('index'))
+    if order.status != 'pending':
+        flash('Only pending orders can be canceled', 'warning')
+        return redirect(url_for('student_dashboard'))
+    # return copies and mark canceled
+    if not inventory.run_in_transaction(inventory.cancel_order, order):
+        flash('Only pending orders can be canceled', 'warning')
+        return redirect(url_for('student_dashboard'))
+    flash('Order canceled', 'info')
+    return redirect(url_for('student_dashboard'))
+
+
+@login_required
+def request_book():
+    if current_user.role != 'student':
+        flash('Only students can request books', 'warning')
+        return redirect(url_for('index'))
+    from forms import RequestBookForm
+    form = RequestBookForm()
+    if form.validate_on_submit():
+        book_request = BookRequest(
+            user_id=current_user.id,
+            title=form.title.data,
+            author=form.author.data,
+            genre=form.genre.data or 'General',
+            reason=form.reason.data
+        )
+        db.session.add(book_request)
+        db.session.commit()
+        logging.info(f'User {current_user.email} requested book: {form.title.data}')
+        flash('Book request submitted!', 'success')
+        return redirect(url_for('student_dashboard'))
+    return render_template('request_book.html', form=form)
+
+
+@login_required
+@read_only
+def cart():
+    return render_template('cart.html', cart_items=cart_query(current_user.id).all())
+
+
+def cart_query(user_id):
+    # The template shows each line's book; load them with the lines
+    return Cart.query.filter_by(user_id=user_id).options(joinedload(Cart.book)).order_by(Cart.id)
+
+
+@login_required
+def add_to_cart(book_id):
+    qty = int(request.form.get('qty', 1))
+    book = Book.query.get_or_404(book_id)
+    # Copies are held while the book sits in the cart
+    if not inventory.run_in_transaction(inventory.add_to_cart, current_user.id, book.id, qty):
+        flash('Not enough copies available', 'warning')
+        return redirect(url_for('catalog'))
+    flash('Added to cart', 'success')
+    return redirect(url_for('cart'))
+
+
+@login_required
+def remove_from_cart(item_id):
+    cart_item = Cart.query.get_or_404(item_id)
+    if cart_item.user_id != current_user.id:
+        flash('Not authorized', 'danger')
+        return redirect(url_for('cart'))
+    # Return copies to inventory
+    inventory.run_in_transaction(inventory.remove_cart_item, cart_item)
+    flash('Removed from cart', 'info')
+    return redirect(url_for('cart'))
+
+
+@login_required
+def cart_checkout():
+    payment_method = request.form.get('payment_method', 'mock')
+    # Create orders for all cart items in one batch
+    lines = inventory.run_in_transaction(inventory.checkout_cart, current_user.id, payment_method)
+    if not lines:
+        flash('Cart is empty', 'warning')
+        return redirect(url_for('cart'))
+    placed = [l for l in lines if l.ok]
+    for l in lines:
+        if not l.ok:
+            flash(f'Cart item for book #{l.book_id} skipped: {l.reason}', 'warning')
+    logging.info(f'User {current_user.email} checked out {len(placed)}/{len(lines)} cart lines')
+    if placed:
+        flash('Order placed! Proceed to payment.', 'success')
+    return redirect(url_for('student_dashboard'))
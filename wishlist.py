@@ -0,0 +1,86 @@
+from sqlalchemy.exc import IntegrityError
+from models import db, wishlist_table
+
+# Wishlist operations straight on the association table, so checking or toggling
+# one book never loads a user's whole wishlist collection. All lookups are served
+# by the unique (user_id, book_id) index.
+
+_wl = wishlist_table.c
+
+
+def is_wishlisted(user_id, book_id) -> bool:
+    row = db.session.execute(
+        db.select(_wl.book_id).where(_wl.user_id == user_id, _wl.book_id == book_id).limit(1)
+    ).first()
+    return row is not None
+
+
+def wishlisted_ids(user_id, book_ids) -> set:
+    """Which of `book_ids` the user has wishlisted, in one query."""
+    book_ids = list(book_ids)
+    if not book_ids:
+        return set()
+    rows = db.session.execute(
+        db.select(_wl.book_id).where(_wl.user_id == user_id, _wl.book_id.in_(book_ids))
+    )
+    return {book_id for (book_id,) in rows}
+
+
+def add(user_id, book_id) -> bool:
+    """Idempotently wishlist a book; False if it was already there."""
+    try:
+        with db.session.begin_nested():
+            db.session.execute(wishlist_table.insert().values(user_id=user_id, book_id=book_id))
+    except IntegrityError:
+        return False
+    return True
+
+
+def remove(user_id, book_id) -> bool:
+    """Idempotently un-wishlist a book; False if it was not there."""
+    result = db.session.execute(
+        wishlist_table.delete().where(_wl.user_id == user_id, _wl.book_id == book_id)
+    )
+    return result.rowcount > 0
+
+
+def add_many(user_id, book_ids) -> set:
+    """Wishlist several books with one INSERT; returns the ids that were newly added."""
+    book_ids = set(book_ids) - wishlisted_ids(user_id, book_ids)
+    if not book_ids:
+        return set()
+    try:
+        with db.session.begin_nested():
+            db.session.execute(wishlist_table.insert(), [{'user_id': user_id, 'book_id': b} for b in sorted(book_ids)])
+    except IntegrityError:
+        # A concurrent request added some of them; fall back to one insert each
+        return {b for b in sorted(book_ids) if add(user_id, b)}
+    return book_ids
+
+
+def remove_many(user_id, book_ids) -> int:
+    """Un-wishlist several books with one DELETE; returns how many were removed."""
+    book_ids = list(book_ids)
+    if not book_ids:
+        return 0
+    result = db.session.execute(
+        wishlist_table.delete().where(_wl.user_id == user_id, _wl.book_id.in_(book_ids))
+    )
+    return result.rowcount
+
+
+def toggle_many(user_id, book_ids) -> dict:
+    """Flip membership of each of `book_ids`; returns {book_id: new state}."""
+    book_ids = list(dict.fromkeys(book_ids))
+    present = wishlisted_ids(user_id, book_ids)
+    remove_many(user_id, present)
+    add_many(user_id, [b for b in book_ids if b not in present])
+    return {b: b not in present for b in book_ids}
+
+
+def toggle(user_id, book_id) -> bool:
+    """Flip wishlist membership with a single DELETE or INSERT; returns the new state."""
+    if remove(user_id, book_id):
+        return False
+    add(user_id, book_id)
+    return True